@@ -396,16 +396,37 @@ class ApiClient {
   }
 
   /// YouTube endpoints
+  /// Обработка видео — фоновая задача: POST отвечает 202 с job_id, результат ждём опросом статуса.
+  /// Задача, которую не взяли из очереди за 5 минут (воркер не запущен или занят), или не завершённая
+  /// за 30 минут — ошибка, а не бесконечный опрос.
   Future<YouTubeProcessResult> processYoutubeVideo({String? url, String targetLang = 'ru'}) async {
+    const queuedTimeout = Duration(minutes: 5);
+    const totalTimeout = Duration(minutes: 30);
+    final started = DateTime.now();
     final r = await _dio.post<Map<String, dynamic>>(
       'youtube/process',
       data: {
         if (url != null && url.isNotEmpty) 'url': url else 'url': '',
         'target_lang': targetLang,
       },
-      options: Options(receiveTimeout: const Duration(minutes: 30)),
     );
-    return YouTubeProcessResult.fromJson(r.data!);
+    var job = r.data!;
+    while (job['status'] != 'succeeded') {
+      if (job['status'] == 'failed') {
+        throw Exception(job['error'] as String? ?? 'Video processing failed');
+      }
+      final elapsed = DateTime.now().difference(started);
+      if (job['status'] == 'queued' && elapsed > queuedTimeout) {
+        throw Exception('Video processing is still queued, try again later');
+      }
+      if (elapsed > totalTimeout) {
+        throw Exception('Video processing is taking too long, try again later');
+      }
+      await Future<void>.delayed(const Duration(seconds: 3));
+      final poll = await _dio.get<Map<String, dynamic>>('youtube/process/${job['job_id']}');
+      job = poll.data!;
+    }
+    return YouTubeProcessResult.fromJson(job['result'] as Map<String, dynamic>);
   }
 
   Future<List<YouTubeHistoryItem>> getYoutubeHistory({int limit = 50, int offset = 0}) async {
@@ -0,0 +1,34 @@
+"""add HNSW index on cards.embedding and btree indexes for the per-user filter
+
+Revision ID: 10
+Revises: 9
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "10"
+down_revision: Union[str, None] = "9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY нельзя внутри транзакции; индексы строятся без блокировки записи в cards.
+    # HNSW требует pgvector >= 0.5. На больших таблицах перед миграцией стоит поднять maintenance_work_mem.
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cards_deck_id ON cards (deck_id)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_decks_user_id ON decks (user_id)")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cards_embedding_hnsw "
+            "ON cards USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_cards_embedding_hnsw")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_decks_user_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_cards_deck_id")
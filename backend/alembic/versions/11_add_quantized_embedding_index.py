@@ -0,0 +1,30 @@
+"""quantized (halfvec / binary) ANN index on cards.embedding: opt-in, built by a script
+
+Revision ID: 11
+Revises: 10
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "11"
+down_revision: Union[str, None] = "10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Имена индексов scripts/build_quantized_index.py
+_QUANTIZED_INDEXES = ("ix_cards_embedding_halfvec_hnsw", "ix_cards_embedding_binary_hnsw")
+
+
+def upgrade() -> None:
+    # Сжатый индекс нужен только при SIMILAR_WORDS_QUANTIZATION и требует pgvector >= 0.7, поэтому миграция
+    # его не строит: выбранный индекс создаёт scripts/build_quantized_index.py.
+    pass
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in _QUANTIZED_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,31 @@
+"""add word_synonyms table (LLM synonyms shared across users, versioned by prompt)
+
+Revision ID: 12
+Revises: 11
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "12"
+down_revision: Union[str, None] = "11"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "word_synonyms",
+        sa.Column("word", sa.String(255), primary_key=True),
+        sa.Column("prompt_version", sa.String(32), primary_key=True),
+        sa.Column("synonyms", postgresql.JSONB(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("word_synonyms")
@@ -0,0 +1,43 @@
+"""jobs: dedup_key (one active job per type and deck/user) and idempotency_key
+
+Revision ID: 15
+Revises: 14
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "15"
+down_revision: Union[str, None] = "14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("jobs", sa.Column("dedup_key", sa.String(255), nullable=True))
+    op.add_column("jobs", sa.Column("idempotency_key", sa.String(255), nullable=True))
+    # Не больше одной незавершённой задачи с тем же ключом: повторный запрос присоединяется к ней
+    op.create_index(
+        "ux_jobs_dedup_key_active",
+        "jobs",
+        ["dedup_key"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+    op.create_index(
+        "ux_jobs_user_idempotency_key",
+        "jobs",
+        ["user_id", "idempotency_key"],
+        unique=True,
+        postgresql_where=sa.text("idempotency_key IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_jobs_user_idempotency_key", table_name="jobs")
+    op.drop_index("ux_jobs_dedup_key_active", table_name="jobs")
+    op.drop_column("jobs", "idempotency_key")
+    op.drop_column("jobs", "dedup_key")
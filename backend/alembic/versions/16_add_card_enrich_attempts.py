@@ -0,0 +1,35 @@
+"""add card_enrich_attempts (backoff and give-up for failed backfill words)
+
+Revision ID: 16
+Revises: 15
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "16"
+down_revision: Union[str, None] = "15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "card_enrich_attempts",
+        sa.Column(
+            "card_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("cards.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("kind", sa.String(32), primary_key=True),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_attempt_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("card_enrich_attempts")
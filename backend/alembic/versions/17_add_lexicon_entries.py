@@ -0,0 +1,32 @@
+"""add lexicon_entries table (word enrichment shared across users' backfills)
+
+Revision ID: 17
+Revises: 16
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "17"
+down_revision: Union[str, None] = "16"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "lexicon_entries",
+        sa.Column("word", sa.String(255), primary_key=True),
+        sa.Column("prompt_version", sa.String(32), primary_key=True),
+        sa.Column("transcription", sa.String(255), nullable=True),
+        sa.Column("senses", postgresql.JSONB(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("lexicon_entries")
@@ -0,0 +1,28 @@
+"""add youtube_videos.transcript_source (whisper | captions | auto_captions)
+
+Revision ID: 18
+Revises: 17
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "18"
+down_revision: Union[str, None] = "17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Все видео до этой ревизии распознавались Whisper
+    op.add_column(
+        "youtube_videos",
+        sa.Column("transcript_source", sa.String(32), nullable=False, server_default="whisper"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("youtube_videos", "transcript_source")
@@ -0,0 +1,39 @@
+"""jobs: Idempotency-Key is unique per user and job type
+
+Revision ID: 19
+Revises: 18
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "19"
+down_revision: Union[str, None] = "18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Тот же ключ от клиента для задачи другого типа — другая задача, а не повтор
+    op.drop_index("ux_jobs_user_idempotency_key", table_name="jobs")
+    op.create_index(
+        "ux_jobs_user_type_idempotency_key",
+        "jobs",
+        ["user_id", "type", "idempotency_key"],
+        unique=True,
+        postgresql_where=sa.text("idempotency_key IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_jobs_user_type_idempotency_key", table_name="jobs")
+    op.create_index(
+        "ux_jobs_user_idempotency_key",
+        "jobs",
+        ["user_id", "idempotency_key"],
+        unique=True,
+        postgresql_where=sa.text("idempotency_key IS NOT NULL"),
+    )
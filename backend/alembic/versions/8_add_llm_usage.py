@@ -0,0 +1,36 @@
+"""add llm_usage table (token accounting per user / endpoint / provider)
+
+Revision ID: 8
+Revises: 434acd4748de
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision: str = "8"
+down_revision: Union[str, None] = "434acd4748de"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_usage",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("user_id", UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=True),
+        sa.Column("endpoint", sa.String(255), nullable=False),
+        sa.Column("provider", sa.String(32), nullable=False),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("completion_tokens", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_llm_usage_user_id", "llm_usage", ["user_id"])
+    op.create_index("ix_llm_usage_created_at", "llm_usage", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("llm_usage")
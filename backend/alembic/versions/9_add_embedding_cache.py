@@ -0,0 +1,31 @@
+"""add embedding_cache table (vectors by content hash)
+
+Revision ID: 9
+Revises: 8
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+revision: str = "9"
+down_revision: Union[str, None] = "8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "embedding_cache",
+        sa.Column("content_hash", sa.String(64), primary_key=True),
+        sa.Column("model", sa.String(64), nullable=False),
+        sa.Column("embedding", Vector(768), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("embedding_cache")
@@ -1,9 +1,14 @@
 from datetime import datetime
-from uuid import UUID
-from sqlalchemy import select, or_, func
+from uuid import UUID, uuid4
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import select, update, insert, or_, func, text, cast, literal_column, values, column, case, null
+from sqlalchemy.dialects.postgresql import aggregate_order_by, UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.db.repositories import enrich_attempt_repo
 from app.models.card import Card
+from app.models.card_enrich_attempt import EnrichKind
 from app.models.deck import Deck
 
 
@@ -58,39 +63,227 @@ async def get_card_by_id(session: AsyncSession, card_id: UUID, user_id: UUID) ->
     return result.scalars().one_or_none()
 
 
-async def get_cards_missing_transcription(
-    session: AsyncSession, user_id: UUID, deck_id: UUID | None = None, limit: int = 100
-) -> list[Card]:
-    """Cards that have no transcription or no pronunciation_url, for backfill."""
+def _missing_transcription_query(q, user_id: UUID, deck_id: UUID | None):
     q = (
-        select(Card)
-        .join(Deck, Deck.id == Card.deck_id)
+        q.join(Deck, Deck.id == Card.deck_id)
         .where(Deck.user_id == user_id)
         .where(or_(Card.transcription.is_(None), Card.pronunciation_url.is_(None)))
-        .order_by(Card.created_at.desc())
-        .limit(limit)
     )
     if deck_id is not None:
         q = q.where(Card.deck_id == deck_id)
+    return enrich_attempt_repo.not_cooling_down(q, EnrichKind.TRANSCRIPTION)
+
+
+async def get_cards_missing_transcription(
+    session: AsyncSession,
+    user_id: UUID,
+    deck_id: UUID | None = None,
+    limit: int = 100,
+    after_id: UUID | None = None,
+) -> list[Card]:
+    """
+    Cards that have no transcription or no pronunciation_url, for backfill.
+    По возрастанию id после after_id: карточка, которую не удалось обновить, не выбирается повторно.
+    Карточки с недавней неудачной попыткой (card_enrich_attempts) пропускаются до next_attempt_at.
+    """
+    q = _missing_transcription_query(select(Card), user_id, deck_id).order_by(Card.id).limit(limit)
+    if after_id is not None:
+        q = q.where(Card.id > after_id)
     result = await session.execute(q)
     return list(result.scalars().all())
 
 
+async def count_cards_missing_transcription(session: AsyncSession, user_id: UUID, deck_id: UUID | None = None) -> int:
+    result = await session.execute(_missing_transcription_query(select(func.count(Card.id)), user_id, deck_id))
+    return result.scalar_one()
+
+
+def _missing_pos_query(q, user_id: UUID, deck_id: UUID | None):
+    q = q.join(Deck, Deck.id == Card.deck_id).where(Deck.user_id == user_id, Card.part_of_speech.is_(None))
+    if deck_id is not None:
+        q = q.where(Card.deck_id == deck_id)
+    return enrich_attempt_repo.not_cooling_down(q, EnrichKind.POS)
+
+
 async def get_cards_missing_pos(
-    session: AsyncSession, user_id: UUID, deck_id: UUID | None = None, limit: int = 500
+    session: AsyncSession,
+    user_id: UUID,
+    deck_id: UUID | None = None,
+    limit: int = 500,
+    after_id: UUID | None = None,
 ) -> list[Card]:
-    """Cards that have no part_of_speech (для обновления переводов по частям речи)."""
+    """
+    Cards that have no part_of_speech (для обновления переводов по частям речи), по возрастанию id после after_id.
+    Карточки с недавней неудачной попыткой (card_enrich_attempts) пропускаются до next_attempt_at.
+    """
+    q = _missing_pos_query(select(Card), user_id, deck_id).order_by(Card.id).limit(limit)
+    if after_id is not None:
+        q = q.where(Card.id > after_id)
+    result = await session.execute(q)
+    return list(result.scalars().all())
+
+
+async def count_cards_missing_pos(session: AsyncSession, user_id: UUID, deck_id: UUID | None = None) -> int:
+    result = await session.execute(_missing_pos_query(select(func.count(Card.id)), user_id, deck_id))
+    return result.scalar_one()
+
+
+async def get_cards_missing_embedding(session: AsyncSession, after_id: UUID | None = None, limit: int = 64) -> list:
+    """
+    Порция карточек без эмбеддинга (id, word, translation, user_id) по возрастанию id после after_id.
+    Без блокировок: запись идёт через set_card_embeddings, который не перетирает уже заполненный вектор.
+    """
     q = (
-        select(Card)
+        select(Card.id, Card.word, Card.translation, Deck.user_id)
         .join(Deck, Deck.id == Card.deck_id)
-        .where(Deck.user_id == user_id, Card.part_of_speech.is_(None))
-        .order_by(Card.created_at.desc())
+        .where(Card.embedding.is_(None))
+        .order_by(Card.id)
         .limit(limit)
     )
-    if deck_id is not None:
-        q = q.where(Card.deck_id == deck_id)
+    if after_id is not None:
+        q = q.where(Card.id > after_id)
     result = await session.execute(q)
-    return list(result.scalars().all())
+    return list(result.all())
+
+
+async def count_user_card_embeddings(session: AsyncSession, user_id: UUID) -> int:
+    """Число карточек пользователя с эмбеддингом."""
+    result = await session.execute(
+        select(func.count(Card.id))
+        .join(Deck, Deck.id == Card.deck_id)
+        .where(Deck.user_id == user_id, Card.embedding.is_not(None))
+    )
+    return result.scalar_one()
+
+
+async def get_user_card_embeddings(session: AsyncSession, user_id: UUID, limit: int) -> list:
+    """Все карточки пользователя с эмбеддингом: id, deck_id, word, translation, example, embedding."""
+    result = await session.execute(
+        select(Card.id, Card.deck_id, Card.word, Card.translation, Card.example, Card.embedding)
+        .join(Deck, Deck.id == Card.deck_id)
+        .where(Deck.user_id == user_id, Card.embedding.is_not(None))
+        .limit(limit)
+    )
+    return list(result.all())
+
+
+async def set_card_embeddings(session: AsyncSession, vectors: dict[UUID, list[float]]) -> set[UUID]:
+    """
+    Пакетная запись embedding по id карточек — только туда, где он ещё NULL (вектор мог записать
+    другой процесс или карточку отредактировали). Возвращает id реально обновлённых карточек.
+    """
+    if not vectors:
+        return set()
+    # Вектор в VALUES приходит текстом — явное приведение к vector в SET
+    columns = [column("id", PG_UUID(as_uuid=True)), column("embedding", Card.__table__.c.embedding.type)]
+    v = values(*columns, name="v").data(list(vectors.items()))
+    result = await session.execute(
+        update(Card)
+        .where(Card.id == v.c.id, Card.embedding.is_(None))
+        .values(embedding=cast(v.c.embedding, Vector(EMBEDDING_DIM)))
+        .returning(Card.id)
+        .execution_options(synchronize_session=False)
+    )
+    return set(result.scalars().all())
+
+
+_ITERATIVE_SCAN_MODES = ("relaxed_order", "strict_order")
+_iterative_scan_supported: bool | None = None
+EMBEDDING_DIM = 768
+
+
+def _quantized_distance(embedding: list[float]):
+    """
+    Расстояние по сжатому представлению — то же выражение, что в индексе scripts/build_quantized_index.py,
+    иначе планировщик его не использует. None — сжатие выключено.
+    """
+    mode = settings.similar_words_quantization
+    if mode == "halfvec":
+        return cast(Card.embedding, HALFVEC(EMBEDDING_DIM)).cosine_distance(cast(embedding, HALFVEC(EMBEDDING_DIM)))
+    if mode == "binary":
+        query = func.binary_quantize(cast(embedding, Vector(EMBEDDING_DIM)))
+        return cast(func.binary_quantize(Card.embedding), BIT(EMBEDDING_DIM)).hamming_distance(query)
+    return None
+
+
+async def _supports_iterative_scan(session: AsyncSession) -> bool:
+    """hnsw.iterative_scan появился в pgvector 0.8; на старых версиях SET с ним — ошибка. Проверяется один раз."""
+    global _iterative_scan_supported
+    if _iterative_scan_supported is None:
+        version = (await session.execute(
+            text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        )).scalar_one_or_none()
+        parts = tuple(int(p) for p in (version or "0").split(".")[:2] if p.isdigit())
+        _iterative_scan_supported = parts >= (0, 8)
+    return _iterative_scan_supported
+
+
+async def find_similar_cards(
+    session: AsyncSession,
+    user_id: UUID,
+    embedding: list[float],
+    limit: int = 10,
+    exclude_deck_id: UUID | None = None,
+    deck_id: UUID | None = None,
+    exclude_word: str | None = None,
+) -> list:
+    """
+    Ближайшие по косинусу карточки пользователя (id, word, translation, example, distance).
+    exclude_word — без карточек с этим словом (без учёта регистра), фильтр в том же запросе.
+    Фильтр — deck_id = ANY(колоды пользователя) без JOIN: планировщик выбирает между HNSW-индексом
+    (ef_search из настроек) и btree по deck_id с точной сортировкой, если карточек у пользователя мало.
+    SET LOCAL действует до конца текущей транзакции.
+    При SIMILAR_WORDS_QUANTIZATION индекс отдаёт SIMILAR_WORDS_RERANK_CANDIDATES кандидатов по сжатому
+    представлению, и они переранжируются по точному косинусу полных векторов.
+    """
+    deck_q = select(Deck.id).where(Deck.user_id == user_id)
+    if exclude_deck_id is not None:
+        deck_q = deck_q.where(Deck.id != exclude_deck_id)
+    if deck_id is not None:
+        deck_q = deck_q.where(Deck.id == deck_id)
+    deck_ids = list((await session.execute(deck_q)).scalars().all())
+    if not deck_ids:
+        return []
+    filters = [Card.deck_id.in_(deck_ids), Card.embedding.is_not(None)]
+    if exclude_word and exclude_word.strip():
+        filters.append(func.lower(func.trim(Card.word)) != exclude_word.strip().lower())
+    quantized = _quantized_distance(embedding)
+    ef_search = int(settings.similar_words_ef_search)
+    if quantized is not None:
+        # HNSW возвращает не больше ef_search строк
+        ef_search = max(ef_search, settings.similar_words_rerank_candidates)
+    await session.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+    if settings.similar_words_iterative_scan in _ITERATIVE_SCAN_MODES and await _supports_iterative_scan(session):
+        await session.execute(text(f"SET LOCAL hnsw.iterative_scan = {settings.similar_words_iterative_scan}"))
+    if quantized is not None:
+        candidates = (
+            select(Card.id, Card.word, Card.translation, Card.example, Card.embedding)
+            .where(*filters)
+            .order_by(quantized)
+            .limit(max(limit, settings.similar_words_rerank_candidates))
+            .subquery()
+        )
+        exact = candidates.c.embedding.cosine_distance(embedding)
+        result = await session.execute(
+            select(
+                candidates.c.id, candidates.c.word, candidates.c.translation, candidates.c.example,
+                exact.label("distance"),
+            )
+            .order_by(exact)
+            .limit(limit)
+        )
+        return list(result.all())
+    distance = Card.embedding.cosine_distance(embedding)
+    nearest = (
+        select(Card.id, Card.word, Card.translation, Card.example, distance.label("distance"))
+        .where(*filters)
+        .order_by(distance)
+        .limit(limit)
+        .subquery()
+    )
+    # relaxed_order может вернуть соседей не строго по порядку — досортировываем найденные limit строк
+    result = await session.execute(select(nearest).order_by(nearest.c.distance))
+    return list(result.all())
 
 
 async def create_card(
@@ -124,6 +317,9 @@ async def create_card(
 
 
 async def update_card(session: AsyncSession, card: Card, **kwargs) -> Card:
+    if "embedding" not in kwargs and any(k in kwargs and kwargs[k] != getattr(card, k) for k in ("word", "translation")):
+        # Текст карточки изменился — старый вектор неактуален, его пересчитает embedding_service
+        kwargs["embedding"] = None
     for k, v in kwargs.items():
         if hasattr(card, k):
             setattr(card, k, v)
@@ -132,6 +328,133 @@ async def update_card(session: AsyncSession, card: Card, **kwargs) -> Card:
     return card
 
 
+async def bulk_update_cards(session: AsyncSession, rows: list[dict]) -> None:
+    """
+    Обновить многие карточки одним UPDATE ... FROM (VALUES ...): rows — {"id": ..., поле: значение},
+    набор полей во всех строках одинаковый. Смена translation сбрасывает эмбеддинг, как в update_card.
+    Загруженные в сессию объекты Card не обновляются.
+    """
+    if not rows:
+        return
+    fields = [k for k in rows[0] if k != "id"]
+    columns = [column("id", PG_UUID(as_uuid=True))] + [column(f, Card.__table__.c[f].type) for f in fields]
+    v = values(*columns, name="v").data([tuple(row[c.name] for c in columns) for row in rows])
+    set_ = {f: v.c[f] for f in fields}
+    if "translation" in fields:
+        set_["embedding"] = case((v.c.translation.is_distinct_from(Card.translation), null()), else_=Card.embedding)
+    await session.execute(
+        update(Card).where(Card.id == v.c.id).values(**set_).execution_options(synchronize_session=False)
+    )
+
+
+async def bulk_create_cards(session: AsyncSession, rows: list[dict]) -> list[UUID]:
+    """Вставить карточки одним INSERT (rows — поля Card, набор одинаковый); id новых карточек."""
+    if not rows:
+        return []
+    result = await session.scalars(insert(Card).returning(Card.id), rows)
+    return list(result.all())
+
+
+async def get_word_pos_in_deck(session: AsyncSession, deck_id: UUID, words: set[str]) -> set[tuple[str, str | None]]:
+    """(слово lower, часть речи) карточек колоды с этими словами — чтобы не создавать дубликаты по части речи."""
+    if not words:
+        return set()
+    result = await session.execute(
+        select(func.lower(Card.word), Card.part_of_speech).where(Card.deck_id == deck_id, func.lower(Card.word).in_(words))
+    )
+    return set(result.tuples().all())
+
+
+async def deck_has_synonym_groups(session: AsyncSession, deck_id: UUID) -> bool:
+    result = await session.execute(
+        select(Card.id).where(Card.deck_id == deck_id, Card.synonym_group_id.is_not(None)).limit(1)
+    )
+    return result.scalars().first() is not None
+
+
+async def get_deck_fingerprint(session: AsyncSession, deck_id: UUID) -> str:
+    """md5 по (id, слово, перевод) всех карточек колоды — меняется при добавлении, удалении и правке слов."""
+    row = func.concat(Card.id, ":", func.lower(Card.word), ":", Card.translation)
+    result = await session.execute(
+        select(func.md5(func.string_agg(row, aggregate_order_by(literal_column("','"), Card.id))))
+        .where(Card.deck_id == deck_id)
+    )
+    return result.scalar_one() or ""
+
+
+async def get_cards_by_ids(session: AsyncSession, deck_id: UUID, card_ids: list[UUID]) -> list[Card]:
+    if not card_ids:
+        return []
+    result = await session.execute(select(Card).where(Card.deck_id == deck_id, Card.id.in_(card_ids)))
+    return list(result.scalars().all())
+
+
+async def get_user_cards_by_ids(session: AsyncSession, user_id: UUID, card_ids: list[UUID]) -> list[Card]:
+    """Карточки пользователя по id (из любых его колод); чужие и удалённые id пропускаются."""
+    if not card_ids:
+        return []
+    result = await session.execute(
+        select(Card).join(Deck, Deck.id == Card.deck_id).where(Deck.user_id == user_id, Card.id.in_(card_ids))
+    )
+    return list(result.scalars().all())
+
+
+async def get_card_ids_by_words(session: AsyncSession, deck_id: UUID, words: set[str]) -> dict[str, list[UUID]]:
+    """Слово (lower) -> id карточек колоды с этим словом, без учёта регистра."""
+    if not words:
+        return {}
+    result = await session.execute(
+        select(func.lower(Card.word), Card.id).where(Card.deck_id == deck_id, func.lower(Card.word).in_(words))
+    )
+    found: dict[str, list[UUID]] = {}
+    for word, card_id in result.all():
+        found.setdefault(word, []).append(card_id)
+    return found
+
+
+async def merge_synonym_groups(session: AsyncSession, deck_id: UUID, card_ids: list[UUID]) -> UUID:
+    """
+    Объединить карточки card_ids и все группы, в которых они уже состоят, в одну группу колоды
+    (id — одной из существующих групп, иначе новый). Два запроса, без загрузки карточек группы.
+    """
+    existing = (
+        select(Card.synonym_group_id)
+        .where(Card.deck_id == deck_id, Card.id.in_(card_ids), Card.synonym_group_id.is_not(None))
+    )
+    group_id = (await session.execute(existing.order_by(Card.synonym_group_id).limit(1))).scalars().first()
+    if group_id is None:
+        group_id = uuid4()
+    await session.execute(
+        update(Card)
+        .where(
+            Card.deck_id == deck_id,
+            or_(Card.id.in_(card_ids), Card.synonym_group_id.in_(existing.scalar_subquery())),
+        )
+        .values(synonym_group_id=group_id)
+        .execution_options(synchronize_session=False)
+    )
+    return group_id
+
+
+async def leave_synonym_group(session: AsyncSession, card: Card) -> None:
+    """Убрать карточку из её группы; если в группе осталась одна карточка — распустить группу."""
+    group_id = card.synonym_group_id
+    if group_id is None:
+        return
+    card.synonym_group_id = None
+    await session.flush()
+    remaining = await session.execute(
+        select(func.count()).select_from(Card).where(Card.deck_id == card.deck_id, Card.synonym_group_id == group_id)
+    )
+    if remaining.scalar_one() < 2:
+        await session.execute(
+            update(Card)
+            .where(Card.deck_id == card.deck_id, Card.synonym_group_id == group_id)
+            .values(synonym_group_id=None)
+            .execution_options(synchronize_session=False)
+        )
+
+
 async def delete_card(session: AsyncSession, card: Card) -> None:
     await session.delete(card)
 
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.embedding_cache import EmbeddingCache
+
+
+async def get_cached_embeddings(session: AsyncSession, hashes: list[str]) -> dict[str, list[float]]:
+    """Векторы из кэша по хэшам содержимого (одним запросом). Отсутствующих хэшей в ответе нет."""
+    if not hashes:
+        return {}
+    result = await session.execute(
+        select(EmbeddingCache.content_hash, EmbeddingCache.embedding).where(EmbeddingCache.content_hash.in_(hashes))
+    )
+    return {h: list(vec) for h, vec in result.all()}
+
+
+async def add_cached_embeddings(session: AsyncSession, model: str, vectors: dict[str, list[float]]) -> None:
+    """Записать векторы в кэш; уже существующие хэши (параллельный воркер) пропускаются."""
+    if not vectors:
+        return
+    now = datetime.now(timezone.utc)
+    stmt = insert(EmbeddingCache).values([
+        {"content_hash": h, "model": model, "embedding": vec, "created_at": now} for h, vec in vectors.items()
+    ])
+    await session.execute(stmt.on_conflict_do_nothing(index_elements=["content_hash"]))
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+from sqlalchemy import select, delete, func, and_, or_, literal, DateTime, Interval
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.card import Card
+from app.models.card_enrich_attempt import CardEnrichAttempt
+
+
+def not_cooling_down(q, kind: str, now: datetime | None = None):
+    """
+    Отфильтровать из запроса по Card карточки, у которых backfill kind недавно не удался
+    (ждём next_attempt_at) или исчерпал ENRICH_MAX_ATTEMPTS.
+    """
+    now = now or datetime.now(timezone.utc)
+    return q.outerjoin(
+        CardEnrichAttempt, and_(CardEnrichAttempt.card_id == Card.id, CardEnrichAttempt.kind == kind)
+    ).where(
+        or_(
+            CardEnrichAttempt.card_id.is_(None),
+            and_(
+                CardEnrichAttempt.attempts < settings.enrich_max_attempts,
+                CardEnrichAttempt.next_attempt_at <= now,
+            ),
+        )
+    )
+
+
+async def record_failures(session: AsyncSession, card_ids: list[UUID], kind: str, error: str) -> None:
+    """+1 попытка; следующая не раньше чем через ENRICH_RETRY_BASE_SECONDS * 2^(попытки-1), не больше ENRICH_RETRY_MAX_SECONDS."""
+    if not card_ids:
+        return
+    now = datetime.now(timezone.utc)
+    base, cap = settings.enrich_retry_base_seconds, settings.enrich_retry_max_seconds
+    stmt = insert(CardEnrichAttempt).values([
+        {
+            "card_id": card_id,
+            "kind": kind,
+            "attempts": 1,
+            "last_attempt_at": now,
+            "next_attempt_at": now + timedelta(seconds=min(base, cap)),
+            "last_error": error[:1000],
+        }
+        for card_id in dict.fromkeys(card_ids)
+    ])
+    # В set_ CardEnrichAttempt.attempts — значение до обновления: после второй неудачи ждём base * 2
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["card_id", "kind"],
+        set_={
+            "attempts": CardEnrichAttempt.attempts + 1,
+            "last_attempt_at": now,
+            "next_attempt_at": literal(now, DateTime(timezone=True)) + func.make_interval(
+                0, 0, 0, 0, 0, 0,
+                func.least(float(base) * func.power(2.0, CardEnrichAttempt.attempts), float(cap)),
+                type_=Interval,
+            ),
+            "last_error": stmt.excluded.last_error,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def clear(session: AsyncSession, card_ids: list[UUID], kind: str | None = None) -> None:
+    """Забыть неудачные попытки: карточка обогащена или слово изменилось (kind=None — все виды)."""
+    if not card_ids:
+        return
+    q = delete(CardEnrichAttempt).where(CardEnrichAttempt.card_id.in_(card_ids))
+    if kind is not None:
+        q = q.where(CardEnrichAttempt.kind == kind)
+    await session.execute(q)
+
+
+async def get_stuck_cards(session: AsyncSession, deck_id: UUID) -> list[tuple[CardEnrichAttempt, Card]]:
+    """Неудачные попытки backfill по карточкам колоды (с самыми частыми неудачами — первыми)."""
+    result = await session.execute(
+        select(CardEnrichAttempt, Card)
+        .join(Card, Card.id == CardEnrichAttempt.card_id)
+        .where(Card.deck_id == deck_id)
+        .order_by(CardEnrichAttempt.attempts.desc(), Card.word)
+    )
+    return list(result.tuples().all())
@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
+from sqlalchemy import select, update, or_, and_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.job import Job, JobStatus
+
+
+async def create_job(
+    session: AsyncSession,
+    type: str,
+    user_id: UUID | None,
+    payload: dict,
+    max_attempts: int = 5,
+    dedup_key: str | None = None,
+    idempotency_key: str | None = None,
+) -> Job | None:
+    """
+    Новая задача в очереди. None — не создана: уже есть незавершённая задача с тем же dedup_key
+    или задача пользователя того же типа с тем же idempotency_key (ON CONFLICT DO NOTHING по частичным
+    уникальным индексам).
+    """
+    now = datetime.now(timezone.utc)
+    result = await session.execute(
+        insert(Job)
+        .values(
+            id=uuid4(),
+            type=type,
+            user_id=user_id,
+            payload=payload,
+            dedup_key=dedup_key,
+            idempotency_key=idempotency_key,
+            status=JobStatus.QUEUED,
+            attempts=0,
+            max_attempts=max_attempts,
+            run_after=now,
+            state={},
+            processed=0,
+            created_at=now,
+            updated_at=now,
+        )
+        .on_conflict_do_nothing()
+        .returning(Job.id)
+    )
+    job_id = result.scalar_one_or_none()
+    if job_id is None:
+        return None
+    return await get_job(session, job_id)
+
+
+async def find_active_job(session: AsyncSession, dedup_key: str) -> Job | None:
+    result = await session.execute(
+        select(Job).where(Job.dedup_key == dedup_key, Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]))
+    )
+    return result.scalars().first()
+
+
+async def find_job_by_idempotency_key(
+    session: AsyncSession, user_id: UUID | None, job_type: str, idempotency_key: str
+) -> Job | None:
+    """Задача пользователя этого типа с тем же Idempotency-Key: ключ, повторённый для другого эндпоинта, — не повтор."""
+    q = select(Job).where(Job.type == job_type, Job.idempotency_key == idempotency_key)
+    q = q.where(Job.user_id.is_(None) if user_id is None else Job.user_id == user_id)
+    result = await session.execute(q)
+    return result.scalars().first()
+
+
+async def get_job(session: AsyncSession, job_id: UUID, user_id: UUID | None = None) -> Job | None:
+    q = select(Job).where(Job.id == job_id)
+    if user_id is not None:
+        q = q.where(Job.user_id == user_id)
+    result = await session.execute(q)
+    return result.scalars().one_or_none()
+
+
+def _owned(job_id: UUID, worker_id: str):
+    """Задача всё ещё за этим воркером: после истёкшего lease её мог забрать другой, и запись старого теряется."""
+    return and_(Job.id == job_id, Job.locked_by == worker_id, Job.status == JobStatus.RUNNING)
+
+
+async def fail_expired_jobs(session: AsyncSession, types: list[str], lease_seconds: float) -> list:
+    """
+    Брошенные задачи, у которых не осталось попыток (воркер умирал на каждой — OOM, kill): окончательно failed
+    вместо повторного захвата. Строки (id, processed, total, state, error) — для событий. Коммит — на вызывающем.
+    """
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=lease_seconds)
+    result = await session.execute(
+        update(Job)
+        .where(
+            Job.type.in_(types),
+            Job.status == JobStatus.RUNNING,
+            Job.heartbeat_at < stale,
+            Job.attempts >= Job.max_attempts,
+        )
+        .values(
+            status=JobStatus.FAILED,
+            error=func.coalesce(Job.error, "Воркер перестал отвечать на последней попытке (истёк lease)"),
+            locked_by=None,
+            finished_at=now,
+            updated_at=now,
+        )
+        .returning(Job.id, Job.processed, Job.total, Job.state, Job.error)
+    )
+    return list(result.all())
+
+
+async def claim_job(session: AsyncSession, worker_id: str, types: list[str], lease_seconds: float) -> Job | None:
+    """
+    Забрать следующую задачу: готовую к запуску или брошенную (воркер не обновлял heartbeat дольше lease),
+    если у неё остались попытки. FOR UPDATE SKIP LOCKED — несколько воркеров не возьмут одну задачу.
+    Коммит — на вызывающем.
+    """
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=lease_seconds)
+    result = await session.execute(
+        select(Job)
+        .where(
+            Job.type.in_(types),
+            or_(
+                and_(Job.status == JobStatus.QUEUED, Job.run_after <= now),
+                and_(Job.status == JobStatus.RUNNING, Job.heartbeat_at < stale, Job.attempts < Job.max_attempts),
+            ),
+        )
+        .order_by(Job.run_after)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    job = result.scalars().first()
+    if job is None:
+        return None
+    job.status = JobStatus.RUNNING
+    job.attempts += 1
+    job.locked_by = worker_id
+    job.heartbeat_at = now
+    job.updated_at = now
+    await session.flush()
+    return job
+
+
+async def heartbeat(session: AsyncSession, job_id: UUID, worker_id: str) -> bool:
+    """False — задача уже не за этим воркером: исполнитель должен остановить обработчик."""
+    now = datetime.now(timezone.utc)
+    result = await session.execute(update(Job).where(_owned(job_id, worker_id)).values(heartbeat_at=now))
+    return result.rowcount > 0
+
+
+async def release_job(session: AsyncSession, job_id: UUID, worker_id: str, delay_seconds: float = 0) -> None:
+    """
+    Вернуть задачу в очередь (остановка воркера, ключ задачи занят другим исполнителем):
+    попытка не засчитывается, курсор state сохраняется.
+    """
+    now = datetime.now(timezone.utc)
+    await session.execute(
+        update(Job)
+        .where(_owned(job_id, worker_id))
+        .values(
+            status=JobStatus.QUEUED,
+            attempts=Job.attempts - 1,
+            locked_by=None,
+            run_after=now + timedelta(seconds=delay_seconds),
+            updated_at=now,
+        )
+    )
+
+
+async def save_progress(
+    session: AsyncSession,
+    job_id: UUID,
+    worker_id: str,
+    processed: int,
+    total: int | None = None,
+    state: dict | None = None,
+) -> bool:
+    """
+    Прогресс и курсор продолжения; вызывать в транзакции обработанной порции — коммитятся вместе.
+    False — задача уже не за этим воркером: порцию коммитить нельзя.
+    """
+    values = {"processed": processed, "updated_at": datetime.now(timezone.utc)}
+    if total is not None:
+        values["total"] = total
+    if state is not None:
+        values["state"] = state
+    result = await session.execute(update(Job).where(_owned(job_id, worker_id)).values(**values))
+    return result.rowcount > 0
+
+
+async def finish_job(session: AsyncSession, job_id: UUID, worker_id: str) -> bool:
+    """False — задача уже не за этим воркером, статус не меняется."""
+    now = datetime.now(timezone.utc)
+    result = await session.execute(
+        update(Job)
+        .where(_owned(job_id, worker_id))
+        .values(status=JobStatus.SUCCEEDED, error=None, locked_by=None, finished_at=now, updated_at=now)
+    )
+    return result.rowcount > 0
+
+
+async def fail_job(
+    session: AsyncSession, job_id: UUID, worker_id: str, error: str, retry_in_seconds: float | None
+) -> bool:
+    """
+    Ошибка попытки: retry_in_seconds — вернуть в очередь с задержкой, None — окончательно failed.
+    False — задача уже не за этим воркером, статус не меняется.
+    """
+    now = datetime.now(timezone.utc)
+    values = {"error": error, "locked_by": None, "updated_at": now}
+    if retry_in_seconds is None:
+        values.update(status=JobStatus.FAILED, finished_at=now)
+    else:
+        values.update(status=JobStatus.QUEUED, run_after=now + timedelta(seconds=retry_in_seconds))
+    result = await session.execute(update(Job).where(_owned(job_id, worker_id)).values(**values))
+    return result.rowcount > 0
@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.lexicon_entry import LexiconEntry
+
+
+async def get_entries(session: AsyncSession, words: list[str], prompt_version: str) -> dict[str, dict]:
+    """Сохранённые обогащения для списка слов (lower) одним запросом: слово -> {transcription, senses}."""
+    if not words:
+        return {}
+    result = await session.execute(
+        select(LexiconEntry.word, LexiconEntry.transcription, LexiconEntry.senses).where(
+            LexiconEntry.prompt_version == prompt_version, LexiconEntry.word.in_(words)
+        )
+    )
+    return {w: {"transcription": t, "senses": list(senses)} for w, t, senses in result.all()}
+
+
+async def add_entries(session: AsyncSession, prompt_version: str, entries: dict[str, dict]) -> None:
+    """Записать обогащения слов; уже сохранённые (параллельный backfill) не перезаписываются."""
+    if not entries:
+        return
+    now = datetime.now(timezone.utc)
+    stmt = insert(LexiconEntry).values([
+        {
+            "word": w,
+            "prompt_version": prompt_version,
+            "transcription": (data.get("transcription") or None) and data["transcription"][:255],
+            "senses": data.get("senses") or [],
+            "created_at": now,
+        }
+        for w, data in entries.items()
+    ])
+    await session.execute(stmt.on_conflict_do_nothing(index_elements=["word", "prompt_version"]))
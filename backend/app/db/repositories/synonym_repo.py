@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.synonym_group_suggestion import SynonymGroupSuggestion
+from app.models.word_synonyms import WordSynonyms
+
+
+async def get_synonyms(session: AsyncSession, words: list[str], prompt_version: str) -> dict[str, list[str]]:
+    """Сохранённые синонимы для списка слов (lower) одним запросом. Слов, которых ещё не спрашивали, в ответе нет."""
+    if not words:
+        return {}
+    result = await session.execute(
+        select(WordSynonyms.word, WordSynonyms.synonyms).where(
+            WordSynonyms.prompt_version == prompt_version, WordSynonyms.word.in_(words)
+        )
+    )
+    return {w: list(syns) for w, syns in result.all()}
+
+
+async def add_synonyms(session: AsyncSession, prompt_version: str, synonyms: dict[str, list[str]]) -> None:
+    """Записать синонимы слов; уже сохранённые (параллельный запрос) не перезаписываются."""
+    if not synonyms:
+        return
+    now = datetime.now(timezone.utc)
+    stmt = insert(WordSynonyms).values([
+        {"word": w, "prompt_version": prompt_version, "synonyms": syns, "created_at": now}
+        for w, syns in synonyms.items()
+    ])
+    await session.execute(stmt.on_conflict_do_nothing(index_elements=["word", "prompt_version"]))
+
+
+async def get_group_suggestion(
+    session: AsyncSession, deck_id: UUID, mode: str, fingerprint: str
+) -> list[tuple[list[str], list[str]]] | None:
+    """Сохранённые группы (card_ids, words) колоды, если отпечаток совпадает; иначе None."""
+    result = await session.execute(
+        select(SynonymGroupSuggestion.groups).where(
+            SynonymGroupSuggestion.deck_id == deck_id,
+            SynonymGroupSuggestion.mode == mode,
+            SynonymGroupSuggestion.fingerprint == fingerprint,
+        )
+    )
+    groups = result.scalars().first()
+    if groups is None:
+        return None
+    return [(g["card_ids"], g["words"]) for g in groups]
+
+
+async def save_group_suggestion(
+    session: AsyncSession, deck_id: UUID, mode: str, fingerprint: str, groups: list[tuple[list[str], list[str]]]
+) -> None:
+    values = {
+        "fingerprint": fingerprint,
+        "groups": [{"card_ids": card_ids, "words": words} for card_ids, words in groups],
+        "created_at": datetime.now(timezone.utc),
+    }
+    stmt = insert(SynonymGroupSuggestion).values(deck_id=deck_id, mode=mode, **values)
+    await session.execute(stmt.on_conflict_do_update(index_elements=["deck_id", "mode"], set_=values))
@@ -0,0 +1,30 @@
+from datetime import datetime
+from uuid import UUID, uuid4
+from sqlalchemy import select, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.llm_usage import LLMUsage
+
+
+async def add_usage_records(session: AsyncSession, rows: list[dict]) -> None:
+    """Пакетная вставка записей расхода (rows: user_id, endpoint, provider, prompt_tokens, completion_tokens, created_at)."""
+    if not rows:
+        return
+    await session.execute(insert(LLMUsage), [{"id": uuid4(), **r} for r in rows])
+
+
+async def get_usage_summary(session: AsyncSession, user_id: UUID, since: datetime) -> list:
+    """Суммарный расход пользователя с момента since по эндпоинтам и провайдерам."""
+    result = await session.execute(
+        select(
+            LLMUsage.endpoint,
+            LLMUsage.provider,
+            func.count().label("requests"),
+            func.sum(LLMUsage.prompt_tokens).label("prompt_tokens"),
+            func.sum(LLMUsage.completion_tokens).label("completion_tokens"),
+        )
+        .where(LLMUsage.user_id == user_id, LLMUsage.created_at >= since)
+        .group_by(LLMUsage.endpoint, LLMUsage.provider)
+        .order_by(func.sum(LLMUsage.prompt_tokens + LLMUsage.completion_tokens).desc())
+    )
+    return list(result.all())
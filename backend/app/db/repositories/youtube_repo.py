@@ -4,7 +4,7 @@ from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
-from app.models.youtube_video import YouTubeVideo
+from app.models.youtube_video import TranscriptSource, YouTubeVideo
 from app.models.user_youtube_video import UserYouTubeVideo
 from app.models.ielts_exam_part import IeltsExamPart
 
@@ -44,11 +44,15 @@ async def get_video_by_id(session: AsyncSession, id: UUID) -> Optional[YouTubeVi
     result = await session.execute(select(YouTubeVideo).where(YouTubeVideo.id == id))
     return result.scalars().first()
 
-async def create_video(session: AsyncSession, video_id: str, url: str, transcription: str, translation: str, summary: str) -> YouTubeVideo:
+async def create_video(
+    session: AsyncSession, video_id: str, url: str, transcription: str, translation: str, summary: str,
+    transcript_source: str = TranscriptSource.WHISPER,
+) -> YouTubeVideo:
     video = YouTubeVideo(
         video_id=video_id,
         url=url,
         transcription=transcription,
+        transcript_source=transcript_source,
         translation=translation,
         summary=summary
     )
@@ -84,3 +88,9 @@ async def get_user_history(session: AsyncSession, user_id: UUID, limit: int = 50
         .offset(offset)
     )
     return list(result.scalars().all())
+
+async def update_video_summary(session: AsyncSession, video: YouTubeVideo, translation: str, summary: str) -> YouTubeVideo:
+    video.translation = translation
+    video.summary = summary
+    await session.flush()
+    return video
@@ -2,16 +2,31 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from app.config import settings
 from app.db.base import Base
 
-engine = create_async_engine(
-    settings.database_url,
-    echo=False,
-)
+
+
+def _create_engine(pool_size: int, max_overflow: int):
+    return create_async_engine(
+        settings.database_url,
+        echo=False,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+    )
+
+
+engine = _create_engine(settings.db_pool_size, settings.db_max_overflow)
 
 async_session_maker = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
 
+def use_pool(pool_size: int, max_overflow: int) -> None:
+    """Пересоздать engine с другим размером пула (процесс воркера задач); вызывать до первого запроса к БД."""
+    global engine
+    engine = _create_engine(pool_size, max_overflow)
+    async_session_maker.configure(bind=engine)
+
+
 async def get_db():
     async with async_session_maker() as session:
         try:
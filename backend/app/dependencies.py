@@ -1,17 +1,19 @@
 from uuid import UUID
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_db
 from app.db.repositories.user_repo import get_user_by_id
 from app.services.auth_service import decode_access_token
+from app.services import llm_gateway
 from app.models.user import User
 
 security = HTTPBearer(auto_error=False)
 
 
 async def get_current_user(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     credentials: HTTPAuthorizationCredentials | None = Depends(security),
 ) -> User:
@@ -37,4 +39,7 @@ async def get_current_user(
     user = await get_user_by_id(db, uid)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    # Вызовы LLM в рамках запроса учитываются на этого пользователя и шаблон пути эндпоинта
+    route = request.scope.get("route")
+    llm_gateway.set_call_context(user.id, getattr(route, "path", request.url.path))
     return user
@@ -0,0 +1,68 @@
+"""Фоновые задачи в Postgres (таблица jobs) вместо BackgroundTasks.
+
+Задача переживает рестарт процесса: эндпоинт ставит её в очередь (enqueue + commit + notify) и сразу
+отвечает 202 с job_id; воркер в другом процессе будит pg_notify из транзакции enqueue, исполнитель (runner.run_worker) забирает её, пишет прогресс и курсор продолжения,
+статус — GET /jobs/{job_id}.
+"""
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.repositories import job_repo
+from app.jobs.runner import notify, run_worker
+from app.models.job import Job
+from app.services import job_events
+
+BACKFILL_POS = "backfill_pos"
+BACKFILL_TRANSCRIPTIONS = "backfill_transcriptions"
+SEED_EXAM_BANK = "seed_exam_bank"
+SUGGEST_SYNONYM_GROUPS = "suggest_synonym_groups"
+YOUTUBE_PROCESS = "youtube_process"
+
+__all__ = [
+    "BACKFILL_POS", "BACKFILL_TRANSCRIPTIONS", "SEED_EXAM_BANK", "SUGGEST_SYNONYM_GROUPS", "YOUTUBE_PROCESS",
+    "dedup_key", "enqueue", "notify", "run_worker",
+]
+
+
+def dedup_key(job_type: str, scope: UUID | str | None) -> str:
+    """Ключ «одна активная задача»: тип + колода/пользователь (или всё приложение)."""
+    return f"{job_type}:{scope if scope is not None else '*'}"
+
+
+async def enqueue(
+    db: AsyncSession,
+    job_type: str,
+    user_id: UUID | None,
+    payload: dict,
+    dedup_key: str | None = None,
+    idempotency_key: str | None = None,
+) -> tuple[Job, bool]:
+    """
+    Поставить задачу в очередь; (job, created). created=False — повтор: задача того же типа с тем же Idempotency-Key
+    или уже идущая задача с тем же dedup_key, клиент получает её job_id. Коммит — на вызывающем, после него — notify().
+    """
+    if idempotency_key:
+        job = await job_repo.find_job_by_idempotency_key(db, user_id, job_type, idempotency_key)
+        if job is not None:
+            return job, False
+    for _ in range(3):
+        job = await job_repo.create_job(
+            db, job_type, user_id, payload,
+            max_attempts=settings.jobs_max_attempts, dedup_key=dedup_key, idempotency_key=idempotency_key,
+        )
+        if job is not None:
+            await job_events.publish_job_queued(db, job_type)
+            return job, True
+        # Конфликт: параллельный запрос с тем же ключом идемпотентности или активная задача;
+        # если та успела завершиться между INSERT и SELECT — пробуем вставить снова
+        if idempotency_key:
+            job = await job_repo.find_job_by_idempotency_key(db, user_id, job_type, idempotency_key)
+            if job is not None:
+                return job, False
+        if dedup_key:
+            job = await job_repo.find_active_job(db, dedup_key)
+            if job is not None:
+                return job, False
+    raise RuntimeError(f"Не удалось поставить задачу {job_type} в очередь: конфликт ключа {dedup_key}")
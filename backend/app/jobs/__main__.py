@@ -0,0 +1,72 @@
+"""Отдельный процесс исполнения фоновых задач: python -m app.jobs [--concurrency N] [--types a,b].
+
+Backfill и наполнение банка экзаменов не делят с uvicorn event loop, пул соединений и threadpool:
+у воркера свои JOBS_CONCURRENCY, JOBS_DB_POOL_SIZE / JOBS_DB_MAX_OVERFLOW и JOBS_THREADPOOL_SIZE.
+Процессов можно запустить сколько угодно — задачи разбираются через SKIP LOCKED.
+SIGTERM / Ctrl+C: незавершённые задачи возвращаются в очередь, расход LLM сбрасывается в БД.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from anyio import to_thread
+
+from app.config import settings
+from app.db import session as db_session
+from app.jobs import runner
+from app.services import job_events, llm_gateway
+
+logger = logging.getLogger("app.jobs")
+
+
+async def _main(args: argparse.Namespace) -> None:
+    to_thread.current_default_thread_limiter().total_tokens = settings.jobs_threadpool_size
+    worker = asyncio.create_task(
+        runner.run_worker(worker_id=args.worker_id, concurrency=args.concurrency, types=args.types)
+    )
+    flusher = asyncio.create_task(llm_gateway.run_usage_flusher())
+    # LISTEN jobs: новая задача из процесса API будит воркер сразу, опрос очереди — запасной путь
+    listener = asyncio.create_task(job_events.run_listener())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, worker.cancel)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await worker
+    except asyncio.CancelledError:
+        pass
+    finally:
+        flusher.cancel()
+        listener.cancel()
+        await job_events.close()
+        await llm_gateway.flush_usage()
+        await db_session.engine.dispose()
+        logger.info("Воркер задач остановлен")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=settings.jobs_concurrency)
+    parser.add_argument("--types", type=lambda s: [t.strip() for t in s.split(",") if t.strip()], default=None,
+                        help="типы задач через запятую (по умолчанию все зарегистрированные)")
+    parser.add_argument("--worker-id", default=None, help="по умолчанию hostname:pid")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level.upper(), logging.INFO),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    db_session.use_pool(settings.jobs_db_pool_size, settings.jobs_db_max_overflow)
+    logger.info(
+        "Воркер задач: concurrency=%s, пул БД %s+%s, потоков %s",
+        args.concurrency, settings.jobs_db_pool_size, settings.jobs_db_max_overflow, settings.jobs_threadpool_size,
+    )
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Обработчики задач очереди: backfill части речи и транскрипций, наполнение банка экзаменов IELTS,
+подбор групп синонимов колоды, обработка видео YouTube (POST /youtube/process).
+
+Каждый обработчик коммитит порцию вместе с курсором (ctx.checkpoint), так что ретрай после ошибки
+или падения процесса продолжает с места остановки. Карточка, которую не удалось обновить, логируется
+и пропускается — курсор по id уходит дальше, она не выбирается повторно.
+Неудача по карточке (модель ответила, но без значений) пишется в card_enrich_attempts: следующие backfill
+не спрашивают модель про это слово до истечения паузы, после ENRICH_MAX_ATTEMPTS — совсем (список —
+GET /decks/{id}/stuck-words). Ошибка провайдера или БД на порции пробрасывается: задача уходит в ретрай
+с той же порции, попытки слов не засчитываются — слово не виновато в недоступности модели.
+Обогащение слов — через общий lexicon_entries (lexicon_service): модель спрашивается только о словах,
+которых там нет, результат раскладывается по карточкам порции одним UPDATE.
+Обработка видео — конвейер стадий со своими лимитами в процессе: стадия пишется в state, транскрипция
+сохраняется до резюме, так что клиент видит её раньше, а ретрай не распознаёт видео заново.
+Если у видео есть подходящие английские субтитры (captions_service), скачивание и Whisper пропускаются.
+Подбор групп синонимов пишет в state частичные группы по уже полученным синонимам после каждого батча модели.
+"""
+import asyncio
+import logging
+import random
+from uuid import UUID
+
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.db.repositories import card_repo, enrich_attempt_repo, youtube_repo
+from app.jobs import BACKFILL_POS, BACKFILL_TRANSCRIPTIONS, SEED_EXAM_BANK, SUGGEST_SYNONYM_GROUPS, YOUTUBE_PROCESS
+from app.jobs.runner import JobContext, handler
+from app.models.card_enrich_attempt import EnrichKind
+from app.models.youtube_video import TranscriptSource, YouTubeVideo
+from app.services import (
+    captions_service, gemini_service, job_events, lexicon_service, llm_gateway, synonym_service,
+    transcription_service, youtube_service,
+)
+
+logger = logging.getLogger(__name__)
+
+# Размер порции при подгрузке карточек (без лимита обрабатываем все)
+_BACKFILL_FETCH_CHUNK = 100
+
+
+async def _record_outcome(db, chunk: list, failed: list[UUID], kind: str, error: str) -> None:
+    failed_ids = set(failed)
+    await enrich_attempt_repo.clear(db, [c.id for c in chunk if c.id not in failed_ids], kind)
+    await enrich_attempt_repo.record_failures(db, failed, kind, error)
+
+
+def _cursor(ctx: JobContext) -> UUID | None:
+    after_id = ctx.state.get("after_id")
+    return UUID(after_id) if after_id else None
+
+
+def _clip(value: str | None, length: int) -> str | None:
+    return value[:length] if value else value
+
+
+async def _apply_senses(db, deck_id: UUID, chunk: list, entries: dict[str, dict]) -> tuple[list[UUID], list[UUID]]:
+    """
+    Карточке — первое значение слова (один UPDATE на порцию), для остальных частей речи — новые карточки
+    (один INSERT), если такой части речи у слова в колоде ещё нет. (изменённые и созданные id, id без значений).
+    """
+    existing = await card_repo.get_word_pos_in_deck(db, deck_id, {lexicon_service.normalize(c.word) for c in chunk})
+    updates: list[dict] = []
+    new_cards: list[dict] = []
+    failed: list[UUID] = []
+    for card in chunk:
+        word = lexicon_service.normalize(card.word)
+        data = entries.get(word) or {}
+        senses = data.get("senses") or []
+        if not senses or not senses[0].get("part_of_speech"):
+            failed.append(card.id)
+            continue
+        transcription = _clip(data.get("transcription"), 100)
+        pronunciation_url = gemini_service.get_pronunciation_url(card.word or "")
+        first = senses[0]
+        updates.append({
+            "id": card.id,
+            "part_of_speech": first["part_of_speech"][:32],
+            "translation": _clip(first.get("translation"), 512) or card.translation,
+            "example": first.get("example") or card.example,
+            "transcription": transcription or card.transcription,
+            "pronunciation_url": pronunciation_url or card.pronunciation_url,
+            "examples": first.get("examples") or card.examples,
+        })
+        existing.add((word, first["part_of_speech"][:32]))
+        for sense in senses[1:]:
+            pos = (sense.get("part_of_speech") or "")[:32]
+            if not pos or (word, pos) in existing:
+                continue
+            existing.add((word, pos))
+            new_cards.append({
+                "deck_id": deck_id,
+                "word": card.word or "",
+                "translation": _clip(sense.get("translation"), 512) or "",
+                "example": sense.get("example"),
+                "transcription": transcription,
+                "pronunciation_url": pronunciation_url,
+                "part_of_speech": pos,
+                "examples": sense.get("examples"),
+            })
+    await card_repo.bulk_update_cards(db, updates)
+    created = await card_repo.bulk_create_cards(db, new_cards)
+    return [u["id"] for u in updates] + created, failed
+
+
+@handler(BACKFILL_POS, endpoint="/decks/{deck_id}/backfill-pos")
+async def backfill_pos(ctx: JobContext) -> None:
+    """Все карточки колоды без part_of_speech: переводы по частям речи, новые карточки для остальных частей речи."""
+    from app.db.session import async_session_maker
+
+    deck_id = UUID(ctx.payload["deck_id"])
+    after_id = _cursor(ctx)
+    processed = ctx.processed
+    async with async_session_maker() as db:
+        if "after_id" not in ctx.state:
+            total = await card_repo.count_cards_missing_pos(db, ctx.user_id, deck_id=deck_id)
+            await ctx.checkpoint(db, processed, total=total)
+            await db.commit()
+        while True:
+            chunk = await card_repo.get_cards_missing_pos(
+                db, ctx.user_id, deck_id=deck_id, limit=_BACKFILL_FETCH_CHUNK, after_id=after_id
+            )
+            if not chunk:
+                break
+            # Все различные слова порции — одним запросом к lexicon_entries, модели — только недостающие
+            entries = await lexicon_service.get_enrichment_for_words(db, [c.word for c in chunk])
+            changed, failed = await _apply_senses(db, deck_id, chunk, entries)
+            await _record_outcome(db, chunk, failed, EnrichKind.POS, "no senses")
+            after_id = chunk[-1].id
+            processed += len(chunk)
+            await ctx.checkpoint(db, processed, state={"after_id": str(after_id)}, card_ids=changed)
+            # Воркер — отдельный процесс: векторный индекс и батчер эмбеддингов живут в процессах API
+            await job_events.publish_cards_changed(db, ctx.user_id)
+            await db.commit()
+
+
+@handler(BACKFILL_TRANSCRIPTIONS, endpoint="/ai/backfill-transcriptions")
+async def backfill_transcriptions(ctx: JobContext) -> None:
+    """Транскрипции и ссылки на произношение у всех карточек пользователя (или колоды), где их нет."""
+    from app.db.session import async_session_maker
+
+    deck_id = UUID(ctx.payload["deck_id"]) if ctx.payload.get("deck_id") else None
+    after_id = _cursor(ctx)
+    processed = ctx.processed
+    async with async_session_maker() as db:
+        if "after_id" not in ctx.state:
+            total = await card_repo.count_cards_missing_transcription(db, ctx.user_id, deck_id=deck_id)
+            await ctx.checkpoint(db, processed, total=total)
+            await db.commit()
+        while True:
+            chunk = await card_repo.get_cards_missing_transcription(
+                db, ctx.user_id, deck_id=deck_id, limit=_BACKFILL_FETCH_CHUNK, after_id=after_id
+            )
+            if not chunk:
+                break
+            updates: list[dict] = []
+            failed: list[UUID] = []
+            entries = await lexicon_service.get_enrichment_for_words(db, [c.word for c in chunk])
+            for card in chunk:
+                data = entries.get(lexicon_service.normalize(card.word)) or {}
+                transcription = _clip((data.get("transcription") or "").strip() or None, 100)
+                pronunciation_url = gemini_service.get_pronunciation_url(card.word or "")
+                updates.append({
+                    "id": card.id,
+                    "transcription": transcription or card.transcription,
+                    "pronunciation_url": pronunciation_url or card.pronunciation_url,
+                })
+                if not (transcription or card.transcription) or not (pronunciation_url or card.pronunciation_url):
+                    failed.append(card.id)
+            await card_repo.bulk_update_cards(db, updates)
+            await _record_outcome(db, chunk, failed, EnrichKind.TRANSCRIPTION, "no transcription")
+            after_id = chunk[-1].id
+            processed += len(chunk)
+            await ctx.checkpoint(db, processed, state={"after_id": str(after_id)}, card_ids=[u["id"] for u in updates])
+            await db.commit()
+
+
+async def _seed_variant(db, part_num: int) -> None:
+    query = f"ielts listening practice test part {part_num} short"
+    search_results = await youtube_service.search_youtube_videos(query, limit=10)
+    # Pick a random one from search results to avoid always picking the same
+    selected_video = random.choice(search_results)
+    y_video_id = selected_video["video_id"]
+    url = selected_video["url"]
+
+    # Check if already in bank
+    existing_video = await youtube_repo.get_video_by_youtube_id(db, y_video_id)
+    if existing_video:
+        existing_part = await youtube_repo.get_exam_part_by_video_id(db, existing_video.id, part_num)
+        if existing_part:
+            return
+
+    # Process: Captions or Download + Transcribe, Generate
+    db_video = await youtube_repo.get_video_by_youtube_id(db, y_video_id)
+    if db_video:
+        transcript = db_video.transcription
+    else:
+        transcript, source = await youtube_service.get_transcript(url)
+        db_video = await youtube_repo.create_video(db, y_video_id, url, transcript, "", "", transcript_source=source)
+    questions_payload = await llm_gateway.run_in_thread(gemini_service.generate_ielts_exam_part, transcript, part_num)
+    await youtube_repo.create_exam_part(db, db_video.id, part_num, questions_payload.get("questions", []))
+
+
+@handler(SEED_EXAM_BANK, endpoint="/youtube/exam/bank/seed")
+async def seed_exam_bank(ctx: JobContext) -> None:
+    """count вариантов каждой части (1-4) экзамена: поиск видео, транскрипция, вопросы. Ошибка варианта — пропуск."""
+    from app.db.session import async_session_maker
+
+    count = int(ctx.payload.get("count", 5))
+    part_num = int(ctx.state.get("part", 1))
+    variant = int(ctx.state.get("variant", 0))
+    processed = ctx.processed
+    async with async_session_maker() as db:
+        while part_num <= 4:
+            while variant < count:
+                try:
+                    await _seed_variant(db, part_num)
+                    logger.info(f"Successfully seeded Part {part_num} variant {variant + 1}")
+                except Exception:
+                    logger.exception(f"Error seeding Exam Bank Part {part_num} variant {variant + 1}")
+                    await db.rollback()
+                variant += 1
+                processed += 1
+                await ctx.checkpoint(
+                    db, processed, total=4 * count, state={"part": part_num, "variant": variant}
+                )
+                await db.commit()
+            part_num, variant = part_num + 1, 0
+
+
+def _group_items(groups: list[tuple[list[str], list[str]]]) -> list[dict]:
+    return [{"card_ids": card_ids, "words": words} for card_ids, words in groups]
+
+
+@handler(SUGGEST_SYNONYM_GROUPS, endpoint="/ai/synonym-groups/suggest/jobs")
+async def suggest_synonym_groups(ctx: JobContext) -> None:
+    """
+    Группы синонимов колоды (synonym_service.suggest_groups): processed/total — батчи к модели, в state.groups —
+    группы по уже полученным синонимам, по завершении — итог (он же сохраняется в synonym_group_suggestions).
+    """
+    from app.db.session import async_session_maker
+
+    deck_id = UUID(ctx.payload["deck_id"])
+    latest: dict = {}
+    changed = asyncio.Event()
+
+    def progress(cards: list, found: dict[str, list[str]], done: int, total: int) -> None:
+        latest.update(cards=cards, found=found, done=done, total=total)
+        changed.set()
+
+    async def publish() -> None:
+        # Батчи идут параллельно и сессию подбора не трогают: прогресс пишется своей сессией,
+        # несколько батчей, завершившихся во время записи, — одной записью
+        async with async_session_maker() as db:
+            while True:
+                await changed.wait()
+                changed.clear()
+                groups = synonym_service.build_synonym_groups(
+                    latest["cards"], synonym_service.synonym_map(latest["cards"], latest["found"])
+                )
+                await ctx.checkpoint(db, latest["done"], total=latest["total"], state={"groups": _group_items(groups)})
+                await db.commit()
+
+    writer = asyncio.create_task(publish())
+    try:
+        async with async_session_maker() as db:
+            groups = await synonym_service.suggest_groups(
+                db, deck_id, ctx.payload["mode"], fingerprint=ctx.payload.get("fingerprint"), progress=progress
+            )
+    finally:
+        writer.cancel()
+        await asyncio.gather(writer, return_exceptions=True)
+    async with async_session_maker() as db:
+        total = latest.get("total") or 0
+        await ctx.checkpoint(db, total, total=total, state={"groups": _group_items(groups)})
+        await db.commit()
+
+
+# Стадии обработки видео: search (только без URL) → captions → download → transcribe → summarize → done;
+# download и transcribe пропускаются, если подошли субтитры. processed/total — пройденные из трёх основных
+_YOUTUBE_STAGES_TOTAL = 3
+_stage_limits: dict[str, asyncio.Semaphore] = {}
+
+
+def _stage_limit(stage: str) -> asyncio.Semaphore:
+    """Лимит стадии в процессе воркера: YOUTUBE_{STAGE}_CONCURRENCY."""
+    if stage not in _stage_limits:
+        _stage_limits[stage] = asyncio.Semaphore(max(1, getattr(settings, f"youtube_{stage}_concurrency")))
+    return _stage_limits[stage]
+
+
+async def _enter_stage(ctx: JobContext, db, state: dict, stage: str, processed: int) -> None:
+    state["stage"] = stage
+    await ctx.checkpoint(db, processed, total=_YOUTUBE_STAGES_TOTAL, state=state)
+    await db.commit()
+
+
+async def _find_video(db, state: dict) -> YouTubeVideo | None:
+    if state.get("video"):
+        return await youtube_repo.get_video_by_id(db, UUID(state["video"]))
+    if state.get("video_id") and state["video_id"] != "unknown":
+        return await youtube_repo.get_video_by_youtube_id(db, state["video_id"])
+    return None
+
+
+async def _download_and_transcribe(ctx: JobContext, db, state: dict) -> str:
+    await _enter_stage(ctx, db, state, "download", 0)
+    async with _stage_limit("download"):
+        audio_path = await youtube_service.download_youtube_audio(state["url"])
+    try:
+        await _enter_stage(ctx, db, state, "transcribe", 1)
+        async with _stage_limit("transcribe"):
+            return await transcription_service.transcribe_to_text(audio_path)
+    finally:
+        youtube_service.remove_audio(audio_path)
+
+
+async def _fetch_transcript(ctx: JobContext, db, state: dict) -> tuple[str, str]:
+    """Транскрипция и её источник: субтитры YouTube, если подходят, иначе download → transcribe."""
+    await _enter_stage(ctx, db, state, "captions", 0)
+    captions = await captions_service.fetch_captions(state["url"])
+    if captions:
+        return transcription_service.segments_to_text(captions), captions["source"]
+    return await _download_and_transcribe(ctx, db, state), TranscriptSource.WHISPER
+
+
+async def _save_transcript(db, video: YouTubeVideo | None, state: dict, transcript: str, source: str) -> YouTubeVideo:
+    if video is not None:
+        # Строка без транскрипции (например, недосохранённая) — дописываем в неё
+        video.transcription = transcript
+        video.transcript_source = source
+        await db.flush()
+        return video
+    try:
+        return await youtube_repo.create_video(
+            db, state["video_id"], state["url"], transcript, "", "", transcript_source=source
+        )
+    except IntegrityError:
+        # То же видео параллельно обработала задача другого пользователя
+        await db.rollback()
+        video = await youtube_repo.get_video_by_youtube_id(db, state["video_id"])
+        if video is None:
+            raise
+        return video
+
+
+@handler(YOUTUBE_PROCESS, endpoint="/youtube/process")
+async def youtube_process(ctx: JobContext) -> None:
+    """
+    Видео по ссылке (без ссылки — случайное IELTS-видео): взять субтитры или скачать и распознать,
+    перевести и кратко изложить.
+    Видео уже есть в youtube_videos — пропускаются стадии, результат которых сохранён. В конце — в историю пользователя.
+    """
+    from app.db.session import async_session_maker
+
+    state = dict(ctx.state)
+    state.setdefault("url", ctx.payload.get("url"))
+    state.setdefault("video_id", ctx.payload.get("video_id"))
+    async with async_session_maker() as db:
+        if not state["url"]:
+            await _enter_stage(ctx, db, state, "search", 0)
+            found = await youtube_service.search_ielts_video()
+            state.update(url=found["url"], video_id=found["video_id"])
+
+        video = await _find_video(db, state)
+        if video is None or not video.transcription:
+            transcript, source = await _fetch_transcript(ctx, db, state)
+            video = await _save_transcript(db, video, state, transcript, source)
+        await youtube_repo.add_to_user_history(db, ctx.user_id, video.id)
+        state["video"] = str(video.id)
+        # Транскрипция закоммичена вместе со стадией: GET /youtube/process/{job_id} уже отдаёт её
+        await _enter_stage(ctx, db, state, "summarize", 2)
+
+        if not video.summary:
+            async with _stage_limit("summarize"):
+                summary_result = await llm_gateway.run_in_thread(
+                    gemini_service.summarize_youtube_video,
+                    video.transcription, target_lang=ctx.payload.get("target_lang", "ru"),
+                )
+            await youtube_repo.update_video_summary(
+                db, video, summary_result.get("translation", ""), summary_result.get("summary", "")
+            )
+        await _enter_stage(ctx, db, state, "done", _YOUTUBE_STAGES_TOTAL)
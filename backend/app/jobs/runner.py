@@ -0,0 +1,330 @@
+"""Исполнитель задач из таблицы jobs.
+
+Цикл забирает задачу через SELECT ... FOR UPDATE SKIP LOCKED (claim_job), пока она выполняется —
+обновляет heartbeat; задача, чей воркер умер (рестарт, деплой), по истечении JOBS_LEASE_SECONDS
+забирается снова. Обработчик коммитит каждую порцию вместе с курсором в jobs.state (JobContext.checkpoint),
+поэтому повторная попытка продолжает с последней закоммиченной порции, а не с начала.
+Ошибка обработчика — ретрай с экспоненциальной задержкой, после JOBS_MAX_ATTEMPTS — status failed.
+На время выполнения берётся advisory lock по dedup_key задачи: даже если задачу с тем же ключом
+забрали дважды (истёкший lease у живого воркера), по одной колоде работает один исполнитель.
+Записи исполнителя (прогресс, итог, heartbeat) проходят, только пока задача за ним (locked_by): если lease
+истёк и задачу забрал другой воркер, heartbeat это замечает и останавливает обработчик, а порция, которую
+он успел посчитать, не коммитится. Брошенная задача без оставшихся попыток не забирается, а помечается failed.
+"""
+import asyncio
+import logging
+import os
+import socket
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.repositories import job_repo
+from app.models.job import JobStatus
+from app.services import job_events, llm_gateway
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobContext:
+    id: UUID
+    type: str
+    user_id: UUID | None
+    payload: dict
+    dedup_key: str | None = None
+    state: dict = field(default_factory=dict)
+    processed: int = 0
+    total: int | None = None
+    attempts: int = 1
+    max_attempts: int = 1
+    worker_id: str = ""
+
+    async def checkpoint(
+        self,
+        db: AsyncSession,
+        processed: int,
+        total: int | None = None,
+        state: dict | None = None,
+        card_ids: list | None = None,
+    ) -> None:
+        """
+        Прогресс и курсор продолжения в транзакции db; коммит — на обработчике, вместе с порцией.
+        card_ids — изменённые порцией карточки: уходят подписчикам GET /jobs/{id}/events после коммита.
+        """
+        self.processed = processed
+        if total is not None:
+            self.total = total
+        if state is not None:
+            self.state = state
+        if not await job_repo.save_progress(db, self.id, self.worker_id, processed, total=total, state=state):
+            raise LeaseLost(self.id)
+        await job_events.publish(
+            db,
+            job_events.event(
+                self.id, JobStatus.RUNNING, processed, self.total, [str(i) for i in card_ids or []], stage=self.stage
+            ),
+        )
+
+    @property
+    def stage(self) -> str | None:
+        return self.state.get("stage")
+
+
+class LeaseLost(Exception):
+    """Задача больше не за этим воркером (истёк lease, её забрал другой): результат не записывается."""
+
+
+Handler = Callable[[JobContext], Awaitable[None]]
+
+
+@dataclass
+class _Registered:
+    handler: Handler
+    endpoint: str  # endpoint для учёта вызовов LLM (llm_gateway.call_context)
+
+
+_handlers: dict[str, _Registered] = {}
+
+
+def handler(job_type: str, endpoint: str) -> Callable[[Handler], Handler]:
+    """Зарегистрировать обработчик задач типа job_type."""
+    def register(fn: Handler) -> Handler:
+        _handlers[job_type] = _Registered(fn, endpoint)
+        return fn
+    return register
+
+
+def job_types() -> list[str]:
+    return list(_handlers)
+
+
+_wakeup: asyncio.Event | None = None
+
+
+def notify() -> None:
+    """
+    Разбудить исполнитель этого процесса: в очереди новая задача (вызывать после commit).
+    Исполнители других процессов будит pg_notify канала jobs (job_events.publish_job_queued).
+    """
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts: int) -> float:
+    return min(settings.jobs_retry_base_seconds * 2 ** max(attempts - 1, 0), settings.jobs_retry_max_seconds)
+
+
+async def _claim(worker_id: str, types: list[str]) -> JobContext | None:
+    from app.db.session import async_session_maker
+
+    async with async_session_maker() as db:
+        for row in await job_repo.fail_expired_jobs(db, types, settings.jobs_lease_seconds):
+            logger.error("Задача %s брошена на последней попытке, помечена failed", row.id)
+            stage = (row.state or {}).get("stage")
+            await job_events.publish(
+                db, job_events.event(row.id, JobStatus.FAILED, row.processed, row.total, error=row.error, stage=stage)
+            )
+        job = await job_repo.claim_job(db, worker_id, types, settings.jobs_lease_seconds)
+        if job is None:
+            await db.commit()
+            return None
+        ctx = JobContext(
+            id=job.id,
+            type=job.type,
+            user_id=job.user_id,
+            payload=dict(job.payload or {}),
+            dedup_key=job.dedup_key,
+            state=dict(job.state or {}),
+            processed=job.processed,
+            total=job.total,
+            attempts=job.attempts,
+            max_attempts=job.max_attempts,
+            worker_id=worker_id,
+        )
+        await db.commit()
+    return ctx
+
+
+async def _heartbeat(job_id: UUID, worker_id: str, work: asyncio.Task, lost: asyncio.Event) -> None:
+    """Продлевать lease; задача ушла к другому воркеру — отметить lost и отменить обработчик."""
+    from app.db.session import async_session_maker
+
+    while True:
+        await asyncio.sleep(settings.jobs_lease_seconds / 3)
+        try:
+            async with async_session_maker() as db:
+                alive = await job_repo.heartbeat(db, job_id, worker_id)
+                await db.commit()
+        except Exception:
+            logger.exception("Не удалось обновить heartbeat задачи %s", job_id)
+            continue
+        if not alive:
+            lost.set()
+            work.cancel()
+            return
+
+
+class _KeyBusy(Exception):
+    """dedup_key задачи занят другим исполнителем (advisory lock не взят)."""
+
+
+@asynccontextmanager
+async def _advisory_lock(key: str | None) -> AsyncIterator[None]:
+    """
+    Сессионный pg_try_advisory_lock(key) на всё время задачи. Отдельное соединение: обработчик
+    коммитит порции, и транзакционная блокировка снималась бы после первой же.
+    """
+    if key is None:
+        yield
+        return
+    from app.db import session as db_session
+
+    lock_id = func.hashtextextended(key, 0)
+    async with db_session.engine.connect() as conn:
+        acquired = await conn.scalar(select(func.pg_try_advisory_lock(lock_id)))
+        await conn.commit()
+        if not acquired:
+            raise _KeyBusy(key)
+        try:
+            yield
+        finally:
+            try:
+                await conn.scalar(select(func.pg_advisory_unlock(lock_id)))
+                await conn.commit()
+            except Exception:
+                # Не возвращать в пул соединение, на котором могла остаться блокировка
+                logger.exception("Не удалось снять advisory lock %s", key)
+                await conn.invalidate()
+
+
+async def _run_handler(ctx: JobContext) -> None:
+    registered = _handlers[ctx.type]
+    async with _advisory_lock(ctx.dedup_key):
+        with llm_gateway.call_context(ctx.user_id, registered.endpoint, priority=llm_gateway.BACKGROUND):
+            await registered.handler(ctx)
+
+
+async def _release_on_shutdown(ctx: JobContext, worker_id: str) -> None:
+    """Остановка процесса: вернуть задачу в очередь, не дожидаясь истечения lease."""
+    from app.db.session import async_session_maker
+
+    try:
+        async with async_session_maker() as db:
+            await job_repo.release_job(db, ctx.id, worker_id)
+            await job_events.publish(
+                db, job_events.event(ctx.id, JobStatus.QUEUED, ctx.processed, ctx.total, stage=ctx.stage)
+            )
+            # Задачу сразу подхватит другой живой воркер
+            await job_events.publish_job_queued(db, ctx.type)
+            await db.commit()
+    except Exception:
+        logger.exception("Не удалось вернуть задачу %s в очередь", ctx.id)
+
+
+async def _execute(ctx: JobContext, worker_id: str) -> None:
+    from app.db.session import async_session_maker
+
+    # Обработчик — отдельной задачей: heartbeat отменяет его, если задачу забрал другой воркер
+    work = asyncio.create_task(_run_handler(ctx))
+    lost = asyncio.Event()
+    beat = asyncio.create_task(_heartbeat(ctx.id, worker_id, work, lost))
+    try:
+        await work
+    except asyncio.CancelledError:
+        if not lost.is_set():
+            await _release_on_shutdown(ctx, worker_id)
+            raise
+        # Отменил heartbeat: задачу ведёт другой воркер, ни статус, ни событие отсюда не пишутся
+        logger.warning("Задача %s (%s) больше не за этим воркером (истёк lease), обработка остановлена", ctx.id, ctx.type)
+    except LeaseLost:
+        logger.warning("Задача %s (%s) больше не за этим воркером (истёк lease), порция не записана", ctx.id, ctx.type)
+    except _KeyBusy:
+        logger.info("Задача %s: ключ %s занят другим исполнителем, вернём в очередь", ctx.id, ctx.dedup_key)
+        async with async_session_maker() as db:
+            await job_repo.release_job(db, ctx.id, worker_id, delay_seconds=settings.jobs_lock_retry_seconds)
+            await db.commit()
+    except Exception as e:
+        final = ctx.attempts >= ctx.max_attempts
+        logger.exception(
+            "Задача %s (%s) завершилась с ошибкой, попытка %s/%s", ctx.id, ctx.type, ctx.attempts, ctx.max_attempts
+        )
+        error = str(e) or e.__class__.__name__
+        async with async_session_maker() as db:
+            if await job_repo.fail_job(db, ctx.id, worker_id, error, None if final else retry_delay(ctx.attempts)):
+                status = JobStatus.FAILED if final else JobStatus.QUEUED
+                await job_events.publish(
+                    db, job_events.event(ctx.id, status, ctx.processed, ctx.total, error=error, stage=ctx.stage)
+                )
+            await db.commit()
+    else:
+        async with async_session_maker() as db:
+            finished = await job_repo.finish_job(db, ctx.id, worker_id)
+            if finished:
+                await job_events.publish(
+                    db, job_events.event(ctx.id, JobStatus.SUCCEEDED, ctx.processed, ctx.total, stage=ctx.stage)
+                )
+            await db.commit()
+        if finished:
+            logger.info("Задача %s (%s) выполнена", ctx.id, ctx.type)
+        else:
+            logger.warning("Задача %s (%s) выполнена, но уже не за этим воркером: итог не записан", ctx.id, ctx.type)
+    finally:
+        beat.cancel()
+
+
+async def run_worker(
+    worker_id: str | None = None,
+    concurrency: int | None = None,
+    types: list[str] | None = None,
+) -> None:
+    """
+    Фоновый цикл: до concurrency задач одновременно; пустая очередь — ждать notify() (в том числе из LISTEN jobs)
+    или JOBS_POLL_SECONDS — запасной опрос, если уведомление потерялось.
+    """
+    from app.jobs import handlers  # noqa: F401 — регистрация обработчиков
+
+    global _wakeup
+    _wakeup = asyncio.Event()
+    worker_id = worker_id or default_worker_id()
+    types = types or job_types()
+    slots = asyncio.Semaphore(concurrency or settings.jobs_concurrency)
+    running: set[asyncio.Task] = set()
+
+    def _done(task: asyncio.Task) -> None:
+        running.discard(task)
+        slots.release()
+        notify()  # освободился слот — сразу проверить очередь
+
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                ctx = await _claim(worker_id, types)
+            except Exception:
+                logger.exception("Ошибка выборки задачи из очереди")
+                ctx = None
+            if ctx is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), timeout=settings.jobs_poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                _wakeup.clear()
+                continue
+            task = asyncio.create_task(_execute(ctx, worker_id))
+            running.add(task)
+            task.add_done_callback(_done)
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,8 +6,10 @@ from fastapi.responses import JSONResponse
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.config import settings
-from app.routers import auth, decks, cards, ai, youtube
+from app.routers import auth, decks, cards, ai, youtube, jobs as jobs_router
+from app import jobs
 from app.middleware import LoggingMiddleware
+from app.services import embedding_service, job_events, llm_gateway, metrics
 
 # Настройка логирования
 log_level = getattr(logging, settings.log_level.upper(), logging.INFO)
@@ -45,6 +48,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Очередь LLM-шлюза не освободилась: не ошибка сервера, клиенту стоит повторить позже
+@app.exception_handler(llm_gateway.LLMQueueTimeout)
+async def llm_queue_timeout_handler(request: Request, exc: llm_gateway.LLMQueueTimeout):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(settings.llm_queue_timeout_seconds))},
+    )
+
 # Глобальный обработчик исключений
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -66,12 +78,25 @@ app.include_router(decks.router, prefix="/decks", tags=["decks"])
 app.include_router(cards.router, prefix="/cards", tags=["cards"])
 app.include_router(ai.router, prefix="/ai", tags=["ai"])
 app.include_router(youtube.router, prefix="/youtube", tags=["youtube"])
+app.include_router(jobs_router.router, prefix="/jobs", tags=["jobs"])
+
+
+_background_tasks: list[asyncio.Task] = []
 
 
 @app.on_event("startup")
 async def startup_event():
+    _background_tasks.append(asyncio.create_task(llm_gateway.run_usage_flusher()))
+    _background_tasks.append(asyncio.create_task(embedding_service.run_embedding_batcher()))
+    _background_tasks.append(asyncio.create_task(job_events.run_listener()))
+    if settings.jobs_run_in_api:
+        _background_tasks.append(asyncio.create_task(jobs.run_worker()))
+    else:
+        logger.info("📋 Фоновые задачи только ставятся в очередь, исполняет их процесс `python -m app.jobs`")
     logger.info("🚀 Starting English Words API server...")
     logger.info(f"📊 Environment: {'Development' if settings.secret_key == 'change-me-in-production-use-env' else 'Production'}")
+    if settings.llm_backend == "fake":
+        logger.warning("🧪 LLM_BACKEND=fake: ответы моделей генерирует локальная заглушка")
     logger.info(f"🔗 Database: {settings.database_url.split('@')[1] if '@' in settings.database_url else 'configured'}")
     if root_path:
         logger.info(f"🌐 Root path: {root_path} (all routes will be prefixed with this)")
@@ -79,18 +104,29 @@ async def startup_event():
         logger.info("🌐 Root path: / (no prefix)")
     logger.info("✅ Server started successfully")
     logger.info("📝 Available endpoints:")
-    logger.info("   - GET  /health")
+    logger.info("   - GET  /health, GET /metrics")
     logger.info("   - POST /auth/google/login")
     logger.info("   - GET  /decks, POST /decks/{id}/cards, POST /decks/{id}/backfill-pos, POST /decks/{id}/fetch-examples, ...")
     logger.info("   - GET  /cards")
     logger.info("   - POST /ai/generate-words")
+    logger.info("   - GET  /jobs/{id}, GET /jobs/{id}/events (SSE)")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("🛑 Shutting down server...")
+    for task in _background_tasks:
+        task.cancel()
+    await llm_gateway.flush_usage()
+    await job_events.close()
 
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Счётчики процесса: исходы разбора ответов LLM по каждому пути (ok / repaired / failed, failure_rate)."""
+    return metrics.snapshot()
@@ -6,5 +6,12 @@ from app.models.writing_submission import WritingSubmission
 from app.models.youtube_video import YouTubeVideo
 from app.models.user_youtube_video import UserYouTubeVideo
 from app.models.ielts_exam_part import IeltsExamPart
+from app.models.llm_usage import LLMUsage
+from app.models.embedding_cache import EmbeddingCache
+from app.models.word_synonyms import WordSynonyms
+from app.models.synonym_group_suggestion import SynonymGroupSuggestion
+from app.models.job import Job
+from app.models.card_enrich_attempt import CardEnrichAttempt
+from app.models.lexicon_entry import LexiconEntry
 
-__all__ = ["User", "Deck", "Card", "ReviewLog", "WritingSubmission", "YouTubeVideo", "UserYouTubeVideo", "IeltsExamPart"]
+__all__ = ["User", "Deck", "Card", "ReviewLog", "WritingSubmission", "YouTubeVideo", "UserYouTubeVideo", "IeltsExamPart", "LLMUsage", "EmbeddingCache", "WordSynonyms", "SynonymGroupSuggestion", "Job", "CardEnrichAttempt", "LexiconEntry"]
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import String, DateTime, ForeignKey, Text
+from sqlalchemy import String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
@@ -17,9 +17,19 @@ class CardState(str, enum.Enum):
 
 class Card(Base):
     __tablename__ = "cards"
+    __table_args__ = (
+        # ANN-индекс для /ai/similar-words (косинусное расстояние, оператор <=>)
+        Index(
+            "ix_cards_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    deck_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("decks.id", ondelete="CASCADE"), nullable=False)
+    deck_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("decks.id", ondelete="CASCADE"), nullable=False, index=True)
     word: Mapped[str] = mapped_column(String(255), nullable=False)
     translation: Mapped[str] = mapped_column(String(512), nullable=False)
     example: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -0,0 +1,30 @@
+import uuid
+from sqlalchemy import String, DateTime, ForeignKey, Integer, Text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+
+from app.db.base import Base
+
+
+class EnrichKind:
+    POS = "pos"  # backfill-pos: part_of_speech и переводы по частям речи
+    TRANSCRIPTION = "transcription"  # backfill-transcriptions
+
+
+class CardEnrichAttempt(Base):
+    """
+    Неудачные попытки обогатить карточку в backfill (модель не вернула значений, ошибка).
+    Пока next_attempt_at в будущем или attempts >= ENRICH_MAX_ATTEMPTS, backfill карточку не выбирает.
+    Успешное обогащение или смена слова удаляет строку.
+    """
+    __tablename__ = "card_enrich_attempts"
+
+    card_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("cards.id", ondelete="CASCADE"), primary_key=True
+    )
+    kind: Mapped[str] = mapped_column(String(32), primary_key=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -0,0 +1,16 @@
+from sqlalchemy import String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from pgvector.sqlalchemy import Vector
+
+from app.db.base import Base
+
+
+class EmbeddingCache(Base):
+    """Кэш эмбеддингов по хэшу содержимого: одинаковый текст карточки не отправляется провайдеру повторно."""
+    __tablename__ = "embedding_cache"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256(model + текст)
+    model: Mapped[str] = mapped_column(String(64), nullable=False)
+    embedding: Mapped[list] = mapped_column(Vector(768), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
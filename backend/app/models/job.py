@@ -0,0 +1,55 @@
+import uuid
+from sqlalchemy import String, DateTime, ForeignKey, Integer, Text, Index, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+
+from app.db.base import Base
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """Фоновая задача (backfill, наполнение банка экзаменов): очередь в Postgres, забирается через SKIP LOCKED."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Выборка следующей задачи: status + run_after
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        # Одна незавершённая задача на dedup_key (тип + колода/пользователь)
+        Index(
+            "ux_jobs_dedup_key_active", "dedup_key",
+            unique=True, postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+        # Idempotency-Key уникален в пределах пользователя и типа задачи
+        Index(
+            "ux_jobs_user_type_idempotency_key", "user_id", "type", "idempotency_key",
+            unique=True, postgresql_where=text("idempotency_key IS NOT NULL"),
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    type: Mapped[str] = mapped_column(String(64), nullable=False)
+    user_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    # Ключ «одна активная задача» и advisory lock на время выполнения: "<type>:<deck_id|user_id>"
+    dedup_key: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    idempotency_key: Mapped[str | None] = mapped_column(String(255), nullable=True)  # заголовок Idempotency-Key
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default=JobStatus.QUEUED)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    # Продолжение после рестарта/ретрая: курсор последней закоммиченной порции (пишется в одной транзакции с ней)
+    state: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    processed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    locked_by: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,20 @@
+from sqlalchemy import String, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+
+from app.db.base import Base
+
+
+class LexiconEntry(Base):
+    """
+    Обогащение слова моделью (транскрипция и значения по частям речи), общее для всех пользователей:
+    backfill спрашивает модель только о словах, которых здесь нет. Версия промпта в ключе, как у word_synonyms.
+    """
+    __tablename__ = "lexicon_entries"
+
+    word: Mapped[str] = mapped_column(String(255), primary_key=True)  # lower, без пробелов по краям
+    prompt_version: Mapped[str] = mapped_column(String(32), primary_key=True)
+    transcription: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    senses: Mapped[list] = mapped_column(JSONB, nullable=False)  # [{part_of_speech, translation, example, examples}]
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
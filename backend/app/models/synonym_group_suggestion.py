@@ -0,0 +1,18 @@
+import uuid
+from sqlalchemy import String, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+
+from app.db.base import Base
+
+
+class SynonymGroupSuggestion(Base):
+    """Последний подбор групп синонимов колоды; годен, пока отпечаток колоды (fingerprint) не изменился."""
+    __tablename__ = "synonym_group_suggestions"
+
+    deck_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("decks.id", ondelete="CASCADE"), primary_key=True)
+    mode: Mapped[str] = mapped_column(String(16), primary_key=True)  # llm | embedding
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    groups: Mapped[list] = mapped_column(JSONB, nullable=False)  # [{"card_ids": [...], "words": [...]}]
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
@@ -0,0 +1,16 @@
+from sqlalchemy import String, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+
+from app.db.base import Base
+
+
+class WordSynonyms(Base):
+    """Синонимы слова от модели, общие для всех пользователей; версия промпта в ключе — смена промпта не смешивает ответы."""
+    __tablename__ = "word_synonyms"
+
+    word: Mapped[str] = mapped_column(String(255), primary_key=True)  # lower, без пробелов по краям
+    prompt_version: Mapped[str] = mapped_column(String(32), primary_key=True)
+    synonyms: Mapped[list] = mapped_column(JSONB, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
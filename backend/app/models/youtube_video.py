@@ -5,6 +5,13 @@ from sqlalchemy.orm import relationship
 
 from app.db.base import Base
 
+
+class TranscriptSource:
+    WHISPER = "whisper"  # распознавание аудио Whisper-воркером
+    CAPTIONS = "captions"  # ручные английские субтитры YouTube
+    AUTO_CAPTIONS = "auto_captions"  # автоматические субтитры YouTube (YOUTUBE_CAPTIONS=auto)
+
+
 class YouTubeVideo(Base):
     __tablename__ = "youtube_videos"
 
@@ -12,6 +19,7 @@ class YouTubeVideo(Base):
     video_id = Column(String, unique=True, index=True, nullable=False)
     url = Column(String, nullable=False)
     transcription = Column(Text, nullable=False)
+    transcript_source = Column(String(32), nullable=False, server_default=TranscriptSource.WHISPER)
     translation = Column(Text, nullable=False)
     summary = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,14 +1,25 @@
+from datetime import datetime, timedelta, timezone
 from uuid import UUID
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response
 from fastapi.responses import JSONResponse
-from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.dependencies import get_current_user
+from app.sse import sse_event, sse_response, iterate_in_threadpool
+from app.models.job import Job
 from app.models.user import User
 from app.db.session import get_db, async_session_maker
-from app.db.repositories import deck_repo, card_repo, writing_repo
-from app.services import gemini_service
+from app.db.repositories import deck_repo, card_repo, job_repo, synonym_repo, writing_repo, usage_repo
+from app import jobs
+from app.services import (
+    embedding_service,
+    gemini_service,
+    llm_gateway,
+    near_duplicate_service,
+    synonym_service,
+    vector_index,
+)
 from app.schemas.ai import (
     GenerateWordsRequest,
     TranslateRequest,
@@ -21,6 +32,7 @@ from app.schemas.ai import (
     BackfillTranscriptionsResponse,
     SynonymsResponse,
     SuggestSynonymGroupsResponse,
+    SuggestSynonymGroupsJobResponse,
     SynonymGroupItem,
     ApplySynonymGroupsRequest,
     EvaluateWritingRequest,
@@ -28,6 +40,7 @@ from app.schemas.ai import (
     WritingErrorItem,
     WritingSubmissionListItem,
     WritingSubmissionResponse,
+    UsageSummaryItem,
 )
 
 router = APIRouter()
@@ -36,6 +49,7 @@ router = APIRouter()
 @router.post("/generate-words")
 async def generate_words(
     body: GenerateWordsRequest,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -44,17 +58,29 @@ async def generate_words(
     if not deck:
         raise HTTPException(status_code=404, detail="Deck not found")
     try:
-        items = gemini_service.generate_word_list(level=body.level, topic=body.topic, count=body.count)
+        items = await llm_gateway.run_in_thread(
+            gemini_service.generate_word_list, level=body.level, topic=body.topic, count=body.count
+        )
     except ValueError as e:
         raise HTTPException(status_code=429, detail=str(e))
-    created = 0
+    near_duplicates = []
+    if body.skip_near_duplicates and items:
+        # До обогащения: на почти-дубликаты не тратим промпты
+        matches, _ = await near_duplicate_service.find_near_duplicates(
+            db, current_user.id, deck_id, [(it["word"], it.get("translation")) for it in items]
+        )
+        near_duplicates = [{"word": it["word"], "matches": m} for it, m in zip(items, matches) if m]
+        items = [it for it, m in zip(items, matches) if not m]
+    created_ids = []
     skipped_duplicates = 0
     batch_size = gemini_service.BATCH_GENERATE_ENRICH_SIZE
     for offset in range(0, len(items), batch_size):
         chunk = items[offset : offset + batch_size]
         words = [it["word"] for it in chunk]
         try:
-            batch_data = gemini_service.enrich_words_with_pos_batch(words, max_batch_size=batch_size)
+            batch_data = await llm_gateway.run_in_thread(
+                gemini_service.enrich_words_with_pos_batch, words, max_batch_size=batch_size
+            )
         except ValueError:
             batch_data = [{"transcription": it.get("transcription"), "senses": []} for it in chunk]
         for item, data in zip(chunk, batch_data):
@@ -72,22 +98,28 @@ async def generate_words(
                 trans = sense.get("translation", "")
                 if not trans:
                     continue
-                emb = gemini_service.get_embedding(f"{word}: {trans}")
-                await card_repo.create_card(
+                card = await card_repo.create_card(
                     db,
                     deck_id,
                     word,
                     trans,
                     example=sense.get("example"),
-                    embedding=emb,
                     transcription=transcription,
                     pronunciation_url=pronunciation_url,
                     part_of_speech=pos,
                     examples=sense.get("examples"),
                 )
-                created += 1
+                created_ids.append(card.id)
     await db.commit()
-    return {"created": created, "skipped_duplicates": skipped_duplicates}
+    vector_index.invalidate(current_user.id)
+    embedding_service.notify()
+    background_tasks.add_task(synonym_service.update_groups_for_cards, deck_id, current_user.id, created_ids)
+    return {
+        "created": len(created_ids),
+        "skipped_duplicates": skipped_duplicates,
+        "skipped_near_duplicates": len(near_duplicates),
+        "near_duplicates": near_duplicates,
+    }
 
 
 @router.post("/translate", response_model=TranslateResponse)
@@ -102,7 +134,7 @@ async def translate(
     if sl not in ("ru", "en") or tl not in ("ru", "en") or sl == tl:
         raise HTTPException(status_code=400, detail="source_lang and target_lang must be 'ru' and 'en' (different)")
     try:
-        translation = gemini_service.translate(body.text.strip(), sl, tl)
+        translation = await llm_gateway.run_in_thread(gemini_service.translate, body.text.strip(), sl, tl)
     except ValueError as e:
         raise HTTPException(status_code=429, detail=str(e))
     return TranslateResponse(translation=translation, source_lang=sl, target_lang=tl)
@@ -120,7 +152,7 @@ async def enrich_word(
     word_en = raw
     if source_lang == "ru":
         try:
-            word_en = gemini_service.translate(raw, "ru", "en")
+            word_en = await llm_gateway.run_in_thread(gemini_service.translate, raw, "ru", "en")
             if not word_en or not word_en.strip():
                 word_en = raw
             else:
@@ -128,7 +160,7 @@ async def enrich_word(
         except Exception:
             word_en = raw
     try:
-        result = gemini_service.enrich_word_with_pos(word_en)
+        result = await llm_gateway.run_in_thread(gemini_service.enrich_word_with_pos, word_en)
     except ValueError as e:
         raise HTTPException(status_code=429, detail=str(e))
     pronunciation_url = gemini_service.get_pronunciation_url(word_en)
@@ -153,60 +185,36 @@ async def enrich_word(
     )
 
 
-_BACKFILL_FETCH_CHUNK = 100
-
-
-async def _run_backfill_transcriptions_background(deck_id: UUID | None, user_id: UUID) -> None:
-    """Фоновая задача: обновить транскрипции у всех карточек без лимита, порциями."""
-    async with async_session_maker() as db:
-        try:
-            while True:
-                cards = await card_repo.get_cards_missing_transcription(
-                    db, user_id, deck_id=deck_id, limit=_BACKFILL_FETCH_CHUNK
-                )
-                if not cards:
-                    break
-                batch_size = gemini_service.BATCH_GENERATE_ENRICH_SIZE
-                for offset in range(0, len(cards), batch_size):
-                    chunk = cards[offset : offset + batch_size]
-                    words = [c.word or "" for c in chunk]
-                    try:
-                        batch_data = gemini_service.enrich_words_with_pos_batch(words, max_batch_size=batch_size)
-                    except Exception:
-                        continue
-                    for card, data in zip(chunk, batch_data):
-                        try:
-                            transcription = (data.get("transcription") or "").strip() or None
-                            pronunciation_url = gemini_service.get_pronunciation_url(card.word or "")
-                            await card_repo.update_card(
-                                db, card, transcription=transcription, pronunciation_url=pronunciation_url
-                            )
-                        except Exception:
-                            pass
-                await db.commit()
-        except Exception:
-            pass
-
-
 @router.post("/backfill-transcriptions")
 async def backfill_transcriptions(
-    background_tasks: BackgroundTasks,
     body: BackfillTranscriptionsRequest | None = None,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Запустить в фоне обновление транскрипций у всех карточек без них. Без лимита, порциями."""
+    """
+    Поставить в очередь обновление транскрипций у всех карточек без них (или в колоде). Статус — GET /jobs/{job_id}.
+    Повторный запрос, пока такая задача идёт, или с тем же Idempotency-Key получает её job_id.
+    """
     body = body or BackfillTranscriptionsRequest()
     deck_id = UUID(body.deck_id) if body.deck_id else None
     if body.deck_id and deck_id:
         deck = await deck_repo.get_deck_by_id(db, deck_id, current_user.id)
         if not deck:
             raise HTTPException(status_code=404, detail="Deck not found")
-    background_tasks.add_task(_run_backfill_transcriptions_background, deck_id, current_user.id)
+    job, created = await jobs.enqueue(
+        db, jobs.BACKFILL_TRANSCRIPTIONS, current_user.id, {"deck_id": str(deck_id) if deck_id else None},
+        dedup_key=jobs.dedup_key(jobs.BACKFILL_TRANSCRIPTIONS, deck_id or current_user.id),
+        idempotency_key=idempotency_key,
+    )
+    await db.commit()
+    jobs.notify()
     return JSONResponse(
         status_code=202,
         content={
             "status": "accepted",
+            "job_id": str(job.id),
+            "attached": not created,
             "message": "Обработка запущена в фоне. Обновите колоду через некоторое время.",
         },
     )
@@ -216,23 +224,14 @@ def _word_count(text: str) -> int:
     return len([w for w in (text or "").split() if w.strip()])
 
 
-@router.post("/evaluate-writing", response_model=EvaluateWritingResponse)
-async def evaluate_writing(
+async def _save_writing_evaluation(
+    db: AsyncSession,
+    user_id: UUID,
     body: EvaluateWritingRequest,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    """Проверка текста для IELTS Writing: оценка, исправления, ошибки, рекомендации. Сохраняется в историю."""
-    word_count = _word_count(body.text)
-    try:
-        result = gemini_service.evaluate_ielts_writing(
-            body.text,
-            word_limit_min=body.word_limit_min,
-            word_limit_max=body.word_limit_max,
-            task_type=body.task_type,
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=429, detail=str(e))
+    word_count: int,
+    result: dict,
+) -> EvaluateWritingResponse:
+    """Сохранить результат проверки в историю и собрать ответ API."""
     errors = [
         WritingErrorItem(
             type=e.get("type", ""),
@@ -252,7 +251,7 @@ async def evaluate_writing(
         recommendations = ""
     sub = await writing_repo.create_writing_submission(
         db,
-        current_user.id,
+        user_id,
         original_text=body.text,
         word_count=word_count,
         evaluation=result.get("evaluation", ""),
@@ -265,7 +264,6 @@ async def evaluate_writing(
         task_type=body.task_type,
         errors=errors_data,
     )
-    await db.commit()
     return EvaluateWritingResponse(
         submission_id=str(sub.id),
         word_count=word_count,
@@ -274,9 +272,70 @@ async def evaluate_writing(
         evaluation=result.get("evaluation", ""),
         corrected_text=result.get("corrected_text", ""),
         errors=errors,
-        recommendations=result.get("recommendations", ""),
+        recommendations=recommendations,
+    )
+
+
+@router.post("/evaluate-writing", response_model=EvaluateWritingResponse)
+async def evaluate_writing(
+    body: EvaluateWritingRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Проверка текста для IELTS Writing: оценка, исправления, ошибки, рекомендации. Сохраняется в историю."""
+    word_count = _word_count(body.text)
+    try:
+        result = await llm_gateway.run_in_thread(
+            gemini_service.evaluate_ielts_writing,
+            body.text,
+            word_limit_min=body.word_limit_min,
+            word_limit_max=body.word_limit_max,
+            task_type=body.task_type,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    response = await _save_writing_evaluation(db, current_user.id, body, word_count, result)
+    await db.commit()
+    return response
+
+
+@router.post("/evaluate-writing/stream")
+async def evaluate_writing_stream(
+    body: EvaluateWritingRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    SSE-вариант /evaluate-writing. События: delta {text} — фрагменты ответа модели по мере генерации;
+    result — тот же объект, что возвращает /evaluate-writing (уже сохранён в историю); error {detail}.
+    """
+    word_count = _word_count(body.text)
+    user_id = current_user.id
+    stream = gemini_service.stream_ielts_writing_evaluation(
+        body.text,
+        word_limit_min=body.word_limit_min,
+        word_limit_max=body.word_limit_max,
+        task_type=body.task_type,
     )
 
+    async def events():
+        result: dict = {}
+        try:
+            async for kind, payload in iterate_in_threadpool(stream):
+                if kind == "delta":
+                    yield sse_event("delta", {"text": payload})
+                else:
+                    result = payload
+        except (ValueError, llm_gateway.LLMQueueTimeout) as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        # Сессия из get_db закрывается до начала потока — сохраняем в собственной
+        async with async_session_maker() as db:
+            response = await _save_writing_evaluation(db, user_id, body, word_count, result)
+            await db.commit()
+        yield sse_event("result", response.model_dump(mode="json"))
+
+    return sse_response(events())
+
 
 @router.get("/writing-history", response_model=list[WritingSubmissionListItem])
 async def get_writing_history(
@@ -336,21 +395,44 @@ async def get_writing_submission(
     )
 
 
+@router.get("/usage", response_model=list[UsageSummaryItem])
+async def get_usage(
+    days: int = 30,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Расход токенов LLM текущим пользователем за последние days дней по эндпоинтам и провайдерам."""
+    since = datetime.now(timezone.utc) - timedelta(days=max(days, 1))
+    rows = await usage_repo.get_usage_summary(db, current_user.id, since)
+    return [
+        UsageSummaryItem(
+            endpoint=r.endpoint,
+            provider=r.provider,
+            requests=r.requests,
+            prompt_tokens=r.prompt_tokens or 0,
+            completion_tokens=r.completion_tokens or 0,
+        )
+        for r in rows
+    ]
+
+
 @router.get("/synonyms", response_model=SynonymsResponse)
 async def get_synonyms(
     word: str,
     deck_id: str,
-    limit: int = 10,
+    # В word_synonyms хранится не больше SYNONYMS_LIMIT синонимов на слово
+    limit: int = Query(10, ge=1, le=synonym_service.SYNONYMS_LIMIT),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Get synonyms for word via Gemini; return which of those are already in the deck as cards."""
+    """Get synonyms for word (word_synonyms table, Gemini on miss); return which of those are already in the deck as cards."""
     if not word.strip():
         return SynonymsResponse(synonyms=[], cards_in_deck=[])
     deck = await deck_repo.get_deck_by_id(db, UUID(deck_id), current_user.id)
     if not deck:
         raise HTTPException(status_code=404, detail="Deck not found")
-    synonyms = gemini_service.get_synonyms(word.strip(), limit=limit)
+    found = await synonym_service.get_synonyms_for_words(db, [word])
+    synonyms = found.get(word.strip().lower(), [])[:limit]
     synonym_set = {s.lower() for s in synonyms}
     cards = await card_repo.get_cards_by_deck(db, UUID(deck_id))
     cards_in_deck = [
@@ -369,119 +451,135 @@ async def similar_words(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Return similar words by embedding. If deck_id given, exclude cards already in that deck."""
+    """
+    Return similar words by embedding. If deck_id given, exclude cards already in that deck.
+    Ошибки провайдера не превращаются в пустой ответ: очередь LLM — 429 (обработчик LLMQueueTimeout),
+    квота — 429, провайдер недоступен — 503.
+    """
     if not word.strip():
         return []
-    embedding = gemini_service.get_embedding(word.strip())
-    if not embedding:
-        return []
-    # pgvector: ORDER BY embedding <=> query_vector LIMIT n
-    # We need to pass the embedding as a string like '[0.1,0.2,...]' for the query
-    vec_str = "[" + ",".join(str(x) for x in embedding) + "]"
-    if deck_id:
-        sql = text("""
-            SELECT c.id, c.word, c.translation, c.example
-            FROM cards c
-            JOIN decks d ON d.id = c.deck_id
-            WHERE c.embedding IS NOT NULL AND d.user_id = :user_id AND c.deck_id != :deck_id
-            ORDER BY c.embedding <=> CAST(:vec AS vector)
-            LIMIT :lim
-        """)
-        params = {"vec": vec_str, "lim": limit, "user_id": str(current_user.id), "deck_id": deck_id}
-    else:
-        sql = text("""
-            SELECT c.id, c.word, c.translation, c.example
-            FROM cards c
-            JOIN decks d ON d.id = c.deck_id
-            WHERE c.embedding IS NOT NULL AND d.user_id = :user_id
-            ORDER BY c.embedding <=> CAST(:vec AS vector)
-            LIMIT :lim
-        """)
-        params = {"vec": vec_str, "lim": limit, "user_id": str(current_user.id)}
     try:
-        result = await db.execute(sql, params)
-        rows = result.fetchall()
+        exclude_deck_id = UUID(deck_id) if deck_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid deck_id")
+    # Вектор запроса: кэш эмбеддингов по слову -> провайдер
+    try:
+        embedding = await embedding_service.get_query_embedding(db, word)
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    if embedding is None:
+        raise HTTPException(status_code=503, detail="Embedding provider unavailable")
+    try:
+        index = await vector_index.get_index(db, current_user.id)
+        if index is not None:
+            rows = index.top_k(embedding, limit, exclude_deck_id)
+        else:
+            rows = await card_repo.find_similar_cards(
+                db, current_user.id, embedding, limit=limit, exclude_deck_id=exclude_deck_id
+            )
     except Exception:
         return []
+    # Строки из Postgres и из in-memory индекса одного вида: (id, word, translation, example, distance)
     return [
         SimilarWordItem(
-            word=r.word,
-            translation=r.translation,
-            example=r.example,
-            card_id=str(r.id),
+            word=w,
+            translation=t,
+            example=e,
+            card_id=str(card_id),
         )
-        for r in rows
+        for card_id, w, t, e, _ in rows
     ]
 
 
-def _build_synonym_groups(cards: list, synonym_map: dict[str, set[str]]) -> list[tuple[list[str], list[str]]]:
-    """Build groups: list of (card_ids, words). synonym_map: card_id -> set of synonym words (lower)."""
-    word_to_card_id = {}
-    for c in cards:
-        w = (c.word or "").strip().lower()
-        if w:
-            word_to_card_id[w] = str(c.id)
-    # Graph: card_id -> set of card_ids that are synonyms (same group)
-    graph: dict[str, set[str]] = {}
-    for c in cards:
-        cid = str(c.id)
-        graph.setdefault(cid, set())
-        syns = synonym_map.get(cid, set())
-        for w in syns:
-            if w in word_to_card_id and word_to_card_id[w] != cid:
-                graph[cid].add(word_to_card_id[w])
-    # Connected components
-    visited = set()
-
-    def dfs(nid: str, comp: set[str]) -> None:
-        visited.add(nid)
-        comp.add(nid)
-        for nb in graph.get(nid, set()):
-            if nb not in visited:
-                dfs(nb, comp)
-
-    groups = []
-    for c in cards:
-        cid = str(c.id)
-        if cid in visited:
-            continue
-        comp = set()
-        dfs(cid, comp)
-        if len(comp) >= 2:
-            card_ids = list(comp)
-            words = [c.word for c in cards if str(c.id) in comp]
-            groups.append((card_ids, words))
-    return groups
-
-
 @router.post("/synonym-groups/suggest", response_model=SuggestSynonymGroupsResponse)
 async def suggest_synonym_groups(
     deck_id: str,
+    mode: str | None = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Suggest synonym groups for deck: все карточки колоды, батчами по 10."""
-    deck = await deck_repo.get_deck_by_id(db, UUID(deck_id), current_user.id)
+    """
+    Suggest synonym groups for deck. mode (по умолчанию SYNONYM_GROUPS_MODE):
+    "llm" — синонимы всех карточек (таблица word_synonyms, у модели — новые слова батчами по 10);
+    "embedding" — кластеры по эмбеддингам карточек, модель проверяет только пограничные пары.
+    Результат сохраняется и возвращается без пересчёта, пока колода не изменилась.
+    Для больших колод — POST /synonym-groups/suggest/jobs.
+    """
+    deck_uuid, mode = await _suggest_params(db, deck_id, mode, current_user)
+    raw_groups = await synonym_service.suggest_groups(db, deck_uuid, mode)
+    return SuggestSynonymGroupsResponse(groups=_synonym_group_items(raw_groups))
+
+
+def _synonym_group_items(raw_groups: list[tuple[list[str], list[str]]]) -> list[SynonymGroupItem]:
+    return [SynonymGroupItem(words=words, card_ids=card_ids) for card_ids, words in raw_groups]
+
+
+async def _suggest_params(db: AsyncSession, deck_id: str, mode: str | None, user: User) -> tuple[UUID, str]:
+    mode = (mode or settings.synonym_groups_mode).strip().lower()
+    if mode not in synonym_service.SUGGEST_MODES:
+        raise HTTPException(status_code=400, detail="mode must be 'llm' or 'embedding'")
+    deck = await deck_repo.get_deck_by_id(db, UUID(deck_id), user.id)
     if not deck:
         raise HTTPException(status_code=404, detail="Deck not found")
-    cards = await card_repo.get_cards_by_deck(db, UUID(deck_id))
-    synonym_map: dict[str, set[str]] = {}
-    batch_size = gemini_service.BATCH_SYNONYM_SIZE
-    for offset in range(0, len(cards), batch_size):
-        chunk = cards[offset : offset + batch_size]
-        words = [c.word or "" for c in chunk]
-        try:
-            batch_syns = gemini_service.get_synonyms_batch(words, limit=12)
-        except Exception:
-            for c in chunk:
-                synonym_map[str(c.id)] = set()
-            continue
-        for c, syns in zip(chunk, batch_syns):
-            synonym_map[str(c.id)] = {s.lower() for s in syns}
-    raw_groups = _build_synonym_groups(cards, synonym_map)
-    return SuggestSynonymGroupsResponse(
-        groups=[
-            SynonymGroupItem(words=words, card_ids=card_ids)
-            for card_ids, words in raw_groups
-        ]
+    return deck.id, mode
+
+
+def _suggest_job_response(job: Job, attached: bool = False) -> SuggestSynonymGroupsJobResponse:
+    return SuggestSynonymGroupsJobResponse(
+        job_id=str(job.id),
+        deck_id=job.payload["deck_id"],
+        mode=job.payload["mode"],
+        status=job.status,
+        attached=attached,
+        done_batches=job.processed,
+        total_batches=job.total or 0,
+        groups=[SynonymGroupItem(**g) for g in (job.state or {}).get("groups", [])],
+        error=job.error,
+    )
+
+
+@router.post("/synonym-groups/suggest/jobs", response_model=SuggestSynonymGroupsJobResponse, status_code=202)
+async def submit_suggest_synonym_groups_job(
+    deck_id: str,
+    response: Response,
+    mode: str | None = None,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Подбор групп синонимов в очереди задач: сразу 202 с job_id, батчи к модели идут параллельно
+    (до SYNONYM_SUGGEST_CONCURRENCY). Прогресс и частичные группы — GET /synonym-groups/suggest/jobs/{job_id},
+    поток прогресса — GET /jobs/{job_id}/events. Если колода не менялась с прошлого подбора — 200 с группами
+    без задачи; повторный запрос, пока подбор той же колоды идёт, присоединяется к нему.
+    """
+    deck_uuid, mode = await _suggest_params(db, deck_id, mode, current_user)
+    fingerprint = await synonym_service.deck_fingerprint(db, deck_uuid, mode)
+    stored = await synonym_repo.get_group_suggestion(db, deck_uuid, mode, fingerprint)
+    if stored is not None:
+        response.status_code = 200
+        return SuggestSynonymGroupsJobResponse(
+            deck_id=str(deck_uuid), mode=mode, status="succeeded", groups=_synonym_group_items(stored)
+        )
+    job, created = await jobs.enqueue(
+        db, jobs.SUGGEST_SYNONYM_GROUPS, current_user.id,
+        {"deck_id": str(deck_uuid), "mode": mode, "fingerprint": fingerprint},
+        dedup_key=jobs.dedup_key(jobs.SUGGEST_SYNONYM_GROUPS, f"{deck_uuid}:{mode}:{fingerprint}"),
+        idempotency_key=idempotency_key,
     )
+    await db.commit()
+    jobs.notify()
+    return _suggest_job_response(job, attached=not created)
+
+
+@router.get("/synonym-groups/suggest/jobs/{job_id}", response_model=SuggestSynonymGroupsJobResponse)
+async def get_suggest_synonym_groups_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Статус подбора: прогресс в батчах и группы (частичные, пока задача не завершена)."""
+    job = await job_repo.get_job(db, job_id, user_id=current_user.id)
+    if not job or job.type != jobs.SUGGEST_SYNONYM_GROUPS:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _suggest_job_response(job)
@@ -1,22 +1,39 @@
-"""Card PATCH/DELETE and POST review. Card id is global (user checked via deck)."""
+"""Card GET by ids, PATCH/DELETE and POST review. Card id is global (user checked via deck)."""
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.dependencies import get_current_user
 from app.models.user import User
 from app.schemas.card import CardUpdate, CardResponse, ReviewRequest
 from app.db.session import get_db
-from app.db.repositories import card_repo
+from app.db.repositories import card_repo, enrich_attempt_repo
+from app.services import embedding_service, synonym_service, vector_index
 from app.services.fsrs_service import review_card as fsrs_review
 
 router = APIRouter()
 
+# Сколько id можно запросить за раз в GET /cards?ids=...
+_MAX_IDS = 500
+
+
+@router.get("", response_model=list[CardResponse])
+async def get_cards(
+    ids: list[UUID] = Query(..., description="id карточек, например из события progress в GET /jobs/{id}/events"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Только указанные карточки пользователя — догрузить изменённые вместо всей колоды."""
+    if len(ids) > _MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids (max {_MAX_IDS})")
+    return await card_repo.get_user_cards_by_ids(db, current_user.id, ids)
+
 
 @router.patch("/{card_id}", response_model=CardResponse)
 async def update_card(
     card_id: UUID,
     body: CardUpdate,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -24,9 +41,21 @@ async def update_card(
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
     updates = body.model_dump(exclude_unset=True)
+    word_changed = "word" in updates and (updates["word"] or "").strip().lower() != (card.word or "").strip().lower()
     if updates:
         card = await card_repo.update_card(db, card, **updates)
+    if word_changed:
+        # Другое слово — старая группа синонимов к нему не относится; новую подберёт фоновая задача
+        await card_repo.leave_synonym_group(db, card)
+        # Прошлые неудачи backfill относились к старому слову
+        await enrich_attempt_repo.clear(db, [card.id])
     await db.commit()
+    if updates:
+        vector_index.invalidate(current_user.id)
+    if card.embedding is None:
+        embedding_service.notify()
+    if word_changed:
+        background_tasks.add_task(synonym_service.update_groups_for_cards, card.deck_id, current_user.id, [card.id])
     return card
 
 
@@ -41,6 +70,7 @@ async def delete_card(
         raise HTTPException(status_code=404, detail="Card not found")
     await card_repo.delete_card(db, card)
     await db.commit()
+    vector_index.invalidate(current_user.id)
 
 
 @router.post("/{card_id}/review", response_model=CardResponse)
@@ -1,5 +1,5 @@
 from uuid import UUID, uuid4
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status
 from fastapi.responses import JSONResponse
 
 from app.dependencies import get_current_user
@@ -7,75 +7,22 @@ from app.models.user import User
 from app.models.deck import Deck
 from app.models.card import Card
 from app.schemas.deck import DeckCreate, DeckUpdate, DeckResponse
-from app.schemas.card import CardCreate, CardUpdate, CardResponse, ReviewRequest
+from app.schemas.card import (
+    CardCreate, CardUpdate, CardResponse, ReviewRequest,
+    NearDuplicateCheckRequest, NearDuplicateCheckResponse, NearDuplicateResult, StuckWordItem,
+)
 from app.schemas.ai import ApplySynonymGroupsRequest
-from app.db.session import get_db, async_session_maker
-from app.db.repositories import deck_repo, card_repo
-from app.services import gemini_service
+from app.db.session import get_db
+from app.config import settings
+from app.db.repositories import deck_repo, card_repo, enrich_attempt_repo
+from app import jobs
+from app.services import (
+    embedding_service, gemini_service, llm_gateway, near_duplicate_service, synonym_service, vector_index,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
 
-# Размер порции при подгрузке карточек в фоне (без лимита обрабатываем все)
-_BACKFILL_FETCH_CHUNK = 100
-
-
-async def _run_backfill_pos_background(deck_id: UUID, user_id: UUID) -> None:
-    """Фоновая задача: обрабатывать все карточки без part_of_speech порциями до конца."""
-    async with async_session_maker() as db:
-        try:
-            while True:
-                cards = await card_repo.get_cards_missing_pos(
-                    db, user_id, deck_id=deck_id, limit=_BACKFILL_FETCH_CHUNK
-                )
-                if not cards:
-                    break
-                batch_size = gemini_service.BATCH_ENRICH_SIZE
-                for offset in range(0, len(cards), batch_size):
-                    chunk = cards[offset : offset + batch_size]
-                    words = [card.word or "" for card in chunk]
-                    try:
-                        batch_results = gemini_service.enrich_words_with_pos_batch(words)
-                    except Exception:
-                        continue
-                    for card, data in zip(chunk, batch_results):
-                        try:
-                            senses = data.get("senses") or []
-                            if not senses:
-                                continue
-                            transcription = data.get("transcription")
-                            pronunciation_url = gemini_service.get_pronunciation_url(card.word or "")
-                            first = senses[0]
-                            await card_repo.update_card(
-                                db, card,
-                                part_of_speech=first.get("part_of_speech"),
-                                translation=first.get("translation", card.translation),
-                                example=first.get("example") or card.example,
-                                transcription=transcription or card.transcription,
-                                pronunciation_url=pronunciation_url or card.pronunciation_url,
-                                examples=first.get("examples") or card.examples,
-                            )
-                            for sense in senses[1:]:
-                                pos = sense.get("part_of_speech")
-                                if not pos:
-                                    continue
-                                if await card_repo.exists_card_in_deck_with_pos(db, deck_id, card.word or "", pos):
-                                    continue
-                                await card_repo.create_card(
-                                    db, deck_id, card.word or "", sense.get("translation", ""),
-                                    example=sense.get("example"),
-                                    transcription=transcription,
-                                    pronunciation_url=pronunciation_url,
-                                    part_of_speech=pos,
-                                    examples=sense.get("examples"),
-                                )
-                        except Exception:
-                            pass
-                await db.commit()
-        except Exception:
-            pass
-
-
 @router.get("", response_model=list[DeckResponse])
 async def list_decks(
     db: AsyncSession = Depends(get_db),
@@ -134,6 +81,7 @@ async def delete_deck(
         raise HTTPException(status_code=404, detail="Deck not found")
     await deck_repo.delete_deck(db, deck)
     await db.commit()
+    vector_index.invalidate(current_user.id)
 
 
 # Cards
@@ -154,27 +102,66 @@ async def list_cards(
 async def create_card(
     deck_id: UUID,
     body: CardCreate,
+    background_tasks: BackgroundTasks,
+    check_near_duplicates: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    """
+    check_near_duplicates=true — сначала сравнить карточку по эмбеддингу с ближайшими в колоде;
+    при совпадении выше порога карточка не создаётся, 409 с near_duplicates.
+    """
     deck = await deck_repo.get_deck_by_id(db, deck_id, current_user.id)
     if not deck:
         raise HTTPException(status_code=404, detail="Deck not found")
     if await card_repo.exists_card_in_deck_with_pos(db, deck_id, body.word, body.part_of_speech):
         raise HTTPException(status_code=409, detail="Слово уже есть в колоде (с этой частью речи)")
-    embedding = gemini_service.get_embedding(f"{body.word}: {body.translation}") if body.word else None
+    embedding = None
+    if check_near_duplicates:
+        [matches], [embedding] = await near_duplicate_service.find_near_duplicates(
+            db, current_user.id, deck_id, [(body.word, body.translation)]
+        )
+        if matches:
+            return JSONResponse(
+                status_code=409,
+                content={"detail": "В колоде есть похожие слова", "near_duplicates": matches},
+            )
     card = await card_repo.create_card(
         db, deck_id, body.word, body.translation, body.example,
-        embedding=embedding,
         transcription=body.transcription,
         pronunciation_url=body.pronunciation_url,
         part_of_speech=body.part_of_speech,
         examples=body.examples,
     )
+    if embedding is not None:
+        # Вектор уже посчитан для проверки (тот же текст) — батчеру делать нечего
+        card.embedding = embedding
     await db.commit()
+    vector_index.invalidate(current_user.id)
+    if embedding is None:
+        embedding_service.notify()
+    background_tasks.add_task(synonym_service.update_groups_for_cards, deck_id, current_user.id, [card.id])
     return card
 
 
+@router.post("/{deck_id}/cards/near-duplicates", response_model=NearDuplicateCheckResponse)
+async def check_near_duplicates(
+    deck_id: UUID,
+    body: NearDuplicateCheckRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Почти-дубликаты для списка слов до обогащения и создания карточек (без вызовов LLM)."""
+    deck = await deck_repo.get_deck_by_id(db, deck_id, current_user.id)
+    if not deck:
+        raise HTTPException(status_code=404, detail="Deck not found")
+    items = [(it.word, it.translation) for it in body.items if it.word.strip()]
+    matches, _ = await near_duplicate_service.find_near_duplicates(db, current_user.id, deck_id, items)
+    return NearDuplicateCheckResponse(
+        items=[NearDuplicateResult(word=word, matches=found) for (word, _), found in zip(items, matches)]
+    )
+
+
 @router.post("/{deck_id}/cards/{card_id}/fetch-examples", response_model=CardResponse)
 async def fetch_card_examples(
     deck_id: UUID,
@@ -190,7 +177,8 @@ async def fetch_card_examples(
     if not card or card.deck_id != deck_id:
         raise HTTPException(status_code=404, detail="Card not found")
     try:
-        examples = gemini_service.get_examples_for_card(
+        examples = await llm_gateway.run_in_thread(
+            gemini_service.get_examples_for_card,
             card.word or "",
             card.translation or "",
             card.part_of_speech,
@@ -219,24 +207,59 @@ async def get_due_cards(
 @router.post("/{deck_id}/backfill-pos")
 async def backfill_pos(
     deck_id: UUID,
-    background_tasks: BackgroundTasks,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Запустить в фоне обновление всех карточек без part_of_speech (переводы по частям речи). Без лимита, порциями."""
+    """
+    Поставить в очередь обновление всех карточек без part_of_speech (переводы по частям речи). Статус — GET /jobs/{job_id}.
+    Пока по колоде идёт такая задача, повторный запрос (или запрос с тем же Idempotency-Key) получает её job_id.
+    """
     deck = await deck_repo.get_deck_by_id(db, deck_id, current_user.id)
     if not deck:
         raise HTTPException(status_code=404, detail="Deck not found")
-    background_tasks.add_task(_run_backfill_pos_background, deck_id, current_user.id)
+    job, created = await jobs.enqueue(
+        db, jobs.BACKFILL_POS, current_user.id, {"deck_id": str(deck_id)},
+        dedup_key=jobs.dedup_key(jobs.BACKFILL_POS, deck_id), idempotency_key=idempotency_key,
+    )
+    await db.commit()
+    jobs.notify()
     return JSONResponse(
         status_code=202,
         content={
             "status": "accepted",
+            "job_id": str(job.id),
+            "attached": not created,
             "message": "Обработка запущена в фоне. Обновите колоду через некоторое время.",
         },
     )
 
 
+@router.get("/{deck_id}/stuck-words", response_model=list[StuckWordItem])
+async def stuck_words(
+    deck_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Слова, которые backfill-pos / backfill-transcriptions не смогли обогатить: число попыток, ошибка, когда повтор."""
+    deck = await deck_repo.get_deck_by_id(db, deck_id, current_user.id)
+    if not deck:
+        raise HTTPException(status_code=404, detail="Deck not found")
+    rows = await enrich_attempt_repo.get_stuck_cards(db, deck_id)
+    return [
+        StuckWordItem(
+            card_id=card.id,
+            word=card.word or "",
+            kind=attempt.kind,
+            attempts=attempt.attempts,
+            last_attempt_at=attempt.last_attempt_at,
+            next_attempt_at=attempt.next_attempt_at if attempt.attempts < settings.enrich_max_attempts else None,
+            last_error=attempt.last_error,
+        )
+        for attempt, card in rows
+    ]
+
+
 @router.post("/{deck_id}/remove-duplicates")
 async def remove_duplicates(
     deck_id: UUID,
@@ -249,6 +272,8 @@ async def remove_duplicates(
         raise HTTPException(status_code=404, detail="Deck not found")
     removed = await card_repo.remove_duplicate_cards_in_deck(db, deck_id)
     await db.commit()
+    if removed:
+        vector_index.invalidate(current_user.id)
     return {"removed": removed}
 
 
@@ -0,0 +1,87 @@
+import asyncio
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.dependencies import get_current_user
+from app.models.job import Job, JobStatus
+from app.models.user import User
+from app.schemas.job import JobResponse
+from app.db.session import get_db, async_session_maker
+from app.db.repositories import job_repo
+from app.services import job_events
+from app.sse import sse_event, sse_response
+
+router = APIRouter()
+
+_FINISHED = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+async def _get_visible_job(db: AsyncSession, job_id: UUID, user: User) -> Job:
+    job = await job_repo.get_job(db, job_id)
+    # Задачи без пользователя (наполнение банка экзаменов) видны всем, остальные — только владельцу
+    if not job or (job.user_id is not None and job.user_id != user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def _load_snapshot(job_id: UUID) -> dict | None:
+    # Сессия из get_db закрывается до начала потока — читаем в собственной
+    async with async_session_maker() as session:
+        job = await job_repo.get_job(session, job_id)
+    if job is None:
+        return None
+    stage = (job.state or {}).get("stage")
+    return job_events.event(job.id, job.status, job.processed, job.total, error=job.error, stage=stage)
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Статус фоновой задачи: прогресс processed/total, попытки, последняя ошибка."""
+    return await _get_visible_job(db, job_id, current_user)
+
+
+@router.get("/{job_id}/events")
+async def job_events_stream(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    SSE-поток прогресса задачи. События: progress {job_id, status, stage, processed, total, card_ids, error} —
+    сразу текущее состояние, затем по каждой закоммиченной порции (card_ids — изменённые карточки,
+    их можно догрузить через GET /cards?ids=...) или стадии конвейера (stage); done — то же для succeeded/failed,
+    после него поток закрывается.
+    """
+    await _get_visible_job(db, job_id, current_user)
+
+    async def events():
+        # Подписка до чтения строки: событие между чтением и подпиской не потеряется
+        queue = await job_events.subscribe(job_id)
+        try:
+            last = await _load_snapshot(job_id)
+            if last is None:
+                return
+            yield sse_event("done" if last["status"] in _FINISHED else "progress", last)
+            while last["status"] not in _FINISHED:
+                try:
+                    data = await asyncio.wait_for(queue.get(), timeout=settings.job_events_poll_seconds)
+                except asyncio.TimeoutError:
+                    # Страховка на случай недоступного LISTEN или потерянного уведомления
+                    data = await _load_snapshot(job_id)
+                    if data is None:
+                        return
+                    if all(data[k] == last[k] for k in ("status", "stage", "processed")):
+                        yield ": keep-alive\n\n"
+                        continue
+                last = data
+                yield sse_event("done" if data["status"] in _FINISHED else "progress", data)
+        finally:
+            job_events.unsubscribe(job_id, queue)
+
+    return sse_response(events())
@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from pydantic import BaseModel
 import os
 import logging
 import re
-import random
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
 from app.dependencies import get_current_user, get_db
+from app.db.session import async_session_maker
+from app.models.job import Job
 from app.models.user import User
-from app.services import youtube_service, transcription_service, gemini_service
-from app.db.repositories import youtube_repo
+from app.models.youtube_video import TranscriptSource, YouTubeVideo
+from app.sse import sse_event, sse_response, iterate_in_threadpool
+from app.services import youtube_service, transcription_service, gemini_service, captions_service, llm_gateway
+from app.db.repositories import job_repo, youtube_repo
+from app import jobs
 
 logger = logging.getLogger(__name__)
 
@@ -26,9 +30,19 @@ class YouTubeProcessResponse(BaseModel):
     video_id: str
     url: str
     transcription: str
+    transcript_source: str = "whisper"  # whisper | captions | auto_captions
     translation: str
     summary: str
 
+class YouTubeProcessJobResponse(BaseModel):
+    job_id: UUID | None = None  # None — видео уже обработано, результат сразу в result
+    status: str  # queued | running | succeeded | failed
+    stage: str | None = None  # search | download | transcribe | summarize | done
+    attached: bool = False  # запрос присоединён к уже идущей обработке этого видео
+    error: str | None = None
+    # После transcribe — с транскрипцией (translation и summary пустые), после summarize — полностью
+    result: YouTubeProcessResponse | None = None
+
 class VideoHistoryResponse(BaseModel):
     id: UUID
     video_id: str
@@ -66,95 +80,199 @@ class IeltsFullExamResponse(BaseModel):
 def cleanup_file(filepath: str):
     try:
         if os.path.exists(filepath):
-            os.remove(filepath)
+            # Вместе с временной папкой загрузки (download_youtube_audio)
+            youtube_service.remove_audio(filepath)
             logger.info(f"Cleaned up temporary file: {filepath}")
     except Exception as e:
         logger.error(f"Failed to clean up file {filepath}: {e}")
 
-@router.post("/process", response_model=YouTubeProcessResponse)
+def _parse_video_id(url: str) -> str:
+    match = re.search(r"(?:v=|\/)([0-9A-Za-z_-]{11}).*", url)
+    return match.group(1) if match else "unknown"
+
+
+async def _resolve_video_url(body: YouTubeProcessRequest) -> tuple[str, str]:
+    """URL и YouTube id видео: из запроса или случайное IELTS-видео, если URL не передан."""
+    if not body.url:
+        logger.info("No URL provided, searching for an IELTS listening video...")
+        video_info = await youtube_service.search_ielts_video()
+        return video_info["url"], video_info["video_id"]
+    return body.url, _parse_video_id(body.url)
+
+
+async def _get_cached_video(db: AsyncSession, user_id: UUID, video_id: str) -> YouTubeVideo | None:
+    """Уже обработанное видео из БД (и запись в историю пользователя), если есть."""
+    if not video_id or video_id == "unknown":
+        return None
+    existing_video = await youtube_repo.get_video_by_youtube_id(db, video_id)
+    if existing_video:
+        logger.info(f"Video {video_id} found in DB cache. Returning immediately.")
+        await youtube_repo.add_to_user_history(db, user_id, existing_video.id)
+    return existing_video
+
+
+async def _save_processed_video(
+    db: AsyncSession, user_id: UUID, video_id: str, url: str, transcript: str, translation: str, summary: str,
+    transcript_source: str = TranscriptSource.WHISPER,
+) -> YouTubeVideo:
+    try:
+        new_video = await youtube_repo.create_video(
+            db, video_id, url, transcript, translation, summary, transcript_source=transcript_source
+        )
+    except IntegrityError:
+        # Race condition: someone else saved it while we were transcribing
+        await db.rollback()
+        new_video = await youtube_repo.get_video_by_youtube_id(db, video_id)
+        if not new_video:
+            raise HTTPException(status_code=500, detail="Conflict during video creation and could not retrieve existing video.")
+    await youtube_repo.add_to_user_history(db, user_id, new_video.id)
+    return new_video
+
+
+def _process_response(video: YouTubeVideo, translation: str | None = None, summary: str | None = None) -> YouTubeProcessResponse:
+    return YouTubeProcessResponse(
+        id=video.id,
+        video_id=video.video_id,
+        url=video.url,
+        transcription=video.transcription,
+        transcript_source=video.transcript_source,
+        translation=video.translation if translation is None else translation,
+        summary=video.summary if summary is None else summary,
+    )
+
+
+async def _process_job_response(db: AsyncSession, job: Job, attached: bool = False) -> YouTubeProcessJobResponse:
+    state = job.state or {}
+    video = await youtube_repo.get_video_by_id(db, UUID(state["video"])) if state.get("video") else None
+    return YouTubeProcessJobResponse(
+        job_id=job.id,
+        status=job.status,
+        stage=state.get("stage"),
+        attached=attached,
+        error=job.error,
+        result=_process_response(video) if video else None,
+    )
+
+
+@router.post("/process", response_model=YouTubeProcessJobResponse, status_code=202)
 async def process_youtube_video(
     body: YouTubeProcessRequest,
-    background_tasks: BackgroundTasks,
+    response: Response,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    try:
-        # Step 1: Handle Autosearch or Exact URL
-        url_to_process = body.url
-        video_id = None
-        if not url_to_process:
-            logger.info("No URL provided, searching for an IELTS listening video...")
-            video_info = await youtube_service.search_ielts_video()
-            url_to_process = video_info["url"]
-            video_id = video_info["video_id"]
-        else:
-            match = re.search(r"(?:v=|\/)([0-9A-Za-z_-]{11}).*", url_to_process)
-            video_id = match.group(1) if match else "unknown"
+    """
+    Ставит обработку видео в очередь (download → transcribe → summarize) и сразу отвечает 202 с job_id.
+    Стадия и частичный результат — GET /youtube/process/{job_id} (транскрипция появляется раньше резюме),
+    поток стадий — GET /jobs/{job_id}/events. Уже обработанное видео — 200 с result без задачи.
+    Повторный запрос того же видео, пока оно обрабатывается, присоединяется к идущей задаче.
+    """
+    # Без URL случайное видео ищет сама задача (стадия search)
+    video_id = _parse_video_id(body.url) if body.url else None
 
-        # Step 2: Check DB Cache
-        if video_id and video_id != "unknown":
-            existing_video = await youtube_repo.get_video_by_youtube_id(db, video_id)
-            if existing_video:
-                logger.info(f"Video {video_id} found in DB cache. Returning immediately.")
-                await youtube_repo.add_to_user_history(db, current_user.id, existing_video.id)
-                await db.commit()
-                return YouTubeProcessResponse(
-                    id=existing_video.id,
-                    video_id=existing_video.video_id,
-                    url=existing_video.url,
-                    transcription=existing_video.transcription,
-                    translation=existing_video.translation,
-                    summary=existing_video.summary
-                )
+    existing_video = await _get_cached_video(db, current_user.id, video_id)
+    if existing_video and existing_video.summary:
+        await db.commit()
+        response.status_code = 200
+        return YouTubeProcessJobResponse(status="succeeded", stage="done", result=_process_response(existing_video))
 
-        # Step 3: Download Audio
-        logger.info(f"User {current_user.id} requested to process YouTube video: {url_to_process}")
-        audio_path = await youtube_service.download_youtube_audio(url_to_process)
-        
-        # Add to background tasks to ensure cleanup even if the next steps fail
-        background_tasks.add_task(cleanup_file, audio_path)
+    scope = f"{current_user.id}:{video_id}" if video_id and video_id != "unknown" else None
+    job, created = await jobs.enqueue(
+        db, jobs.YOUTUBE_PROCESS, current_user.id,
+        {"url": body.url or None, "video_id": video_id, "target_lang": body.target_lang},
+        dedup_key=jobs.dedup_key(jobs.YOUTUBE_PROCESS, scope) if scope else None,
+        idempotency_key=idempotency_key,
+    )
+    await db.commit()
+    jobs.notify()
+    if created:
+        logger.info(f"User {current_user.id} queued YouTube video processing: {body.url or 'random IELTS video'}")
+    return await _process_job_response(db, job, attached=not created)
 
-        # Step 4: Transcribe Audio
-        transcription_result = await transcription_service.transcribe_audio_file(audio_path, language="en")
-        
-        segments = transcription_result.get("segments", [])
-        if not segments:
-            raise HTTPException(status_code=500, detail="Transcription succeeded but no segments were found.")
-            
-        full_transcript = " ".join([segment.get("text", "") for segment in segments])
 
-        # Step 5: Translate and Summarize
-        summary_result = gemini_service.summarize_youtube_video(full_transcript, target_lang=body.target_lang)
-        translation_text = summary_result.get("translation", "")
-        summary_text = summary_result.get("summary", "")
+@router.get("/process/{job_id}", response_model=YouTubeProcessJobResponse)
+async def get_process_job(
+    job_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Стадия обработки видео и то, что уже сохранено: транскрипция — после transcribe, перевод и резюме — в конце."""
+    job = await job_repo.get_job(db, job_id, user_id=current_user.id)
+    if not job or job.type != jobs.YOUTUBE_PROCESS:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await _process_job_response(db, job)
+
+
+@router.post("/process/stream")
+async def process_youtube_video_stream(
+    body: YouTubeProcessRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    SSE-вариант /process: обработка в этом запросе, без очереди. События: stage {stage} — search | captions |
+    download | transcribe | summarize (download и transcribe пропускаются, если подошли субтитры YouTube);
+    transcript {video_id, transcription} — сразу после распознавания; delta {text} — фрагменты
+    перевода и резюме по мере генерации; result — как у /process (уже сохранено); error {detail}.
+    """
+    user_id = current_user.id
 
-        # Step 6: Save to DB and User History
+    async def events():
+        audio_path = None
         try:
-            new_video = await youtube_repo.create_video(db, video_id, url_to_process, full_transcript, translation_text, summary_text)
-        except IntegrityError:
-            # Race condition: someone else saved it while we were transcribing
-            await db.rollback()
-            new_video = await youtube_repo.get_video_by_youtube_id(db, video_id)
-            if not new_video:
-                raise HTTPException(status_code=500, detail="Conflict during video creation and could not retrieve existing video.")
-        
-        await youtube_repo.add_to_user_history(db, current_user.id, new_video.id)
-        await db.commit()
+            if not body.url:
+                yield sse_event("stage", {"stage": "search"})
+            url_to_process, video_id = await _resolve_video_url(body)
+            async with async_session_maker() as db:
+                existing_video = await _get_cached_video(db, user_id, video_id)
+                await db.commit()
+            if existing_video:
+                yield sse_event("result", _process_response(existing_video).model_dump(mode="json"))
+                return
 
-        return YouTubeProcessResponse(
-            id=new_video.id,
-            video_id=new_video.video_id,
-            url=new_video.url,
-            transcription=new_video.transcription,
-            translation=translation_text,
-            summary=summary_text
-        )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.exception("Unexpected error processing YouTube video")
-        raise HTTPException(status_code=500, detail="An internal error occurred during processing.")
+            yield sse_event("stage", {"stage": "captions"})
+            captions = await captions_service.fetch_captions(url_to_process)
+            if captions:
+                full_transcript = transcription_service.segments_to_text(captions)
+                transcript_source = captions["source"]
+            else:
+                yield sse_event("stage", {"stage": "download"})
+                audio_path = await youtube_service.download_youtube_audio(url_to_process)
+                yield sse_event("stage", {"stage": "transcribe"})
+                full_transcript = await transcription_service.transcribe_to_text(audio_path)
+                transcript_source = TranscriptSource.WHISPER
+            yield sse_event("transcript", {
+                "video_id": video_id, "transcription": full_transcript, "transcript_source": transcript_source,
+            })
+
+            yield sse_event("stage", {"stage": "summarize"})
+            summary_result: dict = {}
+            stream = gemini_service.stream_youtube_summary(full_transcript, target_lang=body.target_lang)
+            async for kind, payload in iterate_in_threadpool(stream):
+                if kind == "delta":
+                    yield sse_event("delta", {"text": payload})
+                else:
+                    summary_result = payload
+            translation_text = summary_result.get("translation", "")
+            summary_text = summary_result.get("summary", "")
+
+            async with async_session_maker() as db:
+                new_video = await _save_processed_video(
+                    db, user_id, video_id, url_to_process, full_transcript, translation_text, summary_text,
+                    transcript_source=transcript_source,
+                )
+                await db.commit()
+            yield sse_event("result", _process_response(new_video, translation_text, summary_text).model_dump(mode="json"))
+        except (ValueError, HTTPException, llm_gateway.LLMQueueTimeout) as e:
+            yield sse_event("error", {"detail": getattr(e, "detail", None) or str(e)})
+        except Exception:
+            logger.exception("Unexpected error processing YouTube video (stream)")
+            yield sse_event("error", {"detail": "An internal error occurred during processing."})
+        finally:
+            if audio_path:
+                cleanup_file(audio_path)
+
+    return sse_response(events())
 
 @router.get("/search", response_model=list[YouTubeSearchResult])
 async def search_videos(
@@ -208,12 +326,18 @@ async def generate_questions(
         raise HTTPException(status_code=404, detail="Video not found in DB.")
         
     try:
-        questions_data = gemini_service.generate_ielts_listening_questions(video.transcription)
+        questions_data = await llm_gateway.run_in_thread(gemini_service.generate_ielts_listening_questions, video.transcription)
         return questions_data
+    except llm_gateway.LLMQueueTimeout:
+        raise
     except Exception as e:
         logger.error(f"Error generating questions: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate questions.")
 
+def _ask_prompt(video: YouTubeVideo, question: str) -> str:
+    # Re-use our freeform AI method or write a specific prompt
+    return f"Ответь на вопрос по тексту этого видео. Транскрипция:\n{video.transcription}\n\nВопрос: {question}"
+
 @router.post("/{video_id}/ask")
 async def ask_question_about_video(
     video_id: UUID,
@@ -226,19 +350,48 @@ async def ask_question_about_video(
         raise HTTPException(status_code=404, detail="Video not found in DB.")
         
     try:
-        # Re-use our freeform AI method or write a specific prompt
-        prompt = f"Ответь на вопрос по тексту этого видео. Транскрипция:\n{video.transcription}\n\nВопрос: {body.question}"
         # using translation logic loosely or general gemini text 
-        answer = gemini_service._generate_content_with_fallback(prompt)
+        answer = await llm_gateway.run_in_thread(gemini_service._generate_content_with_fallback, _ask_prompt(video, body.question))
         return {"answer": answer}
+    except llm_gateway.LLMQueueTimeout:
+        raise
     except Exception as e:
         logger.error(f"Error answering question: {e}")
         raise HTTPException(status_code=500, detail="Failed to answer the question.")
 
+@router.post("/{video_id}/ask/stream")
+async def ask_question_about_video_stream(
+    video_id: UUID,
+    body: AskQuestionRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """SSE-вариант /{video_id}/ask: delta {text} по мере генерации, затем result {answer}; error {detail}."""
+    video = await youtube_repo.get_video_by_id(db, video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found in DB.")
+    stream = gemini_service._stream_content_with_fallback(_ask_prompt(video, body.question))
+
+    async def events():
+        parts: list[str] = []
+        try:
+            async for piece in iterate_in_threadpool(stream):
+                parts.append(piece)
+                yield sse_event("delta", {"text": piece})
+        except llm_gateway.LLMQueueTimeout as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Error answering question (stream): {e}")
+            yield sse_event("error", {"detail": "Failed to answer the question."})
+            return
+        yield sse_event("result", {"answer": "".join(parts).strip()})
+
+    return sse_response(events())
+
 @router.post("/exam/generate-part", response_model=IeltsExamPartResponse)
 async def generate_exam_part(
     part_num: int,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -293,24 +446,20 @@ async def generate_exam_part(
             logger.info(f"Video {y_video_id} already transcribed. Reusing.")
             transcript = db_video.transcription
         else:
-            # 2. Download audio
-            audio_path = await youtube_service.download_youtube_audio(url)
-            background_tasks.add_task(cleanup_file, audio_path)
-            
-            # 3. Transcribe audio
-            transcription_result = await transcription_service.transcribe_audio_file(audio_path, language="en")
-            segments = transcription_result.get("segments", [])
-            transcript = " ".join([segment.get("text", "") for segment in segments])
+            # 2-3. Captions, or download audio and transcribe
+            transcript, transcript_source = await youtube_service.get_transcript(url)
             
             # Save the video basics (without translation/summary for now as it's an exam part)
             try:
-                db_video = await youtube_repo.create_video(db, y_video_id, url, transcript, "", "")
+                db_video = await youtube_repo.create_video(
+                    db, y_video_id, url, transcript, "", "", transcript_source=transcript_source
+                )
             except IntegrityError:
                 await db.rollback()
                 db_video = await youtube_repo.get_video_by_youtube_id(db, y_video_id)
 
         # 4. Generate questions via LLM
-        questions_payload = gemini_service.generate_ielts_exam_part(transcript, part_num)
+        questions_payload = await llm_gateway.run_in_thread(gemini_service.generate_ielts_exam_part, transcript, part_num)
         raw_questions = questions_payload.get("questions", [])
         
         # 5. Save to Bank
@@ -325,64 +474,33 @@ async def generate_exam_part(
             questions=[IeltsExamQuestion(**q) for q in raw_questions]
         )
 
+    except llm_gateway.LLMQueueTimeout:
+        raise
     except Exception as e:
         logger.exception(f"Failed to generate IELTS Exam Part {part_num}")
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
-@router.post("/exam/bank/seed")
+@router.post("/exam/bank/seed", status_code=202)
 async def seed_exam_bank(
     count: int = 5,
-    background_tasks: BackgroundTasks = None,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Triggers background generation of multiple exam parts for each category (1-4).
+    Queues background generation of multiple exam parts for each category (1-4).
+    Progress: GET /jobs/{job_id}. While a seeding job is queued or running, new requests attach to it.
     """
+    job, created = await jobs.enqueue(
+        db, jobs.SEED_EXAM_BANK, None, {"count": count},
+        dedup_key=jobs.dedup_key(jobs.SEED_EXAM_BANK, None), idempotency_key=idempotency_key,
+    )
+    await db.commit()
+    jobs.notify()
+    if not created:
+        return {"message": "Seeding is already in progress.", "job_id": str(job.id), "attached": True}
     logger.info(f"Seeding Exam Bank with {count} variants per part...")
-    
-    async def _seed_task():
-        for part_num in range(1, 5):
-            for i in range(count):
-                try:
-                    query = f"ielts listening practice test part {part_num} short"
-                    search_results = await youtube_service.search_youtube_videos(query, limit=10)
-                    # Pick a random one from search results to avoid always picking the same
-                    selected_video = random.choice(search_results)
-                    y_video_id = selected_video["video_id"]
-                    url = selected_video["url"]
-                    
-                    # Check if already in bank
-                    existing_video = await youtube_repo.get_video_by_youtube_id(db, y_video_id)
-                    if existing_video:
-                        existing_part = await youtube_repo.get_exam_part_by_video_id(db, existing_video.id, part_num)
-                        if existing_part:
-                            continue
-
-                    # Process: Download, Transcribe, Generate
-                    audio_path = await youtube_service.download_youtube_audio(url)
-                    transcription_result = await transcription_service.transcribe_audio_file(audio_path, language="en")
-                    if os.path.exists(audio_path):
-                        os.remove(audio_path)
-                    
-                    transcript = " ".join([s.get("text", "") for s in transcription_result.get("segments", [])])
-                    
-                    db_video = await youtube_repo.get_video_by_youtube_id(db, y_video_id)
-                    if not db_video:
-                        db_video = await youtube_repo.create_video(db, y_video_id, url, transcript, "", "")
-                    
-                    questions_payload = gemini_service.generate_ielts_exam_part(transcript, part_num)
-                    await youtube_repo.create_exam_part(db, db_video.id, part_num, questions_payload.get("questions", []))
-                    await db.commit()
-                    logger.info(f"Successfully seeded Part {part_num} variant {i+1}")
-                except Exception as e:
-                    logger.error(f"Error seeding Exam Bank variant: {e}")
-                    await db.rollback()
-
-    if background_tasks:
-        background_tasks.add_task(_seed_task)
-    else:
-        # Fallback if needed, though FastAPI provides it
-        import asyncio
-        asyncio.create_task(_seed_task())
-        
-    return {"message": f"Seeding started for {count} variants per part in background."}
+    return {
+        "message": f"Seeding started for {count} variants per part in background.",
+        "job_id": str(job.id),
+        "attached": False,
+    }
@@ -7,6 +7,7 @@ class GenerateWordsRequest(BaseModel):
     level: str | None = None  # A1, A2, B1, B2, C1
     topic: str | None = None
     count: int = 20
+    skip_near_duplicates: bool = False  # не обогащать и не создавать слова, близкие по эмбеддингу к карточкам колоды
 
 
 class TranslateRequest(BaseModel):
@@ -83,6 +84,18 @@ class SuggestSynonymGroupsResponse(BaseModel):
     groups: list[SynonymGroupItem]
 
 
+class SuggestSynonymGroupsJobResponse(BaseModel):
+    job_id: str | None = None  # None — колода не менялась с прошлого подбора, группы сразу в groups
+    deck_id: str
+    mode: str
+    status: str  # queued | running | succeeded | failed
+    attached: bool = False  # запрос присоединён к уже идущему подбору этой колоды
+    done_batches: int = 0
+    total_batches: int = 0
+    groups: list[SynonymGroupItem]  # пока status != succeeded — частичные, по уже полученным синонимам
+    error: str | None = None
+
+
 class ApplySynonymGroupsRequest(BaseModel):
     groups: list[list[str]]  # each inner list is card_ids in one group
 
@@ -136,3 +149,11 @@ class WritingSubmissionResponse(BaseModel):
     errors: list[WritingErrorItem]
     recommendations: str
     created_at: datetime
+
+
+class UsageSummaryItem(BaseModel):
+    endpoint: str
+    provider: str
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
@@ -41,5 +41,41 @@ class CardResponse(BaseModel):
         from_attributes = True
 
 
+class NearDuplicateItem(BaseModel):
+    word: str
+    translation: str | None = None  # с переводом сравнение точнее (тот же текст, что у эмбеддинга карточки)
+
+
+class NearDuplicateCheckRequest(BaseModel):
+    items: list[NearDuplicateItem]
+
+
+class NearDuplicateMatch(BaseModel):
+    card_id: str
+    word: str
+    translation: str
+    similarity: float
+
+
+class NearDuplicateResult(BaseModel):
+    word: str
+    matches: list[NearDuplicateMatch]
+
+
+class NearDuplicateCheckResponse(BaseModel):
+    items: list[NearDuplicateResult]
+
+
 class ReviewRequest(BaseModel):
     rating: int  # 1=Again, 2=Hard, 3=Good, 4=Easy
+
+
+class StuckWordItem(BaseModel):
+    """Карточка, которую backfill не смог обогатить (card_enrich_attempts)."""
+    card_id: UUID
+    word: str
+    kind: str  # pos | transcription
+    attempts: int
+    last_attempt_at: datetime
+    next_attempt_at: datetime | None = None  # None — попытки исчерпаны, backfill карточку больше не трогает
+    last_error: str | None = None
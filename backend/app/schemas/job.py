@@ -0,0 +1,21 @@
+from datetime import datetime
+from uuid import UUID
+from pydantic import BaseModel
+
+
+class JobResponse(BaseModel):
+    id: UUID
+    type: str
+    status: str  # queued | running | succeeded | failed
+    processed: int
+    total: int | None = None
+    attempts: int
+    max_attempts: int
+    run_after: datetime  # для queued после ошибки — время следующей попытки
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,116 @@
+"""Схемы ответов LLM: передаются провайдеру как JSON Schema (structured output) и валидируют ответ."""
+from typing import Any
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+PARTS_OF_SPEECH = ("noun", "verb", "adjective", "adverb")
+
+
+class EnrichSense(BaseModel):
+    part_of_speech: str = Field(json_schema_extra={"enum": list(PARTS_OF_SPEECH)})
+    translation: str = ""  # 3-8 русских эквивалентов через "; "
+    examples: list[str] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def _legacy_keys(cls, data: Any) -> Any:
+        # Старый формат ответа: translations: [...] и один example вместо examples
+        if isinstance(data, dict):
+            data = dict(data)
+            if not data.get("translation") and isinstance(data.get("translations"), list):
+                data["translation"] = "; ".join(str(x).strip() for x in data["translations"] if x)
+            if "examples" not in data and data.get("example"):
+                data["examples"] = [data["example"]]
+        return data
+
+
+class EnrichResult(BaseModel):
+    transcription: str | None = None
+    senses: list[EnrichSense] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def _flat_answer(cls, data: Any) -> Any:
+        # Модель иногда отвечает плоско {translation, example} — считаем это одним значением-существительным
+        if isinstance(data, dict) and not data.get("senses") and (data.get("translation") or data.get("example")):
+            data = dict(data)
+            data["senses"] = [{"part_of_speech": "noun", "translation": data.get("translation") or "", "example": data.get("example") or ""}]
+        return data
+
+
+class EnrichBatchResult(BaseModel):
+    items: list[EnrichResult]
+
+
+class WritingErrorItem(BaseModel):
+    type: str = Field("", json_schema_extra={"enum": ["grammar", "spelling", "punctuation", "vocabulary", "style"]})
+    original: str = ""
+    correction: str = ""
+    explanation: str = ""
+
+
+class WritingEvaluation(BaseModel):
+    band_score: float | None = None
+    evaluation: str = ""
+    corrected_text: str = ""
+    errors: list[WritingErrorItem] = []
+    recommendations: str = ""
+
+    @field_validator("band_score", mode="before")
+    @classmethod
+    def _band_in_range(cls, v: Any) -> float | None:
+        try:
+            band = float(v)
+        except (TypeError, ValueError):
+            return None
+        return band if 0 <= band <= 9 else None
+
+
+class VideoSummary(BaseModel):
+    translation: str = ""
+    summary: str = ""
+
+
+class ListeningQuestion(BaseModel):
+    question: str
+    options: list[str] = []
+    correct_answer: str = ""
+    explanation: str = ""
+
+
+class GapFillQuestion(BaseModel):
+    sentence: str
+    answer: str = ""
+    explanation: str = ""
+
+
+class ListeningQuestions(BaseModel):
+    questions: list[ListeningQuestion] = []
+    gap_fill_questions: list[GapFillQuestion] = []
+
+
+class ExamQuestion(BaseModel):
+    type: str = Field("completion", json_schema_extra={"enum": ["multiple_choice", "completion", "matching"]})
+    question: str
+    options: list[str] = []
+    answer: str = ""
+    explanation: str = ""
+
+    @field_validator("answer", mode="before")
+    @classmethod
+    def _join_answer(cls, v: Any) -> Any:
+        # Для matching модель иногда отдаёт список ответов
+        return ", ".join(str(x) for x in v) if isinstance(v, list) else v
+
+
+class ExamPartQuestions(BaseModel):
+    questions: list[ExamQuestion] = []
+
+
+class SynonymVerdict(BaseModel):
+    pair: int
+    synonyms: bool = False
+
+
+class SynonymVerdicts(BaseModel):
+    items: list[SynonymVerdict] = []
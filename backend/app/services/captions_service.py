@@ -0,0 +1,139 @@
+"""Английские субтитры YouTube вместо Whisper.
+
+У многих видео IELTS listening есть ручные английские субтитры: их текст точнее распознавания и не требует
+ни скачивания аудио, ни GPU-воркера. Субтитры берутся из метаданных yt-dlp (без скачивания видео),
+разбираются в ту же структуру сегментов, что возвращает Whisper-воркер ({start, end, text}), и используются,
+только если покрывают почти всё видео. YOUTUBE_CAPTIONS: manual — только ручные, auto — и автоматические
+(распознавание YouTube, только исходный язык видео, не машинный перевод), off — всегда Whisper.
+"""
+import html
+import json
+import logging
+import re
+
+import yt_dlp
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.youtube_video import TranscriptSource
+
+logger = logging.getLogger(__name__)
+
+# Форматы дорожки в порядке предпочтения: json3 — готовые события с таймингами, vtt — запасной
+_FORMATS = ("json3", "vtt")
+_MIN_WORDS = 20
+_VTT_TIME = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})")
+_TAG = re.compile(r"<[^>]+>")
+# Пометки вроде [Music], (applause) и маркеры смены говорящего — не речь
+_NON_SPEECH = re.compile(r"\[[^\]]*\]|\([^)]*\)|^\s*>>\s*")
+
+
+def _clean(text: str) -> str:
+    text = _NON_SPEECH.sub(" ", html.unescape(_TAG.sub("", text)).replace("\n", " "))
+    return " ".join(text.split())
+
+
+def _english_keys(tracks: dict) -> list[str]:
+    return sorted(
+        (k for k in tracks if k == "en" or k.startswith("en-")),
+        key=lambda k: (k != "en", k),
+    )
+
+
+def _pick_track(info: dict, mode: str) -> tuple[dict, str] | None:
+    """(дорожка {ext, url}, источник) — ручные субтитры, затем (mode=auto) автоматические; None — подходящих нет."""
+    candidates: list[tuple[list[dict], str]] = []
+    manual = info.get("subtitles") or {}
+    for key in _english_keys(manual):
+        candidates.append((manual[key], TranscriptSource.CAPTIONS))
+    if mode == "auto":
+        auto = info.get("automatic_captions") or {}
+        language = info.get("language") or ""
+        # en-orig — распознавание исходной дорожки; en у неанглийского видео — машинный перевод
+        keys = ["en-orig"] + (["en"] if not language or language.startswith("en") else [])
+        for key in keys:
+            if key in auto:
+                candidates.append((auto[key], TranscriptSource.AUTO_CAPTIONS))
+    for formats, source in candidates:
+        by_ext = {f.get("ext"): f for f in formats if f.get("url")}
+        for ext in _FORMATS:
+            if ext in by_ext:
+                return by_ext[ext], source
+    return None
+
+
+def parse_json3(raw: str) -> list[dict]:
+    segments = []
+    for ev in json.loads(raw).get("events") or []:
+        text = _clean("".join(seg.get("utf8", "") for seg in ev.get("segs") or []))
+        if not text:
+            continue
+        start = ev.get("tStartMs", 0) / 1000
+        end = start + ev.get("dDurationMs", 0) / 1000
+        segments.append({"start": round(start, 2), "end": round(end, 2), "text": text})
+    return segments
+
+
+def _vtt_seconds(value: str) -> float:
+    h, m, s, ms = _VTT_TIME.match(value).groups()
+    return int(h or 0) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
+
+
+def parse_vtt(raw: str) -> list[dict]:
+    segments = []
+    previous = ""
+    for block in re.split(r"\r?\n\r?\n", raw):
+        lines = block.strip().splitlines()
+        timing = next((i for i, line in enumerate(lines) if "-->" in line), None)
+        if timing is None:
+            continue
+        start, end = (part.strip().split(" ")[0] for part in lines[timing].split("-->", 1))
+        # Автосубтитры в vtt «прокручиваются»: строка повторяется в следующей реплике
+        text_lines = [_clean(line) for line in lines[timing + 1:]]
+        text = " ".join(line for line in text_lines if line and line != previous)
+        if text_lines:
+            previous = text_lines[-1]
+        if text:
+            segments.append({"start": round(_vtt_seconds(start), 2), "end": round(_vtt_seconds(end), 2), "text": text})
+    return segments
+
+
+def _usable(segments: list[dict], duration: float | None) -> bool:
+    words = sum(len(s["text"].split()) for s in segments)
+    if words < _MIN_WORDS:
+        return False
+    if duration:
+        covered = segments[-1]["end"] - segments[0]["start"]
+        return covered >= settings.youtube_captions_min_coverage * duration
+    return True
+
+
+def _fetch_captions_sync(url: str, mode: str) -> dict | None:
+    with yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True, "skip_download": True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+        picked = _pick_track(info, mode)
+        if picked is None:
+            return None
+        track, source = picked
+        raw = ydl.urlopen(track["url"]).read().decode("utf-8", errors="replace")
+    segments = parse_json3(raw) if track.get("ext") == "json3" else parse_vtt(raw)
+    if not _usable(segments, info.get("duration")):
+        logger.info("Субтитры %s видео %s не подходят: мало текста или покрыта малая часть", source, info.get("id"))
+        return None
+    return {"segments": segments, "language": "en", "duration": info.get("duration"), "source": source}
+
+
+async def fetch_captions(url: str) -> dict | None:
+    """
+    Английские субтитры видео как результат Whisper-воркера ({segments, language, duration}) плюс source
+    (TranscriptSource); None — субтитров нет, они не подходят, выключены (YOUTUBE_CAPTIONS=off) или не загрузились.
+    """
+    mode = settings.youtube_captions
+    if mode == "off":
+        return None
+    try:
+        return await run_in_threadpool(_fetch_captions_sync, url, mode)
+    except Exception as e:
+        # Субтитры — лишь оптимизация: при любой ошибке — обычный путь через Whisper
+        logger.warning(f"Could not fetch captions for {url}: {e}")
+        return None
@@ -0,0 +1,187 @@
+"""Эмбеддинги карточек вне пути запроса: батчи к провайдеру, кэш по хэшу содержимого, фоновое заполнение.
+
+Карточка создаётся сразу с embedding = NULL, роутер вызывает notify(), и фоновый батчер
+(run_embedding_batcher, стартует вместе с приложением) забирает все карточки без вектора
+порциями по EMBEDDING_BATCH_SIZE: сначала LRU в памяти, затем таблица embedding_cache,
+и только недостающие тексты — одним batch-запросом к провайдеру. Раз в EMBEDDING_SWEEP_SECONDS
+батчер проходит по таблице и без уведомления (карточки из backfill-pos, старые записи).
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.repositories import card_repo, embedding_repo
+from app.services import gemini_service, llm_gateway, vector_index
+
+logger = logging.getLogger(__name__)
+
+
+def card_text(word: str | None, translation: str | None) -> str:
+    """
+    Текст карточки для эмбеддинга (тот же формат, что раньше считался inline при создании).
+    Карточка без перевода (translation NULL или пустой) — только слово, а не «word: None».
+    """
+    word = word or ""
+    return f"{word}: {translation}" if translation else word
+
+
+def content_hash(text: str, model: str | None = None) -> str:
+    key = f"{model or gemini_service.embedding_model_key()}\n{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._data: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is not None:
+                self._data.move_to_end(key)
+            return vec
+
+    def put(self, key: str, vec: list[float]) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._data[key] = vec
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+
+_lru = _LRU(settings.embedding_lru_size)
+
+
+async def get_embeddings(db: AsyncSession, texts: list[str]) -> list[list[float] | None]:
+    """
+    Векторы для texts (порядок сохраняется): LRU -> embedding_cache -> провайдер батчем.
+    Новые векторы пишутся в embedding_cache (коммит — на вызывающем). None — провайдер недоступен.
+    """
+    model = gemini_service.embedding_model_key()
+    hashes = [content_hash(t, model) for t in texts]
+    found: dict[str, list[float]] = {}
+    for h in hashes:
+        vec = _lru.get(h)
+        if vec is not None:
+            found[h] = vec
+    missing = [h for h in dict.fromkeys(hashes) if h not in found]
+    if missing:
+        cached = await embedding_repo.get_cached_embeddings(db, missing)
+        for h, vec in cached.items():
+            _lru.put(h, vec)
+        found.update(cached)
+    to_embed: dict[str, str] = {}
+    for h, t in zip(hashes, texts):
+        if h not in found:
+            to_embed.setdefault(h, t)
+    if to_embed:
+        vectors = await llm_gateway.run_in_thread(gemini_service.get_embeddings_batch, list(to_embed.values()))
+        if vectors:
+            fresh = dict(zip(to_embed.keys(), vectors))
+            await embedding_repo.add_cached_embeddings(db, model, fresh)
+            for h, vec in fresh.items():
+                _lru.put(h, vec)
+            found.update(fresh)
+    return [found.get(h) for h in hashes]
+
+
+async def get_query_embedding(db: AsyncSession, word: str):
+    """
+    Вектор запроса для похожих слов — всегда эмбеддинг самого нормализованного слова: кэш (LRU /
+    embedding_cache), провайдер — только при промахе. Вектор карточки с тем же словом не подставляется:
+    он посчитан по «word: translation», и результат зависел бы от того, есть ли слово в словаре.
+    """
+    normalized = (word or "").strip().lower()
+    if not normalized:
+        return None
+    [vec] = await get_embeddings(db, [card_text(normalized, None)])
+    if vec is not None:
+        await db.commit()
+    return vec
+
+
+# --- Фоновый батчер: заполняет cards.embedding ---
+
+_wakeup: asyncio.Event | None = None
+
+
+def notify() -> None:
+    """Разбудить батчер: появились карточки без вектора (вызывать после commit)."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+# Сколько порций подряд без единого вектора прерывают проход: провайдер лежит, ждём следующего
+_MAX_FAILED_BATCHES = 3
+
+
+async def fill_missing_embeddings() -> int:
+    """
+    Один проход по всем карточкам без вектора. Возвращает число заполненных.
+
+    Блокировок на время запроса к провайдеру нет: порция читается и транзакция сразу закрывается,
+    векторы пишутся отдельной транзакцией и только в карточки, где embedding всё ещё NULL, — если
+    другой процесс успел раньше, запись просто ничего не меняет. Неудачная порция пропускается
+    (её подберёт следующий проход), после _MAX_FAILED_BATCHES неудач подряд проход прерывается.
+    """
+    from app.db.session import async_session_maker
+
+    filled = 0
+    skipped = 0
+    failed_in_row = 0
+    after_id: UUID | None = None
+    while True:
+        async with async_session_maker() as db:
+            rows = await card_repo.get_cards_missing_embedding(db, after_id, settings.embedding_batch_size)
+        if not rows:
+            break
+        after_id = rows[-1].id
+        async with async_session_maker() as db:
+            vectors = await get_embeddings(db, [card_text(r.word, r.translation) for r in rows])
+            updates = {r.id: vec for r, vec in zip(rows, vectors) if vec is not None}
+            updated = await card_repo.set_card_embeddings(db, updates)
+            await db.commit()
+        for user_id in {r.user_id for r in rows if r.id in updated}:
+            vector_index.invalidate(user_id)
+        filled += len(updated)
+        skipped += len(rows) - len(updates)
+        if updates:
+            failed_in_row = 0
+            continue
+        failed_in_row += 1
+        logger.warning("Эмбеддинги не получены для порции из %s карточек, пропускаем", len(rows))
+        if failed_in_row >= _MAX_FAILED_BATCHES:
+            logger.warning("Провайдер эмбеддингов недоступен (%s порций подряд), откладываем до следующего прохода", failed_in_row)
+            break
+    if skipped:
+        logger.info("Без эмбеддинга осталось %s карточек, повтор — на следующем проходе", skipped)
+    return filled
+
+
+async def run_embedding_batcher() -> None:
+    """Фоновый цикл: по notify() (с небольшой задержкой, чтобы собрать порцию) или раз в EMBEDDING_SWEEP_SECONDS."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.embedding_sweep_seconds)
+            await asyncio.sleep(settings.embedding_batch_delay_seconds)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            filled = await fill_missing_embeddings()
+            if filled:
+                logger.info("Заполнены эмбеддинги для %s карточек", filled)
+        except Exception:
+            logger.exception("Ошибка фонового заполнения эмбеддингов")
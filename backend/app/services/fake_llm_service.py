@@ -0,0 +1,285 @@
+"""Локальный фейковый провайдер LLM (LLM_BACKEND=fake): нагрузочные тесты и CI без Gemini/OpenAI.
+
+Подменяет вызов провайдера внутри gemini_service._call_provider / _stream_provider, поэтому
+LLM-шлюз (квоты, очередь, полосы приоритета), переключение GPT ↔ Gemini и разбор ответов работают
+как с настоящими моделями. Задержка — логнормальная (медиана LLM_FAKE_LATENCY_MS, разброс
+LLM_FAKE_LATENCY_SIGMA) плюс время на каждый токен ответа; ошибки и 429 внедряются с заданной
+вероятностью. Последовательность задержек и ошибок детерминирована LLM_FAKE_SEED и порядковым
+номером вызова, содержимое ответа — seed и текстом промпта.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import math
+import random
+import re
+import time
+from typing import Callable, Iterator
+
+from pydantic import BaseModel
+
+from app.config import settings
+from app.schemas import llm as llm_schemas
+from app.services.llm_gateway import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 768
+
+_call_counter = itertools.count()
+
+_VOCABULARY = [
+    ("apple", "яблоко", "ˈæpl"), ("house", "дом", "haʊs"), ("run", "бежать", "rʌn"),
+    ("quick", "быстрый", "kwɪk"), ("slowly", "медленно", "ˈsləʊli"), ("book", "книга", "bʊk"),
+    ("water", "вода", "ˈwɔːtə"), ("bright", "яркий", "braɪt"), ("decide", "решать", "dɪˈsaɪd"),
+    ("journey", "путешествие", "ˈdʒɜːni"), ("weather", "погода", "ˈweðə"), ("improve", "улучшать", "ɪmˈpruːv"),
+    ("careful", "осторожный", "ˈkeəfl"), ("often", "часто", "ˈɒfn"), ("market", "рынок", "ˈmɑːkɪt"),
+    ("borrow", "одалживать", "ˈbɒrəʊ"), ("large", "большой", "lɑːdʒ"), ("big", "большой", "bɪɡ"),
+    ("answer", "ответ", "ˈɑːnsə"), ("village", "деревня", "ˈvɪlɪdʒ"), ("explain", "объяснять", "ɪkˈspleɪn"),
+    ("quiet", "тихий", "ˈkwaɪət"), ("finally", "наконец", "ˈfaɪnəli"), ("teacher", "учитель", "ˈtiːtʃə"),
+]
+
+
+class FakeProviderError(ValueError):
+    """Внедрённая ошибка фейкового провайдера (ValueError — как у настоящих провайдеров)."""
+
+
+def _rng(*parts: object) -> random.Random:
+    key = ":".join(str(p) for p in (settings.llm_fake_seed, *parts))
+    return random.Random(hashlib.sha256(key.encode("utf-8")).digest())
+
+
+def _simulate_call(provider: str, output_tokens: int) -> tuple[float, float]:
+    """
+    Разыграть исход очередного вызова: внедрённая ошибка / 429 (после задержки — исключение)
+    или (время до первого токена, время на генерацию ответа) в секундах.
+    """
+    rng = _rng("call", next(_call_counter))
+    first_token = settings.llm_fake_latency_ms / 1000.0 * math.exp(rng.gauss(0.0, settings.llm_fake_latency_sigma))
+    generation = output_tokens * settings.llm_fake_ms_per_output_token / 1000.0
+    roll = rng.random()
+    if roll < settings.llm_fake_rate_limit_rate:
+        time.sleep(first_token * 0.2)
+        raise FakeProviderError(f"Превышен лимит запросов {provider} (fake 429). Попробуйте через 60 с.")
+    if roll < settings.llm_fake_rate_limit_rate + settings.llm_fake_error_rate:
+        time.sleep(first_token)
+        raise FakeProviderError(f"Все модели {provider} недоступны: fake 500")
+    return first_token, generation
+
+
+def _transcript(prompt: str) -> str:
+    m = re.search(r"(?:TRANSCRIPT|TEXT):\s*---\n(.*?)\n---", prompt, re.S)
+    return m.group(1).strip() if m else ""
+
+
+def _sentences(text: str, rng: random.Random, count: int) -> list[str]:
+    parts = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if len(s.strip().split()) >= 3]
+    if not parts:
+        parts = ["The speaker talks about daily routines and plans for the weekend."]
+    return [parts[rng.randrange(len(parts))] for _ in range(count)]
+
+
+def _enrich_item(word: str, rng: random.Random) -> dict:
+    pos = rng.sample(llm_schemas.PARTS_OF_SPEECH, k=rng.randint(1, 2))
+    return {
+        "transcription": f"[{word}]",
+        "senses": [
+            {
+                "part_of_speech": p,
+                "translation": f"{word} ({p}); вариант {rng.randint(1, 9)}; значение",
+                "examples": [f"This is how you use {word} as a {p}.", f"I like the word {word}."],
+            }
+            for p in pos
+        ],
+    }
+
+
+def _fake_enrich(prompt: str, rng: random.Random) -> dict:
+    m = re.search(r'Word "(.+?)"', prompt)
+    return _enrich_item(m.group(1) if m else "word", rng)
+
+
+def _fake_enrich_batch(prompt: str, rng: random.Random) -> dict:
+    m = re.search(r"Words: (.*?)\.\n", prompt)
+    words = re.findall(r'"([^"]+)"', m.group(1)) if m else []
+    return {"items": [_enrich_item(w, rng) for w in words]}
+
+
+def _fake_writing(prompt: str, rng: random.Random) -> dict:
+    text = _transcript(prompt)
+    first_word = (text.split() or ["text"])[0]
+    return {
+        "band_score": rng.choice([5.0, 5.5, 6.0, 6.5, 7.0, 7.5]),
+        "evaluation": "Текст в целом соответствует заданию, есть грамматические неточности.",
+        "corrected_text": text,
+        "errors": [{
+            "type": "grammar",
+            "original": first_word,
+            "correction": first_word,
+            "explanation": "Тестовая ошибка фейкового провайдера.",
+        }],
+        "recommendations": "Используйте больше связующих слов. Проверяйте времена глаголов.",
+    }
+
+
+def _fake_summary(prompt: str, rng: random.Random) -> dict:
+    text = _transcript(prompt)
+    return {
+        "translation": f"[перевод] {text}",
+        "summary": "\n".join(f"• {s}" for s in _sentences(text, rng, 3)),
+    }
+
+
+def _fake_listening(prompt: str, rng: random.Random) -> dict:
+    sentences = _sentences(_transcript(prompt), rng, 8)
+    questions = [
+        {
+            "question": f"What does the speaker say: {s[:60]}?",
+            "options": ["Option A", "Option B", "Option C"],
+            "correct_answer": "Option A",
+            "explanation": s,
+        }
+        for s in sentences[:4]
+    ]
+    gaps = []
+    for s in sentences[4:]:
+        words = s.split()
+        i = rng.randrange(len(words))
+        gaps.append({"sentence": " ".join(words[:i] + ["___"] + words[i + 1:]), "answer": words[i], "explanation": s})
+    return {"questions": questions, "gap_fill_questions": gaps}
+
+
+def _fake_exam_part(prompt: str, rng: random.Random) -> dict:
+    questions = []
+    for s in _sentences(_transcript(prompt), rng, 10):
+        words = s.split()
+        i = rng.randrange(len(words))
+        if rng.random() < 0.5:
+            questions.append({
+                "type": "completion",
+                "question": " ".join(words[:i] + ["___"] + words[i + 1:]),
+                "options": [],
+                "answer": words[i],
+                "explanation": s,
+            })
+        else:
+            questions.append({
+                "type": "multiple_choice",
+                "question": f"Which statement is true? {s[:60]}",
+                "options": ["A", "B", "C"],
+                "answer": "A",
+                "explanation": s,
+            })
+    return {"questions": questions}
+
+
+def _fake_synonym_verdicts(prompt: str, rng: random.Random) -> dict:
+    count = len(re.findall(r"^\d+\. ", prompt, re.M))
+    return {"items": [{"pair": i, "synonyms": rng.random() < 0.5} for i in range(1, count + 1)]}
+
+
+# Ответы по схеме structured output — по одному на каждый JSON-промпт gemini_service
+_SCHEMA_RESPONSES: dict[type[BaseModel], Callable[[str, random.Random], dict]] = {
+    llm_schemas.EnrichResult: _fake_enrich,
+    llm_schemas.EnrichBatchResult: _fake_enrich_batch,
+    llm_schemas.WritingEvaluation: _fake_writing,
+    llm_schemas.VideoSummary: _fake_summary,
+    llm_schemas.ListeningQuestions: _fake_listening,
+    llm_schemas.ExamPartQuestions: _fake_exam_part,
+    llm_schemas.SynonymVerdicts: _fake_synonym_verdicts,
+}
+
+
+def _fake_word_list(prompt: str, rng: random.Random) -> str:
+    m = re.search(r"Generate (\d+)", prompt)
+    count = int(m.group(1)) if m else 20
+    picked = rng.sample(_VOCABULARY, k=min(count, len(_VOCABULARY)))
+    return "\n".join(f"{w} | {t} | I use the word {w} every day. | {ipa}" for w, t, ipa in picked)
+
+
+def _fake_translate(prompt: str, rng: random.Random) -> str:
+    m = re.search(r"\nText: (.*)\nTranslation:", prompt, re.S)
+    return f"[перевод] {m.group(1).strip()}" if m else "[перевод]"
+
+
+def _fake_examples(prompt: str, rng: random.Random) -> str:
+    m = re.search(r'English word "(.+?)"', prompt)
+    word = m.group(1) if m else "word"
+    return "\n".join(f"Example {i} with {word}. — Пример {i} со словом {word}." for i in range(1, rng.randint(3, 5) + 1))
+
+
+def _fake_synonyms(prompt: str, rng: random.Random) -> str:
+    m = re.search(r'synonyms for the word "(.+?)"', prompt)
+    word = m.group(1) if m else "word"
+    return "\n".join(f"{word}-syn{i}" for i in range(1, rng.randint(2, 6)))
+
+
+def _fake_synonyms_batch(prompt: str, rng: random.Random) -> str:
+    m = re.search(r"Words: (.*)$", prompt)
+    words = re.findall(r'"([^"]+)"', m.group(1)) if m else []
+    return "\n".join(f"{w}: " + ", ".join(f"{w}-syn{i}" for i in range(1, rng.randint(2, 5))) for w in words)
+
+
+# Текстовые промпты без схемы: (признак в тексте промпта, генератор ответа)
+_TEXT_RESPONSES: list[tuple[str, Callable[[str, random.Random], str]]] = [
+    ("frequent English words for learners", _fake_word_list),
+    ("Translate the following text", _fake_translate),
+    ("short example sentences in English where this word is used", _fake_examples),
+    ("For each of these English words list up to", _fake_synonyms_batch),
+    ("English synonyms or near-synonyms for the word", _fake_synonyms),
+]
+
+
+def _respond(prompt: str, response_schema: type[BaseModel] | None) -> str:
+    rng = _rng("response", prompt)
+    builder = _SCHEMA_RESPONSES.get(response_schema) if response_schema is not None else None
+    if builder is not None:
+        return json.dumps(builder(prompt, rng), ensure_ascii=False)
+    for marker, text_builder in _TEXT_RESPONSES:
+        if marker in prompt:
+            return text_builder(prompt, rng)
+    if response_schema is not None:
+        logger.warning("fake LLM: нет заготовки для схемы %s", response_schema.__name__)
+        return "{}"
+    # Свободный ответ (вопрос по видео и т.п.)
+    return "Это ответ фейкового провайдера. " * rng.randint(2, 6)
+
+
+def generate_content(provider: str, prompt: str, response_schema: type[BaseModel] | None = None) -> str:
+    """Аналог openai_service.generate_content / _generate_content_gemini_only. Блокирует поток на время задержки."""
+    text = _respond(prompt, response_schema)
+    first_token, generation = _simulate_call(provider, estimate_tokens(text))
+    time.sleep(first_token + generation)
+    return text
+
+
+def stream_content(provider: str, prompt: str, response_schema: type[BaseModel] | None = None) -> Iterator[str]:
+    """Потоковый вариант: первый фрагмент после first_token, остальные равномерно за время генерации."""
+    text = _respond(prompt, response_schema)
+    first_token, generation = _simulate_call(provider, estimate_tokens(text))
+    chunk = max(1, settings.llm_fake_stream_chunk_chars)
+    pieces = [text[i : i + chunk] for i in range(0, len(text), chunk)]
+    time.sleep(first_token)
+    for piece in pieces:
+        yield piece
+        time.sleep(generation / len(pieces))
+
+
+def _unit_vector(text: str) -> list[float]:
+    rng = _rng("embedding", text)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_DIM)]
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def embed_content(text: str) -> list[float]:
+    """Детерминированный единичный вектор по тексту (одинаковый текст — одинаковый вектор)."""
+    time.sleep(settings.llm_fake_embedding_latency_ms / 1000.0)
+    return _unit_vector(text)
+
+
+def embed_contents(texts: list[str]) -> list[list[float]]:
+    """Батч-вариант: одна задержка на каждые 100 текстов, как у batchEmbedContents."""
+    time.sleep(settings.llm_fake_embedding_latency_ms / 1000.0 * math.ceil(len(texts) / 100))
+    return [_unit_vector(t) for t in texts]
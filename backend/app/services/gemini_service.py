@@ -3,11 +3,17 @@ import os
 import re
 import json
 import logging
-from typing import Any
+from functools import lru_cache
+from typing import Any, Callable, Iterator, TypeVar
 
 import google.generativeai as genai
 from google.api_core import exceptions as google_exceptions
+from pydantic import BaseModel, ValidationError
 from app.config import settings
+from app.schemas import llm as llm_schemas
+from app.services import fake_llm_service, llm_gateway, metrics
+
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
 
 genai.configure(api_key=os.environ.get("GEMINI_API_KEY") or settings.gemini_api_key)
 
@@ -69,7 +75,43 @@ def _model():
     return genai.GenerativeModel(model_name)
 
 
-def _generate_content_gemini_only(prompt: str) -> str:
+# Ключи JSON Schema, которые понимает Schema в Gemini API (остальное — title, default, $defs — отбрасываем)
+_GEMINI_SCHEMA_KEYS = ("type", "format", "description", "enum")
+
+
+def _to_gemini_schema(node: dict, defs: dict) -> dict:
+    if "$ref" in node:
+        return _to_gemini_schema(defs[node["$ref"].split("/")[-1]], defs)
+    if "anyOf" in node:
+        # Optional[X] в pydantic — anyOf [X, null]; Gemini выражает это через nullable
+        variants = [v for v in node["anyOf"] if v.get("type") != "null"]
+        out = _to_gemini_schema(variants[0], defs)
+        if len(variants) < len(node["anyOf"]):
+            out["nullable"] = True
+        return out
+    out = {k: node[k] for k in _GEMINI_SCHEMA_KEYS if k in node}
+    if "properties" in node:
+        out["properties"] = {name: _to_gemini_schema(v, defs) for name, v in node["properties"].items()}
+        # Поля со значением по умолчанию нужны только для разбора старых ответов; от модели требуем все
+        out["required"] = list(out["properties"])
+    if "items" in node:
+        out["items"] = _to_gemini_schema(node["items"], defs)
+    return out
+
+
+@lru_cache(maxsize=None)
+def _gemini_generation_config(response_schema: type[BaseModel] | None) -> dict | None:
+    """generation_config для structured output: JSON MIME-тип и схема ответа из pydantic-модели."""
+    if response_schema is None:
+        return None
+    schema = response_schema.model_json_schema()
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": _to_gemini_schema(schema, schema.get("$defs", {})),
+    }
+
+
+def _generate_content_gemini_only(prompt: str, response_schema: type[BaseModel] | None = None) -> str:
     """
     Только Gemini: перебор моделей при исчерпании квоты/ошибке. При неудаче по всем моделям — ValueError.
     """
@@ -80,7 +122,9 @@ def _generate_content_gemini_only(prompt: str) -> str:
         try:
             current_model_name = _get_current_model_name()
             logger.debug("Gemini попытка %s/%s: модель %s", attempt + 1, max_attempts, current_model_name)
-            response = _model().generate_content(prompt)
+            response = _model().generate_content(
+                prompt, generation_config=_gemini_generation_config(response_schema)
+            )
             text = (response.text or "").strip()
             logger.debug("Gemini успешно, модель %s", current_model_name)
             return text
@@ -111,38 +155,126 @@ def _generate_content_gemini_only(prompt: str) -> str:
     return ""
 
 
-def _generate_content_with_fallback(prompt: str) -> str:
+def _call_provider(provider: str, prompt: str, response_schema: type[BaseModel] | None = None) -> str:
+    """Вызов одного провайдера через LLM-шлюз: ожидание квоты, генерация, учёт токенов."""
+    with llm_gateway.gateway.admit(provider, prompt) as ticket:
+        if settings.llm_backend == "fake":
+            text = fake_llm_service.generate_content(provider, prompt, response_schema)
+        elif provider == "gpt":
+            from app.services import openai_service
+            text = openai_service.generate_content(prompt, response_schema)
+        else:
+            text = _generate_content_gemini_only(prompt, response_schema)
+        ticket.complete(text)
+        return text
+
+
+def _generate_content_with_fallback(prompt: str, response_schema: type[BaseModel] | None = None) -> str:
     """
     Единая точка генерации: приоритет из AI_PRIORITY (gpt | gemini).
     Если все модели приоритетного провайдера недоступны — переключение на второй провайдер (GPT ↔ Gemini).
+    response_schema — pydantic-модель ответа: оба провайдера генерируют JSON строго по её схеме.
+    Каждый вызов проходит через llm_gateway (лимиты на пользователя и провайдера); функция блокирующая —
+    из async-кода вызывать через llm_gateway.run_in_thread.
     """
     priority = (getattr(settings, "ai_priority", None) or "gemini").strip().lower()
     if priority == "gpt":
         try:
-            from app.services import openai_service
-            return openai_service.generate_content(prompt)
+            return _call_provider("gpt", prompt, response_schema)
         except ValueError as e1:
             logger.warning("OpenAI недоступен (%s), пробуем Gemini", e1)
+            first_error = e1
         try:
-            return _generate_content_gemini_only(prompt)
+            return _call_provider("gemini", prompt, response_schema)
         except ValueError as e2:
             raise ValueError(
-                f"Сначала все модели GPT недоступны ({e1}). Затем все модели Gemini тоже недоступны ({e2})."
+                f"Сначала все модели GPT недоступны ({first_error}). Затем все модели Gemini тоже недоступны ({e2})."
             ) from e2
     # priority == "gemini" или любое другое значение
     try:
-        return _generate_content_gemini_only(prompt)
+        return _call_provider("gemini", prompt, response_schema)
     except ValueError as e1:
         logger.warning("Gemini недоступен (%s), пробуем OpenAI", e1)
         try:
-            from app.services import openai_service
-            return openai_service.generate_content(prompt)
+            return _call_provider("gpt", prompt, response_schema)
         except ValueError as e2:
             raise ValueError(
                 f"Сначала все модели Gemini недоступны ({e1}). Затем все модели GPT тоже недоступны ({e2})."
             ) from e2
 
 
+def _stream_content_gemini_only(prompt: str, response_schema: type[BaseModel] | None = None) -> Iterator[str]:
+    """Потоковый вариант _generate_content_gemini_only: перебор моделей возможен только до первого фрагмента."""
+    models = _get_gemini_models()
+    for attempt in range(len(models)):
+        current_model_name = _get_current_model_name()
+        started = False
+        try:
+            logger.debug("Gemini stream попытка %s/%s: модель %s", attempt + 1, len(models), current_model_name)
+            config = _gemini_generation_config(response_schema)
+            for chunk in _model().generate_content(prompt, generation_config=config, stream=True):
+                try:
+                    piece = chunk.text
+                except ValueError:
+                    # Фрагмент без текстовых частей (например, только finish_reason)
+                    continue
+                if piece:
+                    started = True
+                    yield piece
+            return
+        except Exception as e:
+            if started:
+                raise ValueError(f"Поток Gemini прервался: {e}") from e
+            logger.warning("Gemini stream ошибка для %s: %s", current_model_name, e)
+            if attempt < len(models) - 1:
+                _switch_to_next_model()
+            else:
+                raise ValueError(f"Все модели Gemini недоступны: {e}") from e
+
+
+def _stream_provider(provider: str, prompt: str, response_schema: type[BaseModel] | None = None) -> Iterator[str]:
+    """Поток одного провайдера через LLM-шлюз; слот держится, пока поток не дочитан или не закрыт."""
+    with llm_gateway.gateway.admit(provider, prompt) as ticket:
+        parts: list[str] = []
+        try:
+            if settings.llm_backend == "fake":
+                source = fake_llm_service.stream_content(provider, prompt, response_schema)
+            elif provider == "gpt":
+                from app.services import openai_service
+                source = openai_service.stream_content(prompt, response_schema)
+            else:
+                source = _stream_content_gemini_only(prompt, response_schema)
+            for piece in source:
+                parts.append(piece)
+                yield piece
+        finally:
+            if parts:
+                ticket.complete("".join(parts))
+
+
+def _stream_content_with_fallback(prompt: str, response_schema: type[BaseModel] | None = None) -> Iterator[str]:
+    """
+    Потоковый вариант _generate_content_with_fallback: фрагменты ответа по мере генерации.
+    На второй провайдер переключаемся, только если первый не отдал ни одного фрагмента.
+    """
+    priority = (getattr(settings, "ai_priority", None) or "gemini").strip().lower()
+    order = ("gpt", "gemini") if priority == "gpt" else ("gemini", "gpt")
+    errors: list[str] = []
+    for provider in order:
+        started = False
+        try:
+            for piece in _stream_provider(provider, prompt, response_schema):
+                started = True
+                yield piece
+            return
+        except ValueError as e:
+            if started:
+                raise
+            logger.warning("%s недоступен для потока (%s), пробуем следующий провайдер", provider, e)
+            errors.append(f"{provider}: {e}")
+    raise ValueError("Все провайдеры недоступны. " + " ".join(errors))
+
+
 def generate_word_list(level: str | None = None, topic: str | None = None, count: int = 20) -> list[dict[str, str]]:
     """Generate list of words with translation, example, and IPA. Include variety: different parts of speech (noun, verb, adj, adv) and some synonym pairs."""
     if not level and not topic:
@@ -196,126 +328,103 @@ _ENRICH_CACHE_TTL = 300  # секунд
 _ENRICH_CACHE_MAX = 200
 
 
-def _extract_first_json_object(text: str) -> str | None:
-    """Извлечь первый полный JSON-объект {...} с учётом вложенных скобок."""
-    start = text.find("{")
-    if start < 0:
+def _extract_first_json(text: str) -> str | None:
+    """Извлечь первый полный JSON-объект {...} или массив [...] с учётом вложенных скобок."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
         return None
+    start = min(starts)
+    open_ch = text[start]
+    close_ch = "}" if open_ch == "{" else "]"
     depth = 0
     for i in range(start, len(text)):
-        if text[i] == "{":
+        if text[i] == open_ch:
             depth += 1
-        elif text[i] == "}":
+        elif text[i] == close_ch:
             depth -= 1
             if depth == 0:
                 return text[start : i + 1]
     return None
 
 
-def _parse_enrich_response(text: str, word: str) -> dict[str, Any]:
-    """Парсинг JSON-ответа enrich: transcription + senses (поддержка вложенных examples)."""
-    raw = _extract_first_json_object(text)
-    if not raw or "senses" not in raw:
-        return {"transcription": None, "senses": []}
+def _parse_structured(
+    raw: str,
+    schema: type[SchemaT],
+    path: str,
+    coerce: Callable[[Any], Any] | None = None,
+) -> SchemaT | None:
+    """
+    Разбор ответа модели по pydantic-схеме. Провайдер генерирует JSON по этой же схеме, поэтому обычно
+    срабатывает прямая валидация; прежний «ремонт» (```-обёртка, поиск скобок, висячие запятые) остался
+    страховкой. Исход разбора пишется в метрику llm_parse по ключу path. Пустой ответ (генерация
+    не удалась) — None без записи в метрику.
+    """
+    text = (raw or "").strip()
+    if not text:
+        return None
     try:
-        raw = re.sub(r",\s*([}\]])", r"\1", raw)
-        result = json.loads(raw)
-        transcription = (result.get("transcription") or "").strip().strip("[]") or None
-        senses = result.get("senses") or []
-        normalized = []
-        for s in senses:
-            if not isinstance(s, dict):
-                continue
-            pos = (s.get("part_of_speech") or "").strip().lower()
-            if pos not in ("noun", "verb", "adjective", "adverb"):
-                continue
-            trans = (s.get("translation") or "").strip()
-            if not trans and s.get("translations"):
-                trans = "; ".join(str(x).strip() for x in (s.get("translations") or []) if x)
-            ex_list = s.get("examples")
-            if isinstance(ex_list, list):
-                examples = [str(x).strip() for x in ex_list if x]
-            else:
-                one = (s.get("example") or "").strip()
-                examples = [one] if one else []
-            normalized.append({
-                "part_of_speech": pos,
-                "translation": trans,
-                "example": examples[0] if examples else "",
-                "examples": examples,
-            })
-        if not normalized:
-            trans = (result.get("translation") or "").strip()
-            ex = (result.get("example") or "").strip()
-            if trans or ex:
-                normalized = [{"part_of_speech": "noun", "translation": trans, "example": ex, "examples": [ex] if ex else []}]
-        return {"transcription": transcription, "senses": normalized}
-    except json.JSONDecodeError:
+        result = schema.model_validate_json(text)
+        metrics.record_parse(path, metrics.PARSE_OK)
+        return result
+    except ValidationError:
+        pass
+    try:
+        fragment = _extract_first_json(text)
+        if fragment is None:
+            raise ValueError("в ответе нет JSON")
+        data = json.loads(re.sub(r",\s*([}\]])", r"\1", fragment))
+        if coerce is not None:
+            data = coerce(data)
+        result = schema.model_validate(data)
+    except ValueError as e:  # json.JSONDecodeError и pydantic.ValidationError — подклассы ValueError
+        logger.warning("%s: ответ модели не соответствует схеме %s: %s", path, schema.__name__, e)
+        metrics.record_parse(path, metrics.PARSE_FAILED)
+        return None
+    metrics.record_parse(path, metrics.PARSE_REPAIRED)
+    return result
+
+
+def _enrich_data(result: llm_schemas.EnrichResult | None) -> dict[str, Any]:
+    """EnrichResult -> dict для API и кэша: только известные части речи, example — первый из examples."""
+    if result is None:
         return {"transcription": None, "senses": []}
+    normalized = []
+    for s in result.senses:
+        pos = s.part_of_speech.strip().lower()
+        if pos not in llm_schemas.PARTS_OF_SPEECH:
+            continue
+        examples = [x.strip() for x in s.examples if x and x.strip()]
+        normalized.append({
+            "part_of_speech": pos,
+            "translation": s.translation.strip(),
+            "example": examples[0] if examples else "",
+            "examples": examples,
+        })
+    transcription = (result.transcription or "").strip().strip("[]") or None
+    return {"transcription": transcription, "senses": normalized}
+
+
+def _parse_enrich_response(text: str, word: str) -> dict[str, Any]:
+    """Парсинг JSON-ответа enrich: transcription + senses (поддержка вложенных examples)."""
+    return _enrich_data(_parse_structured(text, llm_schemas.EnrichResult, "enrich"))
+
+
+def _as_enrich_batch(data: Any) -> Any:
+    # Ответ без structured output: голый массив или один объект для первого слова
+    if isinstance(data, list):
+        return {"items": data}
+    if isinstance(data, dict) and "items" not in data:
+        return {"items": [data]}
+    return data
 
 
 def _parse_enrich_batch_response(text: str, words: list[str]) -> list[dict[str, Any]]:
-    """Парсинг ответа батч enrich: массив объектов {transcription, senses} в том же порядке, что и words."""
-    result: list[dict[str, Any]] = []
-    # Ищем JSON-массив [...]
-    m = re.search(r"\[\s*\{", text)
-    if not m:
-        # Один объект — считаем ответом для одного слова
-        single = _parse_enrich_response(text, words[0] if words else "")
-        return [single] + [{"transcription": None, "senses": []} for _ in range(len(words) - 1)]
-    try:
-        start = text.index("[")
-        depth = 0
-        end = start
-        for i, c in enumerate(text[start:], start):
-            if c == "[":
-                depth += 1
-            elif c == "]":
-                depth -= 1
-                if depth == 0:
-                    end = i
-                    break
-        raw = text[start : end + 1]
-        raw = re.sub(r",\s*([}\]])", r"\1", raw)
-        arr = json.loads(raw)
-        for i, item in enumerate(arr):
-            if not isinstance(item, dict):
-                result.append({"transcription": None, "senses": []})
-                continue
-            senses = item.get("senses") or []
-            normalized = []
-            for s in senses:
-                if not isinstance(s, dict):
-                    continue
-                pos = (s.get("part_of_speech") or "").strip().lower()
-                if pos not in ("noun", "verb", "adjective", "adverb"):
-                    continue
-                trans = (s.get("translation") or "").strip()
-                if not trans and s.get("translations"):
-                    trans = "; ".join(str(x).strip() for x in (s.get("translations") or []) if x)
-                ex_list = s.get("examples")
-                if isinstance(ex_list, list):
-                    examples = [str(x).strip() for x in ex_list if x]
-                else:
-                    one = (s.get("example") or "").strip()
-                    examples = [one] if one else []
-                normalized.append({
-                    "part_of_speech": pos,
-                    "translation": trans,
-                    "example": examples[0] if examples else "",
-                    "examples": examples,
-                })
-            if not normalized and (item.get("translation") or item.get("example")):
-                trans = (item.get("translation") or "").strip()
-                ex = (item.get("example") or "").strip()
-                normalized = [{"part_of_speech": "noun", "translation": trans, "example": ex, "examples": [ex] if ex else []}]
-            transcription = (item.get("transcription") or "").strip().strip("[]") or None
-            result.append({"transcription": transcription, "senses": normalized})
-        while len(result) < len(words):
-            result.append({"transcription": None, "senses": []})
-        return result[: len(words)]
-    except (json.JSONDecodeError, ValueError):
-        return [_parse_enrich_response(text, w) if i == 0 else {"transcription": None, "senses": []} for i, w in enumerate(words)]
+    """Парсинг ответа батч enrich: {"items": [{transcription, senses}, ...]} в том же порядке, что и words."""
+    parsed = _parse_structured(text, llm_schemas.EnrichBatchResult, "enrich_batch", coerce=_as_enrich_batch)
+    result = [_enrich_data(item) for item in parsed.items] if parsed else []
+    while len(result) < len(words):
+        result.append({"transcription": None, "senses": []})
+    return result[: len(words)]
 
 
 BATCH_ENRICH_SIZE = 10
@@ -323,8 +432,23 @@ BATCH_ENRICH_SIZE = 10
 BATCH_GENERATE_ENRICH_SIZE = 20
 
 
-def enrich_words_with_pos_batch(words: list[str], max_batch_size: int | None = None) -> list[dict[str, Any]]:
-    """Обогатить до max_batch_size слов одним запросом: для каждого слово — transcription и senses. Порядок как у words."""
+# Версия промпта enrich_words_with_pos_batch: ключ в lexicon_entries, менять при правке промпта
+ENRICH_PROMPT_VERSION = "1"
+
+
+def enrich_prompt_key() -> str:
+    """Ключ версии для lexicon_entries: ответы фейкового провайдера хранятся отдельно от настоящих."""
+    return f"{ENRICH_PROMPT_VERSION}-fake" if settings.llm_backend == "fake" else ENRICH_PROMPT_VERSION
+
+
+def enrich_words_with_pos_batch(
+    words: list[str], max_batch_size: int | None = None, raise_errors: bool = False
+) -> list[dict[str, Any]]:
+    """
+    Обогатить до max_batch_size слов одним запросом: для каждого слово — transcription и senses. Порядок как у words.
+    Ошибка провайдера или разбора ответа — пустые senses у всех слов, а с raise_errors — исключение
+    (вызывающий отличает сбой от ответа модели без значений).
+    """
     cap = max_batch_size if max_batch_size is not None else BATCH_ENRICH_SIZE
     words = [(w or "").strip() for w in words if (w or "").strip()][:cap]
     if not words:
@@ -341,7 +465,7 @@ def enrich_words_with_pos_batch(words: list[str], max_batch_size: int | None = N
             if now - ts < _ENRICH_CACHE_TTL:
                 result[i] = data
                 continue
-            del _enrich_cache[key]
+            _enrich_cache.pop(key, None)
         to_fetch.append((i, w))
     if not to_fetch:
         return result
@@ -349,18 +473,23 @@ def enrich_words_with_pos_batch(words: list[str], max_batch_size: int | None = N
     word_list = ", ".join(f'"{w}"' for w in fetch_words)
     prompt = f'''For each English word return one JSON object with "transcription" (IPA) and "senses". Words: {word_list}.
 Each sense: {{"part_of_speech": "noun|verb|adjective|adverb", "translation": "3-8 Russian equivalents for this meaning, semicolon-separated (e.g. увеличение; повышение; рост)", "examples": ["Short EN sentence 1.", "Short EN sentence 2."]}}. Give 2-4 example sentences per sense. Only applicable POS.
-Output: a single JSON array of {len(fetch_words)} objects, same order as words. No other text.'''
+Output: a JSON object {{"items": [...]}} with {len(fetch_words)} objects, same order as words. No other text.'''
     try:
-        text = _generate_content_with_fallback(prompt)
+        text = _generate_content_with_fallback(prompt, llm_schemas.EnrichBatchResult)
         batch_results = _parse_enrich_batch_response(text, fetch_words)
         for (idx, w), data in zip(to_fetch, batch_results):
             result[idx] = data
+            if not data["senses"]:
+                # Неразобранный ответ не кэшируем, иначе слово 5 минут будет «пустым»
+                continue
             key = w.lower()
             if len(_enrich_cache) >= _ENRICH_CACHE_MAX:
-                for k in sorted(_enrich_cache.keys(), key=lambda x: _enrich_cache[x][1])[: _ENRICH_CACHE_MAX // 2]:
-                    del _enrich_cache[k]
+                for k, _ in sorted(list(_enrich_cache.items()), key=lambda kv: kv[1][1])[: _ENRICH_CACHE_MAX // 2]:
+                    _enrich_cache.pop(k, None)
             _enrich_cache[key] = (data, time.time())
     except Exception:
+        if raise_errors:
+            raise
         for idx, w in to_fetch:
             result[idx] = {"transcription": None, "senses": []}
     return result
@@ -378,17 +507,18 @@ def enrich_word_with_pos(word: str) -> dict[str, Any]:
         data, ts = _enrich_cache[key]
         if now - ts < _ENRICH_CACHE_TTL:
             return data
-        del _enrich_cache[key]
+        _enrich_cache.pop(key, None)
     if len(_enrich_cache) >= _ENRICH_CACHE_MAX:
         # Удалить самые старые
-        for k in sorted(_enrich_cache.keys(), key=lambda x: _enrich_cache[x][1])[: _ENRICH_CACHE_MAX // 2]:
-            del _enrich_cache[k]
+        for k, _ in sorted(list(_enrich_cache.items()), key=lambda kv: kv[1][1])[: _ENRICH_CACHE_MAX // 2]:
+            _enrich_cache.pop(k, None)
 
     prompt = f'''Word "{w}". Return JSON: {{"transcription": "[IPA]", "senses": [{{"part_of_speech": "noun|verb|adjective|adverb", "translation": "3-8 Russian equivalents for this meaning, semicolon-separated (e.g. увеличение; повышение; рост)", "examples": ["Short English sentence 1.", "Short English sentence 2."]}}]}}.
 For each part of speech give several common Russian translations (synonyms/equivalents) and 2-4 short example sentences in English showing typical usage. Only applicable POS. No other text.'''
-    text = _generate_content_with_fallback(prompt)
+    text = _generate_content_with_fallback(prompt, llm_schemas.EnrichResult)
     data = _parse_enrich_response(text, w)
-    _enrich_cache[key] = (data, now)
+    if data["senses"]:
+        _enrich_cache[key] = (data, now)
     return data
 
 
@@ -437,27 +567,14 @@ def get_pronunciation_url(word: str) -> str | None:
         return None
 
 
-def get_synonyms(word: str, limit: int = 10) -> list[str]:
-    """Return English synonyms (and near-synonyms) for the word. Lowercased, no duplicates. Uses shared model fallback."""
-    if not word.strip():
-        return []
-    prompt = f"""List up to {limit} English synonyms or near-synonyms for the word "{word.strip()}".
-Output only the words, one per line, nothing else. Use lowercase. Do not repeat the original word."""
-    try:
-        text = _generate_content_with_fallback(prompt)
-        seen = set()
-        result = []
-        for line in text.split("\n"):
-            w = line.strip().lower()
-            if w and w != word.strip().lower() and w not in seen:
-                seen.add(w)
-                result.append(w)
-        return result[:limit]
-    except Exception:
-        return []
+BATCH_SYNONYM_SIZE = 10
+# Версия промпта get_synonyms_batch для таблицы word_synonyms: поменяли промпт — поднимите версию
+SYNONYMS_PROMPT_VERSION = "1"
 
 
-BATCH_SYNONYM_SIZE = 10
+def synonyms_prompt_key() -> str:
+    """Ключ версии для word_synonyms: ответы фейкового провайдера хранятся отдельно от настоящих."""
+    return f"{SYNONYMS_PROMPT_VERSION}-fake" if settings.llm_backend == "fake" else SYNONYMS_PROMPT_VERSION
 
 
 def get_synonyms_batch(words: list[str], limit: int = 12) -> list[list[str]]:
@@ -496,28 +613,49 @@ Words: {word_list}"""
         return [[] for _ in words]
 
 
-def evaluate_ielts_writing(
+CONFIRM_SYNONYM_PAIRS_SIZE = 40
+
+
+def confirm_synonym_pairs(pairs: list[tuple[str, str]]) -> list[bool]:
+    """Для пар слов (до 40) одним запросом: синонимы ли они. Порядок как у pairs; при ошибке — все False."""
+    pairs = pairs[:CONFIRM_SYNONYM_PAIRS_SIZE]
+    if not pairs:
+        return []
+    pair_list = "\n".join(f'{i}. "{a}" — "{b}"' for i, (a, b) in enumerate(pairs, 1))
+    prompt = f"""For each numbered pair of English words decide whether they are synonyms or near-synonyms (interchangeable in most contexts with the same meaning). Words that are only related by topic are not synonyms.
+Return JSON: {{"items": [{{"pair": 1, "synonyms": true}}, ...]}} with one item per pair.
+Pairs:
+{pair_list}"""
+    try:
+        raw = _generate_content_with_fallback(prompt, llm_schemas.SynonymVerdicts)
+    except ValueError as e:
+        logger.warning("Проверка пар синонимов не удалась: %s", e)
+        return [False] * len(pairs)
+    parsed = _parse_structured(raw, llm_schemas.SynonymVerdicts, "synonym_pairs")
+    verdicts = {v.pair: v.synonyms for v in parsed.items} if parsed else {}
+    return [verdicts.get(i, False) for i in range(1, len(pairs) + 1)]
+
+
+def _empty_writing_result() -> dict:
+    return {
+        "evaluation": "",
+        "corrected_text": "",
+        "errors": [],
+        "recommendations": "Введите текст для проверки.",
+    }
+
+
+def _writing_prompt(
     text: str,
-    word_limit_min: int | None = None,
-    word_limit_max: int | None = None,
-    task_type: str | None = None,
-) -> dict:
-    """
-    Оценка текста для IELTS Writing: общая оценка, исправленный текст, список ошибок, рекомендации.
-    Возвращает dict: evaluation, corrected_text, errors (list of {type, original, correction, explanation}), recommendations.
-    """
-    if not text or not text.strip():
-        return {
-            "evaluation": "",
-            "corrected_text": "",
-            "errors": [],
-            "recommendations": "Введите текст для проверки.",
-        }
+    word_limit_min: int | None,
+    word_limit_max: int | None,
+    task_type: str | None,
+) -> str:
     limits = ""
     if word_limit_min is not None or word_limit_max is not None:
         limits = f" Target word count: min {word_limit_min or 0}, max {word_limit_max or 'none'}."
     task = f" Task type: {task_type}." if task_type else ""
-    prompt = f"""You are an IELTS Writing examiner. Analyze the following English text{task}.{limits}
+    return f"""You are an IELTS Writing examiner. Analyze the following English text{task}.{limits}
 
 TEXT:
 ---
@@ -537,33 +675,11 @@ Respond in JSON only with this exact structure (use Russian for evaluation, erro
 band_score: number from 0 to 9 in steps of 0.5 (IELTS Writing band). If there are no errors, return "errors": [].
 Output only valid JSON, no markdown or extra text."""
 
-    try:
-        raw = _generate_content_with_fallback(prompt)
-        # Убрать markdown-обёртку если есть
-        raw = raw.strip()
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[-1]
-        if raw.endswith("```"):
-            raw = raw.rsplit("```", 1)[0]
-        raw = raw.strip()
-        data = json.loads(raw)
-        band = data.get("band_score")
-        if band is not None:
-            try:
-                band = float(band)
-                if band < 0 or band > 9:
-                    band = None
-            except (TypeError, ValueError):
-                band = None
-        return {
-            "band_score": band,
-            "evaluation": data.get("evaluation", ""),
-            "corrected_text": data.get("corrected_text", ""),
-            "errors": data.get("errors") if isinstance(data.get("errors"), list) else [],
-            "recommendations": data.get("recommendations", ""),
-        }
-    except (json.JSONDecodeError, ValueError) as e:
-        logger.warning(f"evaluate_ielts_writing parse error: {e}")
+
+def _parse_writing_response(raw: str, text: str) -> dict:
+    """Разбор JSON-ответа проверки IELTS Writing; при ошибке — заглушка с исходным текстом."""
+    parsed = _parse_structured(raw, llm_schemas.WritingEvaluation, "writing")
+    if parsed is None:
         return {
             "band_score": None,
             "evaluation": "Не удалось разобрать ответ. Попробуйте ещё раз.",
@@ -571,13 +687,66 @@ Output only valid JSON, no markdown or extra text."""
             "errors": [],
             "recommendations": "",
         }
+    return parsed.model_dump()
+
+
+def evaluate_ielts_writing(
+    text: str,
+    word_limit_min: int | None = None,
+    word_limit_max: int | None = None,
+    task_type: str | None = None,
+) -> dict:
+    """
+    Оценка текста для IELTS Writing: общая оценка, исправленный текст, список ошибок, рекомендации.
+    Возвращает dict: evaluation, corrected_text, errors (list of {type, original, correction, explanation}), recommendations.
+    """
+    if not text or not text.strip():
+        return _empty_writing_result()
+    prompt = _writing_prompt(text, word_limit_min, word_limit_max, task_type)
+    try:
+        raw = _generate_content_with_fallback(prompt, llm_schemas.WritingEvaluation)
+    except ValueError as e:
+        logger.warning(f"evaluate_ielts_writing generation error: {e}")
+        raw = ""
+    return _parse_writing_response(raw, text)
+
+
+def stream_ielts_writing_evaluation(
+    text: str,
+    word_limit_min: int | None = None,
+    word_limit_max: int | None = None,
+    task_type: str | None = None,
+) -> Iterator[tuple[str, Any]]:
+    """
+    Потоковая версия evaluate_ielts_writing: ("delta", фрагмент ответа модели)..., в конце ("result", dict).
+    Недоступность провайдеров — ValueError (в отличие от evaluate_ielts_writing, который возвращает заглушку).
+    """
+    if not text or not text.strip():
+        yield "result", _empty_writing_result()
+        return
+    parts: list[str] = []
+    prompt = _writing_prompt(text, word_limit_min, word_limit_max, task_type)
+    for piece in _stream_content_with_fallback(prompt, llm_schemas.WritingEvaluation):
+        parts.append(piece)
+        yield "delta", piece
+    yield "result", _parse_writing_response("".join(parts), text)
+
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+def embedding_model_key() -> str:
+    """Модель эмбеддингов для ключа кэша: векторы фейкового провайдера не смешиваются с настоящими."""
+    return "fake" if settings.llm_backend == "fake" else EMBEDDING_MODEL
 
 
 def get_embedding(text: str) -> list[float] | None:
     """Get embedding vector for text (e.g. word or 'word: translation'). Returns 768-dim list or None."""
+    if settings.llm_backend == "fake":
+        return fake_llm_service.embed_content(text)
     try:
         result = genai.embed_content(
-            model="models/text-embedding-004",
+            model=EMBEDDING_MODEL,
             content=text,
             task_type="retrieval_document",
         )
@@ -587,17 +756,31 @@ def get_embedding(text: str) -> list[float] | None:
         pass
     return None
 
-def summarize_youtube_video(transcript: str, target_lang: str = "ru") -> dict:
+
+def get_embeddings_batch(texts: list[str]) -> list[list[float]] | None:
     """
-    Summarize a YouTube video transcript.
-    Returns a dict with 'translation' and 'summary'.
+    Эмбеддинги для списка текстов: SDK отправляет их порциями по 100 через batchEmbedContents
+    вместо запроса на каждый текст. Порядок как у texts; при ошибке провайдера — None.
     """
-    if not transcript or not transcript.strip():
-        return {"translation": "", "summary": ""}
-        
+    if not texts:
+        return []
+    if settings.llm_backend == "fake":
+        return fake_llm_service.embed_contents(texts)
+    try:
+        result = genai.embed_content(
+            model=EMBEDDING_MODEL,
+            content=texts,
+            task_type="retrieval_document",
+        )
+    except Exception as e:
+        logger.warning("Gemini embeddings batch (%s текстов) не удался: %s", len(texts), e)
+        return None
+    vectors = (result or {}).get("embedding") or []
+    return vectors if len(vectors) == len(texts) else None
+
+def _summary_prompt(transcript: str, target_lang: str) -> str:
     lang = "Russian" if target_lang.strip().lower() == "ru" else "English"
-    
-    prompt = f"""You are an expert at summarizing and translating content.
+    return f"""You are an expert at summarizing and translating content.
 Below is the transcript of a YouTube video.
 1. Translate the entire text into {lang} if it's not already.
 2. Provide a concise bulleted summary of the main points in {lang}.
@@ -613,26 +796,49 @@ TRANSCRIPT:
 {transcript.strip()}
 ---
 """
-    try:
-        raw = _generate_content_with_fallback(prompt)
-        # Parse output as JSON
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[-1]
-        if raw.endswith("```"):
-            raw = raw.rsplit("```", 1)[0]
-        raw = raw.strip()
-        data = json.loads(raw)
-        return {
-            "translation": data.get("translation", ""),
-            "summary": data.get("summary", "")
-        }
-    except Exception as e:
-        logger.error(f"Failed to summarize YouTube transcript: {e}")
+
+
+def _parse_summary_response(raw: str) -> dict:
+    parsed = _parse_structured(raw, llm_schemas.VideoSummary, "youtube_summary")
+    if parsed is None:
         # Return fallback values
         return {
             "translation": "Translation failed. See raw transcription.",
             "summary": "Summary generation failed."
         }
+    return parsed.model_dump()
+
+
+def summarize_youtube_video(transcript: str, target_lang: str = "ru") -> dict:
+    """
+    Summarize a YouTube video transcript.
+    Returns a dict with 'translation' and 'summary'.
+    """
+    if not transcript or not transcript.strip():
+        return {"translation": "", "summary": ""}
+    try:
+        raw = _generate_content_with_fallback(_summary_prompt(transcript, target_lang), llm_schemas.VideoSummary)
+    except Exception as e:
+        logger.error(f"Failed to summarize YouTube transcript: {e}")
+        raw = ""
+    return _parse_summary_response(raw)
+
+
+def stream_youtube_summary(transcript: str, target_lang: str = "ru") -> Iterator[tuple[str, Any]]:
+    """Потоковая версия summarize_youtube_video: ("delta", фрагмент)..., в конце ("result", dict)."""
+    if not transcript or not transcript.strip():
+        yield "result", {"translation": "", "summary": ""}
+        return
+    parts: list[str] = []
+    try:
+        for piece in _stream_content_with_fallback(_summary_prompt(transcript, target_lang), llm_schemas.VideoSummary):
+            parts.append(piece)
+            yield "delta", piece
+    except ValueError as e:
+        # Как и summarize_youtube_video, не роняем обработку видео: сохраняем транскрипцию с заглушкой
+        logger.error(f"Failed to summarize YouTube transcript: {e}")
+        parts = []
+    yield "result", _parse_summary_response("".join(parts))
 
 
 def generate_ielts_listening_questions(transcript: str) -> dict:
@@ -671,17 +877,12 @@ TRANSCRIPT:
 ---
 """
     try:
-        raw = _generate_content_with_fallback(prompt)
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[-1]
-        if raw.endswith("```"):
-            raw = raw.rsplit("```", 1)[0]
-        raw = raw.strip()
-        data = json.loads(raw)
-        return data
-    except Exception as e:
+        raw = _generate_content_with_fallback(prompt, llm_schemas.ListeningQuestions)
+    except ValueError as e:
         logger.error(f"Failed to generate IELTS questions: {e}")
         return {"questions": []}
+    parsed = _parse_structured(raw, llm_schemas.ListeningQuestions, "listening_questions")
+    return parsed.model_dump() if parsed else {"questions": []}
 
 def generate_ielts_exam_part(transcript: str, part_number: int) -> dict:
     """
@@ -723,14 +924,9 @@ TRANSCRIPT:
 ---
 """
     try:
-        raw = _generate_content_with_fallback(prompt)
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[-1]
-        if raw.endswith("```"):
-            raw = raw.rsplit("```", 1)[0]
-        raw = raw.strip()
-        data = json.loads(raw)
-        return {"questions": data.get("questions", [])}
-    except Exception as e:
+        raw = _generate_content_with_fallback(prompt, llm_schemas.ExamPartQuestions)
+    except ValueError as e:
         logger.error(f"Failed to generate IELTS exam part {part_number} questions: {e}")
         return {"questions": []}
+    parsed = _parse_structured(raw, llm_schemas.ExamPartQuestions, "exam_part")
+    return parsed.model_dump() if parsed else {"questions": []}
@@ -0,0 +1,161 @@
+"""Прогресс фоновых задач в реальном времени: pg_notify из воркера, LISTEN в процессе API, SSE клиенту.
+
+Воркер (другой процесс) шлёт pg_notify в транзакции порции — уведомление уходит только вместе
+с коммитом, т.е. клиент не узнает о карточках, которые ещё не видны в БД. Процесс API держит одно
+LISTEN-соединение на все подписки и раздаёт события по очередям подписчиков задачи.
+Если LISTEN недоступен или уведомление потерялось, GET /jobs/{id}/events перечитывает строку jobs
+раз в JOB_EVENTS_POLL_SECONDS.
+
+Тем же соединением процесс API слушает канал card_changes: задача, изменившая карточки пользователя,
+шлёт publish_cards_changed, и каждый процесс API сбрасывает его векторный индекс (vector_index) и будит
+батчер эмбеддингов. Соединение поднимается при старте (run_listener) и переподключается; пока его нет,
+индекс устаревает не дольше VECTOR_INDEX_TTL_SECONDS, а новые карточки подбирает проход батчера.
+
+Канал jobs будит исполнитель задач: enqueue шлёт publish_job_queued в транзакции постановки, а отдельный
+процесс воркера (python -m app.jobs) держит то же LISTEN-соединение и сразу проверяет очередь.
+Без LISTEN задача ждёт опроса очереди (JOBS_POLL_SECONDS).
+"""
+import asyncio
+import json
+import logging
+from uuid import UUID
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "job_events"
+CARDS_CHANNEL = "card_changes"
+JOBS_CHANNEL = "jobs"
+# Лимит payload NOTIFY — 8000 байт; id карточек уходят несколькими уведомлениями
+_CARD_IDS_PER_NOTIFY = 100
+
+_subscribers: dict[str, set[asyncio.Queue]] = {}
+_conn: asyncpg.Connection | None = None
+_lock: asyncio.Lock | None = None
+
+
+def event(job_id: UUID, status: str, processed: int, total: int | None, card_ids: list[str] | None = None,
+          error: str | None = None, stage: str | None = None) -> dict:
+    """stage — стадия задачи-конвейера (state["stage"]), у порционных задач None."""
+    return {
+        "job_id": str(job_id),
+        "status": status,
+        "stage": stage,
+        "processed": processed,
+        "total": total,
+        "card_ids": card_ids or [],
+        "error": error,
+    }
+
+
+async def publish(db: AsyncSession, data: dict) -> None:
+    """pg_notify в транзакции db: подписчики получат событие после её коммита."""
+    card_ids = data.get("card_ids") or []
+    chunks = [card_ids[i : i + _CARD_IDS_PER_NOTIFY] for i in range(0, len(card_ids), _CARD_IDS_PER_NOTIFY)] or [[]]
+    for chunk in chunks:
+        payload = json.dumps({**data, "card_ids": chunk}, default=str)
+        await db.execute(select(func.pg_notify(CHANNEL, payload)))
+
+
+async def publish_cards_changed(db: AsyncSession, user_id: UUID) -> None:
+    """pg_notify в транзакции db: после коммита процессы API сбросят индекс пользователя и разбудят батчер."""
+    await db.execute(select(func.pg_notify(CARDS_CHANNEL, str(user_id))))
+
+
+async def publish_job_queued(db: AsyncSession, job_type: str) -> None:
+    """pg_notify в транзакции db: после её коммита воркеры задач проверят очередь, не дожидаясь опроса."""
+    await db.execute(select(func.pg_notify(JOBS_CHANNEL, job_type)))
+
+
+def _dsn() -> str:
+    return settings.database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def _on_notify(connection, pid, channel, payload: str) -> None:
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return
+    for queue in _subscribers.get(data.get("job_id"), ()):
+        queue.put_nowait(data)
+
+
+def _on_cards_changed(connection, pid, channel, payload: str) -> None:
+    from app.services import embedding_service, vector_index
+
+    try:
+        user_id = UUID(payload)
+    except ValueError:
+        return
+    vector_index.invalidate(user_id)
+    embedding_service.notify()
+
+
+def _on_job_queued(connection, pid, channel, payload: str) -> None:
+    from app.jobs import runner
+
+    runner.notify()
+
+
+def _on_close(connection) -> None:
+    global _conn
+    if connection is _conn:
+        logger.warning("LISTEN %s: соединение закрыто, переподключимся при следующей подписке", CHANNEL)
+        _conn = None
+
+
+async def _ensure_listener() -> None:
+    global _conn, _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        if _conn is not None and not _conn.is_closed():
+            return
+        try:
+            conn = await asyncpg.connect(_dsn())
+            await conn.add_listener(CHANNEL, _on_notify)
+            await conn.add_listener(CARDS_CHANNEL, _on_cards_changed)
+            await conn.add_listener(JOBS_CHANNEL, _on_job_queued)
+            conn.add_termination_listener(_on_close)
+            _conn = conn
+        except Exception:
+            logger.warning("LISTEN %s недоступен, прогресс задач — опросом БД", CHANNEL, exc_info=True)
+
+
+async def run_listener() -> None:
+    """
+    Фоновый цикл процессов API и воркера: держать LISTEN поднятым (card_changes и jobs нужны
+    и без подписчиков SSE).
+    """
+    while True:
+        await _ensure_listener()
+        await asyncio.sleep(settings.job_events_poll_seconds)
+
+
+async def subscribe(job_id: UUID) -> asyncio.Queue:
+    """Очередь событий задачи; подписываться до чтения текущего состояния, чтобы не пропустить событие."""
+    queue: asyncio.Queue = asyncio.Queue()
+    _subscribers.setdefault(str(job_id), set()).add(queue)
+    await _ensure_listener()
+    return queue
+
+
+def unsubscribe(job_id: UUID, queue: asyncio.Queue) -> None:
+    queues = _subscribers.get(str(job_id))
+    if queues is None:
+        return
+    queues.discard(queue)
+    if not queues:
+        del _subscribers[str(job_id)]
+
+
+async def close() -> None:
+    global _conn
+    conn, _conn = _conn, None
+    if conn is not None and not conn.is_closed():
+        await conn.close()
@@ -0,0 +1,62 @@
+"""Общий словарь обогащений слов (lexicon_entries) для backfill-pos и backfill-transcriptions.
+
+Частые слова есть в колодах у многих пользователей; раньше backfill каждого платил за них заново
+(кэш enrich_words_with_pos_batch — в памяти процесса, 200 записей на 5 минут). Здесь все различные слова
+порции ищутся в таблице одним запросом, модель спрашивается только о недостающих, ответы сохраняются
+для всех следующих backfill. Слово без значений (модель не разобрала или ошиблась) не сохраняется —
+повтор для него регулирует card_enrich_attempts.
+"""
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.repositories import lexicon_repo
+from app.services import gemini_service, llm_gateway
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(word: str | None) -> str:
+    return (word or "").strip().lower()
+
+
+async def get_enrichment_for_words(db: AsyncSession, words: list[str]) -> dict[str, dict]:
+    """
+    Слово (lower) -> {transcription, senses}. Сохранённые — одним запросом, недостающие — у модели батчами
+    по BATCH_ENRICH_SIZE, до LEXICON_LLM_CONCURRENCY одновременно; новые ответы сохраняются (коммит здесь).
+    Слов, для которых модель не вернула значений, в ответе нет. Ошибка провайдера пробрасывается
+    (ответы уже завершившихся батчей не теряются: до проброса они сохраняются).
+    """
+    normalized = list(dict.fromkeys(w for w in map(normalize, words) if w))
+    if not normalized:
+        return {}
+    version = gemini_service.enrich_prompt_key()
+    found = await lexicon_repo.get_entries(db, normalized, version)
+    missing = [w for w in normalized if w not in found]
+    size = gemini_service.BATCH_ENRICH_SIZE
+    chunks = [missing[offset : offset + size] for offset in range(0, len(missing), size)]
+    fresh: dict[str, dict] = {}
+    semaphore = asyncio.Semaphore(max(1, settings.lexicon_llm_concurrency))
+
+    async def run(chunk: list[str]) -> None:
+        async with semaphore:
+            batch = await llm_gateway.run_in_thread(
+                gemini_service.enrich_words_with_pos_batch, chunk, max_batch_size=size, raise_errors=True
+            )
+        for word, data in zip(chunk, batch):
+            if data.get("senses"):
+                fresh[word] = data
+
+    # Сессия БД в батчах не используется: параллельны только вызовы модели, запись — после
+    results = await asyncio.gather(*(run(chunk) for chunk in chunks), return_exceptions=True)
+    if fresh:
+        await lexicon_repo.add_entries(db, version, fresh)
+        await db.commit()
+    for error in results:
+        if isinstance(error, BaseException):
+            raise error
+    found.update(fresh)
+    logger.debug("Лексикон: %s слов, из таблицы %s, у модели %s", len(normalized), len(normalized) - len(missing), len(missing))
+    return found
@@ -0,0 +1,399 @@
+"""LLM-шлюз: справедливое распределение квоты провайдеров между пользователями и учёт токенов.
+
+Каждый вызов модели проходит через admit(): токены списываются из корзины пользователя
+и из общей корзины провайдера (token bucket). Если токенов не хватает, вызов ждёт в очереди;
+очередь провайдера обслуживается по кругу между пользователями, поэтому один пользователь
+с генерацией на 200 слов не выбирает квоту за всех остальных.
+
+Очередь разделена на две полосы: интерактивные вызовы (запросы пользователя) всегда
+допускаются раньше фоновых (backfill, наполнение банка экзаменов), а фоновые занимают
+не больше LLM_BACKGROUND_MAX_SHARE от LLM_MAX_CONCURRENCY одновременных вызовов провайдера.
+
+Синхронные функции моделей вызываются из async-кода через run_in_thread, а не run_in_threadpool:
+ожидание в очереди шлюза блокирует поток, и общий пул anyio (40 потоков) заняли бы вызовы одного
+пользователя. У вызовов моделей свой пул (LLM_THREADPOOL_SIZE), и один пользователь занимает
+не больше LLM_USER_MAX_THREADS его потоков — остальные его вызовы ждут асинхронно, без потока.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator, TypeVar
+from uuid import UUID
+
+import anyio
+
+from app.config import settings
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+_LANES = (INTERACTIVE, BACKGROUND)
+# Как часто удалять полные корзины пользователей (см. LLMGateway._prune_user_buckets)
+_PRUNE_INTERVAL_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class CallContext:
+    """Кто и откуда вызывает модель: ключ для лимитов, учёта расхода и выбора полосы."""
+    user_id: UUID | None = None
+    endpoint: str = "unknown"
+    priority: str = INTERACTIVE
+
+
+_call_context: ContextVar[CallContext] = ContextVar("llm_call_context", default=CallContext())
+
+
+def set_call_context(user_id: UUID | None, endpoint: str) -> None:
+    """Привязать текущий запрос к пользователю и эндпоинту (вызывается из get_current_user)."""
+    _call_context.set(CallContext(user_id=user_id, endpoint=endpoint))
+
+
+@contextmanager
+def call_context(user_id: UUID | None, endpoint: str, priority: str = INTERACTIVE) -> Iterator[None]:
+    """Временный контекст для фоновых задач, которые работают вне HTTP-запроса."""
+    token = _call_context.set(CallContext(user_id=user_id, endpoint=endpoint, priority=priority))
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def get_call_context() -> CallContext:
+    return _call_context.get()
+
+
+class LLMQueueTimeout(Exception):
+    """
+    Очередь к модели не освободилась за LLM_QUEUE_TIMEOUT_SECONDS. Это не ошибка провайдера (не ValueError):
+    fallback на другой провайдер её не перехватывает, API отвечает 429.
+    """
+
+    def __init__(self, provider: str | None = None):
+        target = provider or "модели"
+        super().__init__(
+            f"Слишком много запросов к {target}: очередь не освободилась за "
+            f"{int(settings.llm_queue_timeout_seconds)} с. Попробуйте позже."
+        )
+
+
+def _user_key(ctx: CallContext) -> str:
+    return str(ctx.user_id) if ctx.user_id else "anonymous"
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (~4 символа на токен) без обращения к токенизатору провайдера."""
+    return max(1, len(text or "") // 4)
+
+
+class TokenBucket:
+    """Корзина токенов: пополняется со скоростью rate_per_minute, ёмкость — минутный запас."""
+
+    def __init__(self, rate_per_minute: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в корзине наберётся amount (после refill)."""
+        deficit = amount - self.tokens
+        return deficit / self.rate if deficit > 0 else 0.0
+
+
+class _Waiter:
+    __slots__ = ("user_key", "lane", "amount")
+
+    def __init__(self, user_key: str, lane: str, amount: float):
+        self.user_key = user_key
+        self.lane = lane
+        self.amount = amount
+
+
+class Ticket:
+    """Допуск к провайдеру. complete() фиксирует фактический расход; без него резерв возвращается."""
+
+    def __init__(self, provider: str, ctx: CallContext, lane: str, prompt: str, reserved: float):
+        self.provider = provider
+        self.ctx = ctx
+        self.lane = lane
+        self.prompt_tokens = estimate_tokens(prompt)
+        self.reserved = reserved
+        self.completion_tokens: int | None = None
+
+    def complete(self, text: str) -> None:
+        self.completion_tokens = estimate_tokens(text)
+
+
+class LLMGateway:
+    """Допуск вызовов к провайдерам: корзины пользователей и провайдеров, полосы приоритета, очередь по кругу."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._provider_buckets: dict[str, TokenBucket | None] = {}
+        self._user_buckets: dict[str, TokenBucket] = {}
+        # provider -> lane -> user_key -> очередь ожидающих; порядок ключей — порядок обхода по кругу
+        self._queues: dict[str, dict[str, OrderedDict[str, deque[_Waiter]]]] = {}
+        # provider -> lane -> число вызовов в работе
+        self._inflight: dict[str, dict[str, int]] = {}
+        self._pruned_at = time.monotonic()
+
+    def _provider_bucket(self, provider: str) -> TokenBucket | None:
+        if provider not in self._provider_buckets:
+            rate = settings.llm_gpt_tokens_per_minute if provider == "gpt" else settings.llm_gemini_tokens_per_minute
+            self._provider_buckets[provider] = TokenBucket(rate) if rate > 0 else None
+        return self._provider_buckets[provider]
+
+    def _user_bucket(self, user_key: str) -> TokenBucket | None:
+        rate = settings.llm_user_tokens_per_minute
+        if rate <= 0:
+            return None
+        bucket = self._user_buckets.get(user_key)
+        if bucket is None:
+            bucket = self._user_buckets[user_key] = TokenBucket(rate)
+        return bucket
+
+    def _prune_user_buckets(self, now: float) -> None:
+        """
+        Удалить корзины, пополнившиеся до ёмкости: такая корзина не отличается от новой, а без этого
+        словарь растёт с каждым пользователем, вызывавшим модель, пока живёт процесс.
+        """
+        if now - self._pruned_at < _PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = now
+        for user_key, bucket in list(self._user_buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._user_buckets[user_key]
+
+    @staticmethod
+    def _capped(bucket: TokenBucket | None, amount: float) -> float:
+        # Запрос больше ёмкости корзины иначе не прошёл бы никогда
+        return min(amount, bucket.capacity) if bucket else amount
+
+    @staticmethod
+    def _background_limit() -> int:
+        return max(1, int(settings.llm_max_concurrency * settings.llm_background_max_share))
+
+    def _lane_open(self, provider: str, lane: str) -> bool:
+        inflight = self._inflight[provider]
+        if sum(inflight.values()) >= settings.llm_max_concurrency:
+            return False
+        return lane == INTERACTIVE or inflight[BACKGROUND] < self._background_limit()
+
+    def _pick(self, provider: str, now: float) -> tuple[_Waiter | None, float]:
+        """
+        Следующий на допуск: сначала интерактивная полоса, затем фоновая; внутри полосы — первый
+        по кругу пользователь, чья корзина покрывает запрос. Возвращает (waiter, сколько ждать).
+        """
+        wait = 1.0
+        for lane in _LANES:
+            if not self._lane_open(provider, lane):
+                continue
+            for user_key, queue in self._queues[provider][lane].items():
+                head = queue[0]
+                bucket = self._user_bucket(user_key)
+                if bucket is None:
+                    return head, 0.0
+                bucket.refill(now)
+                need = bucket.wait_time(self._capped(bucket, head.amount))
+                if need <= 0:
+                    return head, 0.0
+                wait = min(wait, need)
+        return None, wait
+
+    def _try_grant(self, provider: str, waiter: _Waiter, now: float) -> float:
+        """Списать токены и занять слот, если очередь дошла до waiter. 0 — допущен, иначе пауза."""
+        candidate, wait = self._pick(provider, now)
+        if candidate is not waiter:
+            return max(wait, 0.01)
+        bucket = self._provider_bucket(provider)
+        if bucket is not None:
+            bucket.refill(now)
+            need = bucket.wait_time(self._capped(bucket, waiter.amount))
+            if need > 0:
+                return max(need, 0.01)
+            bucket.tokens -= self._capped(bucket, waiter.amount)
+        user_bucket = self._user_bucket(waiter.user_key)
+        if user_bucket is not None:
+            user_bucket.tokens -= self._capped(user_bucket, waiter.amount)
+        self._inflight[provider][waiter.lane] += 1
+        queues = self._queues[provider][waiter.lane]
+        queues[waiter.user_key].popleft()
+        # Обслуженный пользователь уходит в конец круга
+        if queues[waiter.user_key]:
+            queues.move_to_end(waiter.user_key)
+        else:
+            del queues[waiter.user_key]
+        return 0.0
+
+    def _remove(self, provider: str, waiter: _Waiter) -> None:
+        queues = self._queues[provider][waiter.lane]
+        queue = queues.get(waiter.user_key)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del queues[waiter.user_key]
+
+    def acquire(self, provider: str, prompt: str) -> Ticket:
+        """Дождаться своей очереди, слота и токенов. Блокирует поток; при превышении ожидания — LLMQueueTimeout."""
+        ctx = get_call_context()
+        lane = BACKGROUND if ctx.priority == BACKGROUND else INTERACTIVE
+        reserved = float(estimate_tokens(prompt) + settings.llm_output_token_reserve)
+        waiter = _Waiter(_user_key(ctx), lane, reserved)
+        deadline = time.monotonic() + settings.llm_queue_timeout_seconds
+        with self._cond:
+            if provider not in self._queues:
+                self._queues[provider] = {name: OrderedDict() for name in _LANES}
+                self._inflight[provider] = {name: 0 for name in _LANES}
+            self._queues[provider][lane].setdefault(waiter.user_key, deque()).append(waiter)
+            while True:
+                now = time.monotonic()
+                pause = self._try_grant(provider, waiter, now)
+                if pause == 0.0:
+                    self._cond.notify_all()
+                    break
+                if now >= deadline:
+                    self._remove(provider, waiter)
+                    self._cond.notify_all()
+                    raise LLMQueueTimeout(provider)
+                self._cond.wait(timeout=min(pause, 1.0, deadline - now))
+        return Ticket(provider, ctx, lane, prompt, reserved)
+
+    def release(self, ticket: Ticket) -> None:
+        """Освободить слот, скорректировать корзины на фактический расход (или вернуть резерв) и учесть usage."""
+        actual = 0 if ticket.completion_tokens is None else ticket.prompt_tokens + ticket.completion_tokens
+        with self._cond:
+            self._inflight[ticket.provider][ticket.lane] -= 1
+            user_key = _user_key(ticket.ctx)
+            for bucket in (self._provider_bucket(ticket.provider), self._user_bucket(user_key)):
+                if bucket is None:
+                    continue
+                # Перерасход уводит корзину в минус — следующий запрос этого пользователя подождёт дольше
+                refund = self._capped(bucket, ticket.reserved) - min(actual, bucket.capacity)
+                bucket.tokens = min(bucket.capacity, bucket.tokens + refund)
+            self._prune_user_buckets(time.monotonic())
+            self._cond.notify_all()
+        if ticket.completion_tokens is not None:
+            record_usage(ticket.ctx, ticket.provider, ticket.prompt_tokens, ticket.completion_tokens)
+
+    @contextmanager
+    def admit(self, provider: str, prompt: str) -> Iterator[Ticket]:
+        ticket = self.acquire(provider, prompt)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+
+gateway = LLMGateway()
+
+
+# --- Потоки для синхронных вызовов моделей ---
+
+_threads_total: asyncio.Semaphore | None = None
+_thread_limiter: anyio.CapacityLimiter | None = None
+# user_key -> [семафор потоков пользователя, сколько вызовов его держат или ждут]
+_user_threads: dict[str, list] = {}
+
+
+async def run_in_thread(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Вызвать блокирующую функцию модели в пуле потоков LLM. Поток берётся, только когда у пользователя
+    меньше LLM_USER_MAX_THREADS вызовов в работе и в пуле есть место; до тех пор ожидание асинхронное.
+    Не дождался за LLM_QUEUE_TIMEOUT_SECONDS — LLMQueueTimeout.
+    """
+    global _threads_total, _thread_limiter
+    size = max(1, settings.llm_threadpool_size)
+    if _threads_total is None:
+        _threads_total = asyncio.Semaphore(size)
+        # Места в пуле уже отмерены семафором: лимитер anyio не ждёт, он лишь отделяет эти потоки от общего пула
+        _thread_limiter = anyio.CapacityLimiter(size)
+    key = _user_key(get_call_context())
+    entry = _user_threads.setdefault(key, [asyncio.Semaphore(max(1, settings.llm_user_max_threads)), 0])
+    entry[1] += 1
+    try:
+        user_slot: asyncio.Semaphore = entry[0]
+        try:
+            with anyio.fail_after(settings.llm_queue_timeout_seconds):
+                await user_slot.acquire()
+                try:
+                    await _threads_total.acquire()
+                except BaseException:
+                    user_slot.release()
+                    raise
+        except TimeoutError:
+            raise LLMQueueTimeout() from None
+        try:
+            return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=_thread_limiter)
+        finally:
+            _threads_total.release()
+            user_slot.release()
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _user_threads[key]
+
+
+# --- Учёт расхода токенов: буфер в памяти, периодический сброс в таблицу llm_usage ---
+
+_usage_buffer: list[dict] = []
+_usage_lock = threading.Lock()
+
+
+def record_usage(ctx: CallContext, provider: str, prompt_tokens: int, completion_tokens: int) -> None:
+    with _usage_lock:
+        _usage_buffer.append({
+            "user_id": ctx.user_id,
+            "endpoint": ctx.endpoint[:255],
+            "provider": provider,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "created_at": datetime.now(timezone.utc),
+        })
+
+
+def _drain_usage() -> list[dict]:
+    global _usage_buffer
+    with _usage_lock:
+        rows, _usage_buffer = _usage_buffer, []
+    return rows
+
+
+async def flush_usage() -> int:
+    """Записать накопленный расход в БД одним INSERT. Возвращает число записей."""
+    rows = _drain_usage()
+    if not rows:
+        return 0
+    from app.db.session import async_session_maker
+    from app.db.repositories import usage_repo
+    try:
+        async with async_session_maker() as db:
+            await usage_repo.add_usage_records(db, rows)
+            await db.commit()
+    except Exception:
+        logger.exception("Не удалось записать llm_usage (%s записей), вернём в буфер", len(rows))
+        with _usage_lock:
+            _usage_buffer[:0] = rows
+        return 0
+    return len(rows)
+
+
+async def run_usage_flusher() -> None:
+    """Фоновый цикл сброса usage; запускается при старте приложения."""
+    while True:
+        await asyncio.sleep(settings.llm_usage_flush_seconds)
+        await flush_usage()
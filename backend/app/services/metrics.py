@@ -0,0 +1,37 @@
+"""Счётчики процесса (в памяти): исходы разбора ответов LLM и т.п. Отдаются через GET /metrics."""
+import threading
+from collections import defaultdict
+
+# Исходы разбора ответа модели по схеме
+PARSE_OK = "ok"  # ответ сразу прошёл валидацию схемы
+PARSE_REPAIRED = "repaired"  # понадобился «ремонт»: ```-обёртка, лишний текст, висячие запятые
+PARSE_FAILED = "failed"  # ответ не разобран, вызов потрачен впустую
+
+_lock = threading.Lock()
+_parse_counts: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+
+def record_parse(path: str, outcome: str) -> None:
+    with _lock:
+        _parse_counts[path][outcome] += 1
+
+
+def parse_stats() -> dict[str, dict]:
+    """По каждому пути разбора: счётчики исходов и доля неудач (failure_rate)."""
+    with _lock:
+        counts = {path: dict(outcomes) for path, outcomes in _parse_counts.items()}
+    stats = {}
+    for path, outcomes in sorted(counts.items()):
+        total = sum(outcomes.values())
+        stats[path] = {
+            PARSE_OK: outcomes.get(PARSE_OK, 0),
+            PARSE_REPAIRED: outcomes.get(PARSE_REPAIRED, 0),
+            PARSE_FAILED: outcomes.get(PARSE_FAILED, 0),
+            "total": total,
+            "failure_rate": round(outcomes.get(PARSE_FAILED, 0) / total, 4) if total else 0.0,
+        }
+    return stats
+
+
+def snapshot() -> dict:
+    return {"llm_parse": parse_stats()}
@@ -0,0 +1,53 @@
+"""Почти-дубликаты новых карточек: ближайшие по эмбеддингу карточки той же колоды.
+
+exists_card_in_deck_with_pos ловит только точное совпадение слова; здесь вектор нового слова
+(тот же текст "word: translation", что у эмбеддинга карточки, — из кэша или одним batch-запросом)
+сравнивается с NEAR_DUPLICATE_NEIGHBOURS ближайшими карточками колоды — через in-memory индекс
+пользователя, если он включён, иначе через HNSW в Postgres. Совпадения выше
+NEAR_DUPLICATE_SIMILARITY возвращаются клиенту, чтобы он мог пропустить слово до обогащения в LLM.
+Карточки с тем же словом не считаются почти-дубликатами (другая часть речи — отдельная карточка) и
+исключаются прямо в поиске, чтобы не занимать места среди NEAR_DUPLICATE_NEIGHBOURS соседей.
+"""
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.repositories import card_repo
+from app.services import embedding_service, vector_index
+
+
+async def find_near_duplicates(
+    db: AsyncSession,
+    user_id: UUID,
+    deck_id: UUID,
+    items: list[tuple[str, str | None]],
+) -> tuple[list[list[dict]], list[list[float] | None]]:
+    """
+    Для каждого (word, translation) — список совпадений {card_id, word, translation, similarity}
+    и вектор нового слова (None — провайдер эмбеддингов недоступен, проверка пропущена).
+    Новые векторы остаются в embedding_cache (коммит здесь).
+    """
+    if not items:
+        return [], []
+    vectors = await embedding_service.get_embeddings(db, [embedding_service.card_text(w, t) for w, t in items])
+    await db.commit()
+    index = await vector_index.get_index(db, user_id)
+    limit = settings.near_duplicate_neighbours
+    results: list[list[dict]] = []
+    for (word, _), vec in zip(items, vectors):
+        if vec is None:
+            results.append([])
+            continue
+        if index is not None:
+            rows = index.top_k(vec, limit, deck_id=deck_id, exclude_word=word)
+        else:
+            rows = await card_repo.find_similar_cards(
+                db, user_id, vec, limit=limit, deck_id=deck_id, exclude_word=word
+            )
+        results.append([
+            {"card_id": str(card_id), "word": w, "translation": t, "similarity": round(1.0 - distance, 4)}
+            for card_id, w, t, _, distance in rows
+            if 1.0 - distance >= settings.near_duplicate_similarity
+        ])
+    return results, vectors
@@ -1,6 +1,9 @@
 """OpenAI API: генерация текста с переключением между моделями при ошибках."""
 import logging
-from openai import OpenAI
+from typing import Iterator
+
+from openai import BadRequestError, OpenAI
+from pydantic import BaseModel
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -48,9 +51,41 @@ def _switch_to_next_openai_model() -> str:
     return new_model
 
 
-def generate_content(prompt: str) -> str:
+def _response_format(response_schema: type[BaseModel] | None) -> dict | None:
+    """Structured output: ответ ограничен JSON Schema pydantic-модели."""
+    if response_schema is None:
+        return None
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_schema.__name__,
+            "schema": response_schema.model_json_schema(),
+            "strict": False,
+        },
+    }
+
+
+def _create_completion(client: OpenAI, model_name: str, prompt: str, response_schema: type[BaseModel] | None, **kwargs):
+    messages = [{"role": "user", "content": prompt}]
+    response_format = _response_format(response_schema)
+    if response_format is None:
+        return client.chat.completions.create(model=model_name, messages=messages, **kwargs)
+    try:
+        return client.chat.completions.create(
+            model=model_name, messages=messages, response_format=response_format, **kwargs
+        )
+    except BadRequestError as e:
+        # Старые модели не знают json_schema — остаётся JSON mode (валидный JSON без гарантии схемы)
+        logger.warning("OpenAI %s без json_schema (%s), используем json_object", model_name, e)
+        return client.chat.completions.create(
+            model=model_name, messages=messages, response_format={"type": "json_object"}, **kwargs
+        )
+
+
+def generate_content(prompt: str, response_schema: type[BaseModel] | None = None) -> str:
     """
     Генерация ответа через OpenAI. Перебор моделей из OPENAI_MODELS при ошибке/квоте.
+    response_schema — pydantic-модель ответа: включает structured output (JSON по схеме).
     При недоступности всех моделей выбрасывает ValueError.
     """
     client = _get_client()
@@ -64,10 +99,7 @@ def generate_content(prompt: str) -> str:
         model_name = models[idx]
         try:
             logger.debug("OpenAI попытка %s/%s: модель %s", attempt + 1, len(models), model_name)
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-            )
+            response = _create_completion(client, model_name, prompt, response_schema)
             text = (response.choices[0].message.content or "").strip()
             if text:
                 logger.debug("OpenAI успешно, модель %s", model_name)
@@ -84,3 +116,35 @@ def generate_content(prompt: str) -> str:
     if last_error:
         raise ValueError(f"OpenAI: {last_error}") from last_error
     return ""
+
+
+def stream_content(prompt: str, response_schema: type[BaseModel] | None = None) -> Iterator[str]:
+    """
+    Потоковая генерация через OpenAI: фрагменты текста по мере поступления.
+    Переключение модели возможно только до первого фрагмента; при недоступности всех моделей — ValueError.
+    """
+    client = _get_client()
+    if client is None:
+        raise ValueError("OPENAI_API_KEY не задан. Укажите ключ в .env или переменной окружения.")
+
+    models = _get_openai_models()
+    for attempt in range(len(models)):
+        model_name = models[_get_current_openai_index()]
+        started = False
+        try:
+            logger.debug("OpenAI stream попытка %s/%s: модель %s", attempt + 1, len(models), model_name)
+            stream = _create_completion(client, model_name, prompt, response_schema, stream=True)
+            for chunk in stream:
+                piece = chunk.choices[0].delta.content if chunk.choices else None
+                if piece:
+                    started = True
+                    yield piece
+            return
+        except Exception as e:
+            if started:
+                raise ValueError(f"Поток OpenAI прервался: {e}") from e
+            logger.warning("OpenAI stream ошибка для %s: %s", model_name, e)
+            if attempt < len(models) - 1:
+                _switch_to_next_openai_model()
+            else:
+                raise ValueError(f"Все модели OpenAI недоступны. Последняя ошибка: {e}") from e
@@ -0,0 +1,342 @@
+"""Группы синонимов колоды по эмбеддингам карточек (SYNONYM_GROUPS_MODE=embedding).
+
+Вместо запроса синонимов у модели для каждого слова (колода в 3000 карточек — 300 промптов)
+близость всех пар считается блоками матрицы нормированных векторов:
+  - близость >= SYNONYM_AUTO_SIMILARITY — пара сразу считается синонимами;
+  - от SYNONYM_BORDERLINE_SIMILARITY до auto — пара проверяется моделью, пачками по 40 в промпте;
+  - ниже — не синонимы.
+Принятые пары объединяются в группы (компоненты связности) союзом множеств на массивах numpy.
+
+get_synonyms_for_words — синонимы слов через общую таблицу word_synonyms (по всем пользователям):
+модель спрашивается только о словах, которых ещё нет в таблице для текущей версии промпта.
+
+update_groups_for_cards — инкрементальный вариант для новых и изменённых карточек (SYNONYM_GROUPS_INCREMENTAL):
+ищутся только связи этих карточек (соседи по эмбеддингу или синонимы слова у модели, по SYNONYM_GROUPS_MODE),
+найденные группы сливаются в БД. Работает только в колодах, где группы уже применялись.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Callable
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.repositories import card_repo, synonym_repo
+from app.services import embedding_service, gemini_service, llm_gateway
+
+logger = logging.getLogger(__name__)
+
+_BLOCK_ROWS = 1024
+
+
+def _normalized_matrix(vectors: list) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms)
+
+
+def similar_pairs(matrix: np.ndarray, min_similarity: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Пары (i, j), i < j, с косинусной близостью >= min_similarity: массивы i, j, similarity."""
+    rows, cols, sims = [], [], []
+    n = len(matrix)
+    for start in range(0, n, _BLOCK_ROWS):
+        block = matrix[start : start + _BLOCK_ROWS] @ matrix.T
+        i, j = np.nonzero(block >= min_similarity)
+        i += start
+        upper = j > i
+        rows.append(i[upper])
+        cols.append(j[upper])
+        sims.append(block[i[upper] - start, j[upper]])
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+
+
+def components(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """
+    Метка компоненты связности для каждой из n вершин по рёбрам (i, j): минимальный индекс
+    в компоненте. Союз множеств векторно: «подвешиваем» корни к меньшему соседу и сжимаем пути,
+    пока метки меняются.
+    """
+    labels = np.arange(n)
+    if len(i) == 0:
+        return labels
+    while True:
+        previous = labels.copy()
+        li, lj = labels[i], labels[j]
+        np.minimum.at(labels, li, lj)
+        np.minimum.at(labels, lj, li)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+async def _card_vectors(db: AsyncSession, cards: list) -> list:
+    """Векторы карточек; недостающие берутся из кэша эмбеддингов / провайдера и сохраняются в карточки."""
+    missing = [c for c in cards if c.embedding is None]
+    fresh: dict = {}
+    if missing:
+        vectors = await embedding_service.get_embeddings(
+            db, [embedding_service.card_text(c.word or "", c.translation or "") for c in missing]
+        )
+        fresh = {c.id: vec for c, vec in zip(missing, vectors) if vec is not None}
+        await card_repo.set_card_embeddings(db, fresh)
+        await db.commit()
+    return [c.embedding if c.embedding is not None else fresh.get(c.id) for c in cards]
+
+
+async def _confirm_pairs(pairs: list[tuple[str, str]]) -> list[bool]:
+    size = gemini_service.CONFIRM_SYNONYM_PAIRS_SIZE
+    chunks = [pairs[k : k + size] for k in range(0, len(pairs), size)]
+    results = await asyncio.gather(
+        *(llm_gateway.run_in_thread(gemini_service.confirm_synonym_pairs, chunk) for chunk in chunks)
+    )
+    return [verdict for chunk in results for verdict in chunk]
+
+
+async def suggest_groups_by_embedding(db: AsyncSession, cards: list) -> list[tuple[list[str], list[str]]]:
+    """Группы (card_ids, words) того же вида, что у build_synonym_groups."""
+    vectors = await _card_vectors(db, cards)
+    indexed = [(c, v) for c, v in zip(cards, vectors) if v is not None and (c.word or "").strip()]
+    if len(indexed) < 2:
+        return []
+    matrix = _normalized_matrix([v for _, v in indexed])
+    i, j, sims = similar_pairs(matrix, settings.synonym_borderline_similarity)
+    auto = sims >= settings.synonym_auto_similarity
+    borderline = np.flatnonzero(~auto)
+    # Самые близкие пограничные пары — в первую очередь, остальное за лимитом отбрасывается
+    borderline = borderline[np.argsort(-sims[borderline], kind="stable")][: settings.synonym_confirm_max_pairs]
+    accepted = auto.copy()
+    if len(borderline):
+        words = [(c.word or "").strip() for c, _ in indexed]
+        verdicts = await _confirm_pairs([(words[i[k]], words[j[k]]) for k in borderline])
+        accepted[borderline[np.asarray(verdicts, dtype=bool)]] = True
+    logger.info(
+        "Синонимы по эмбеддингам: %s карточек, %s пар сразу, %s пограничных на проверку, принято %s",
+        len(indexed), int(auto.sum()), len(borderline), int(accepted.sum()),
+    )
+    return _groups([c for c, _ in indexed], components(len(indexed), i[accepted], j[accepted]))
+
+
+def build_synonym_groups(cards: list, synonym_map: dict[str, set[str]]) -> list[tuple[list[str], list[str]]]:
+    """
+    Build groups: list of (card_ids, words). synonym_map: card_id -> set of synonym words (lower).
+    Рёбра «карточка — карточка со словом-синонимом» сводятся в группы тем же components, что и в режиме
+    embedding; порядок групп и карточек в группе — как в cards.
+    """
+    word_to_index: dict[str, int] = {}
+    for idx, c in enumerate(cards):
+        w = (c.word or "").strip().lower()
+        if w:
+            word_to_index[w] = idx
+    edges = [
+        (idx, other)
+        for idx, c in enumerate(cards)
+        for w in synonym_map.get(str(c.id), ())
+        if (other := word_to_index.get(w)) is not None and other != idx
+    ]
+    i, j = np.asarray(edges, dtype=np.int64).reshape(-1, 2).T
+    return _groups(cards, components(len(cards), i, j))
+
+
+def _groups(cards: list, labels: np.ndarray) -> list[tuple[list[str], list[str]]]:
+    """(card_ids, words) по меткам компонент; одиночные карточки — не группа."""
+    members: dict[int, list[int]] = {}
+    for idx, label in enumerate(labels.tolist()):
+        members.setdefault(label, []).append(idx)
+    return [
+        ([str(cards[k].id) for k in group], [cards[k].word for k in group])
+        for group in members.values()
+        if len(group) >= 2
+    ]
+
+
+# --- Синонимы слов: общая таблица word_synonyms ---
+
+SYNONYMS_LIMIT = 12  # столько синонимов просим у модели и храним на слово
+
+
+# progress(found, done_batches, total_batches): found — уже известные синонимы (слово -> список)
+SynonymProgress = Callable[[dict[str, list[str]], int, int], None]
+
+
+async def get_synonyms_for_words(
+    db: AsyncSession,
+    words: list[str],
+    progress: SynonymProgress | None = None,
+) -> dict[str, list[str]]:
+    """
+    Слово (lower) -> синонимы (lower). Одним запросом читает сохранённые, недостающие слова — у модели
+    батчами по BATCH_SYNONYM_SIZE, до SYNONYM_SUGGEST_CONCURRENCY батчей одновременно; ответы сохраняются
+    (коммит здесь). Батч, в котором модель не вернула ничего ни для одного слова, считается сбоем и не сохраняется.
+    """
+    normalized = list(dict.fromkeys(w.strip().lower() for w in words if (w or "").strip()))
+    if not normalized:
+        return {}
+    version = gemini_service.synonyms_prompt_key()
+    found = await synonym_repo.get_synonyms(db, normalized, version)
+    missing = [w for w in normalized if w not in found]
+    size = gemini_service.BATCH_SYNONYM_SIZE
+    chunks = [missing[offset : offset + size] for offset in range(0, len(missing), size)]
+    fresh: dict[str, list[str]] = {}
+    done = 0
+    if progress is not None:
+        progress(found, done, len(chunks))
+    semaphore = asyncio.Semaphore(max(1, settings.synonym_suggest_concurrency))
+
+    async def run(chunk: list[str]) -> None:
+        nonlocal done
+        async with semaphore:
+            batch = await llm_gateway.run_in_thread(gemini_service.get_synonyms_batch, chunk, limit=SYNONYMS_LIMIT)
+        if any(batch):
+            fresh.update(zip(chunk, batch))
+        found.update(zip(chunk, batch))
+        done += 1
+        if progress is not None:
+            progress(found, done, len(chunks))
+
+    # Сессия БД в батчах не используется: параллельны только вызовы модели, запись — после
+    await asyncio.gather(*(run(chunk) for chunk in chunks))
+    if fresh:
+        await synonym_repo.add_synonyms(db, version, fresh)
+        await db.commit()
+    logger.debug("Синонимы: %s слов, из таблицы %s, у модели %s", len(normalized), len(normalized) - len(missing), len(missing))
+    return found
+
+
+# --- Подбор групп колоды (синхронный эндпоинт и фоновые задачи) с сохранением результата ---
+
+SUGGEST_MODES = ("llm", "embedding")
+# progress(cards, found, done_batches, total_batches) — для частичных групп во время подбора
+SuggestProgress = Callable[[list, dict[str, list[str]], int, int], None]
+
+
+async def deck_fingerprint(db: AsyncSession, deck_id: UUID, mode: str) -> str:
+    """Отпечаток состава колоды и параметров подбора: сохранённый результат годен, пока он не изменился."""
+    cards_hash = await card_repo.get_deck_fingerprint(db, deck_id)
+    if mode == "embedding":
+        params = (
+            f"{gemini_service.embedding_model_key()}:{settings.synonym_auto_similarity}:"
+            f"{settings.synonym_borderline_similarity}:{settings.synonym_confirm_max_pairs}"
+        )
+    else:
+        params = gemini_service.synonyms_prompt_key()
+    return hashlib.sha256(f"{cards_hash}|{mode}|{params}".encode("utf-8")).hexdigest()
+
+
+async def suggest_groups(
+    db: AsyncSession,
+    deck_id: UUID,
+    mode: str,
+    fingerprint: str | None = None,
+    progress: SuggestProgress | None = None,
+) -> list[tuple[list[str], list[str]]]:
+    """
+    Группы (card_ids, words) для колоды. Сохранённый результат с тем же отпечатком колоды возвращается
+    без вызовов модели; новый результат сохраняется (коммит здесь).
+    """
+    if fingerprint is None:
+        fingerprint = await deck_fingerprint(db, deck_id, mode)
+    stored = await synonym_repo.get_group_suggestion(db, deck_id, mode, fingerprint)
+    if stored is not None:
+        return stored
+    cards = await card_repo.get_cards_by_deck(db, deck_id)
+    if mode == "embedding":
+        if progress is not None:
+            progress(cards, {}, 0, 1)
+        groups = await suggest_groups_by_embedding(db, cards)
+        if progress is not None:
+            progress(cards, {}, 1, 1)
+    else:
+        found = await get_synonyms_for_words(
+            db,
+            [c.word or "" for c in cards],
+            progress=(lambda f, done, total: progress(cards, f, done, total)) if progress is not None else None,
+        )
+        groups = build_synonym_groups(cards, synonym_map(cards, found))
+    await synonym_repo.save_group_suggestion(db, deck_id, mode, fingerprint, groups)
+    await db.commit()
+    return groups
+
+
+def synonym_map(cards: list, found: dict[str, list[str]]) -> dict[str, set[str]]:
+    """card_id -> синонимы слова карточки — вход build_synonym_groups."""
+    return {str(c.id): set(found.get((c.word or "").strip().lower(), [])) for c in cards}
+
+
+# --- Инкрементальное обновление групп ---
+
+async def _related_by_embedding(db: AsyncSession, user_id: UUID, deck_id: UUID, cards: list) -> dict[UUID, list[UUID]]:
+    vectors = await _card_vectors(db, cards)
+    related: dict[UUID, list[UUID]] = {}
+    borderline: list[tuple[UUID, UUID, str, str]] = []
+    for card, vec in zip(cards, vectors):
+        if vec is None:
+            continue
+        rows = await card_repo.find_similar_cards(
+            db, user_id, vec, limit=settings.synonym_incremental_neighbours + 1, deck_id=deck_id
+        )
+        for card_id, word, _, _, distance in rows:
+            similarity = 1.0 - distance
+            if card_id == card.id or similarity < settings.synonym_borderline_similarity:
+                continue
+            if similarity >= settings.synonym_auto_similarity:
+                related.setdefault(card.id, []).append(card_id)
+            else:
+                borderline.append((card.id, card_id, (card.word or "").strip(), (word or "").strip()))
+    borderline = borderline[: settings.synonym_confirm_max_pairs]
+    if borderline:
+        verdicts = await _confirm_pairs([(a, b) for _, _, a, b in borderline])
+        for (card_id, other_id, _, _), ok in zip(borderline, verdicts):
+            if ok:
+                related.setdefault(card_id, []).append(other_id)
+    return related
+
+
+async def _related_by_llm(db: AsyncSession, deck_id: UUID, cards: list) -> dict[UUID, list[UUID]]:
+    words = [(c.word or "").strip().lower() for c in cards]
+    found = await get_synonyms_for_words(db, words)
+    synonyms = [found.get(w, []) for w in words]
+    by_word = await card_repo.get_card_ids_by_words(db, deck_id, {s for syns in synonyms for s in syns})
+    related: dict[UUID, list[UUID]] = {}
+    for card, syns in zip(cards, synonyms):
+        ids = [card_id for s in syns for card_id in by_word.get(s, []) if card_id != card.id]
+        if ids:
+            related[card.id] = ids
+    return related
+
+
+async def update_groups_for_cards(deck_id: UUID, user_id: UUID, card_ids: list[UUID]) -> None:
+    """Фоновая задача после создания / изменения слова карточек: влить их в существующие группы колоды."""
+    from app.db.session import async_session_maker
+
+    if not settings.synonym_groups_incremental or not card_ids:
+        return
+    with llm_gateway.call_context(user_id, "/synonym-groups/incremental", priority=llm_gateway.BACKGROUND):
+        try:
+            async with async_session_maker() as db:
+                if not await card_repo.deck_has_synonym_groups(db, deck_id):
+                    return
+                cards = [c for c in await card_repo.get_cards_by_ids(db, deck_id, card_ids) if (c.word or "").strip()]
+                if not cards:
+                    return
+                if settings.synonym_groups_mode == "embedding":
+                    related = await _related_by_embedding(db, user_id, deck_id, cards)
+                else:
+                    related = await _related_by_llm(db, deck_id, cards)
+                for card_id, others in related.items():
+                    await card_repo.merge_synonym_groups(db, deck_id, [card_id, *others])
+                await db.commit()
+                if related:
+                    logger.info("Группы синонимов колоды %s: влито %s карточек", deck_id, len(related))
+        except Exception:
+            logger.exception("Ошибка инкрементального обновления групп синонимов колоды %s", deck_id)
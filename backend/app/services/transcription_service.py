@@ -1,9 +1,25 @@
 import logging
+import os
 import httpx
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Аудио YouTube приходит как есть (webm/m4a) или перекодированным (opus/flac/mp3) — см. YOUTUBE_AUDIO_MODE
+_AUDIO_CONTENT_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".opus": "audio/ogg",
+    ".ogg": "audio/ogg",
+    ".flac": "audio/flac",
+    ".webm": "audio/webm",
+    ".m4a": "audio/mp4",
+    ".wav": "audio/wav",
+}
+
+
+def _content_type(file_path: str) -> str:
+    return _AUDIO_CONTENT_TYPES.get(os.path.splitext(file_path)[1].lower(), "application/octet-stream")
+
 async def transcribe_audio_file(file_path: str, language: str = None) -> dict:
     """
     Sends an audio file to the remote Whisper worker for transcription.
@@ -22,7 +38,7 @@ async def transcribe_audio_file(file_path: str, language: str = None) -> dict:
         timeout = httpx.Timeout(600.0) # Transcription can take a few minutes
         async with httpx.AsyncClient(timeout=timeout) as client:
             with open(file_path, "rb") as f:
-                files = {"file": (file_path, f, "audio/mpeg")}
+                files = {"file": (os.path.basename(file_path), f, _content_type(file_path))}
                 response = await client.post(url, files=files, params=params)
                 
             response.raise_for_status()
@@ -40,3 +56,16 @@ async def transcribe_audio_file(file_path: str, language: str = None) -> dict:
     except Exception as e:
         logger.error(f"Error during transcription: {e}")
         raise ValueError(f"Transcription process failed: {str(e)}")
+
+
+def segments_to_text(transcription_result: dict) -> str:
+    """Текст сегментов ответа воркера (или субтитров в том же формате) одной строкой; ValueError, если сегментов нет."""
+    segments = transcription_result.get("segments", [])
+    if not segments:
+        raise ValueError("Transcription succeeded but no segments were found.")
+    return " ".join([segment.get("text", "") for segment in segments])
+
+
+async def transcribe_to_text(file_path: str, language: str = "en") -> str:
+    """Текст распознанной речи одной строкой; ValueError, если сегментов нет."""
+    return segments_to_text(await transcribe_audio_file(file_path, language=language))
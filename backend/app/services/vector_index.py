@@ -0,0 +1,130 @@
+"""In-memory индекс эмбеддингов карточек по пользователю для /ai/similar-words (VECTOR_INDEX_ENABLED).
+
+Экран похожих слов делает серию запросов подряд от одного пользователя; вместо похода в Postgres
+на каждый индекс пользователя загружается один раз — непрерывная float32-матрица нормированных
+векторов (n × 768) и массивы id/колод/текстов карточек — и top-k считается одним умножением
+матрицы на вектор. Индексы живут в LRU на VECTOR_INDEX_MAX_USERS пользователей; пользователи
+с VECTOR_INDEX_MAX_CARDS+ карточками идут в Postgres, а матрица для них даже не загружается.
+
+Инвалидация — явная, в этом процессе: invalidate(user_id) после создания/удаления/изменения
+карточек и после заполнения эмбеддингов. Изменения из воркера задач приходят через pg_notify
+(job_events, канал card_changes); другие процессы API узнают об изменениях не позже VECTOR_INDEX_TTL_SECONDS.
+"""
+import logging
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.repositories import card_repo
+
+logger = logging.getLogger(__name__)
+
+
+class UserVectorIndex:
+    __slots__ = ("card_ids", "deck_ids", "words", "rows", "matrix")
+
+    def __init__(self, rows: list):
+        self.card_ids = [r.id for r in rows]
+        self.deck_ids = np.array([str(r.deck_id) for r in rows], dtype=object)
+        self.words = np.array([(r.word or "").strip().lower() for r in rows], dtype=object)
+        self.rows = [(r.word, r.translation, r.example) for r in rows]
+        if not rows:
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+            return
+        matrix = np.asarray([r.embedding for r in rows], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = np.ascontiguousarray(matrix / norms)
+
+    def top_k(
+        self,
+        embedding: list[float],
+        k: int,
+        exclude_deck_id: UUID | None = None,
+        deck_id: UUID | None = None,
+        exclude_word: str | None = None,
+    ) -> list[tuple]:
+        """
+        (card_id, word, translation, example, distance) по возрастанию косинусного расстояния.
+        deck_id — искать только в этой колоде, exclude_deck_id — во всех, кроме неё;
+        exclude_word — без карточек с этим словом (без учёта регистра).
+        """
+        if not self.card_ids or k <= 0:
+            return []
+        # Не на месте: embedding может быть массивом вызывающего (pgvector отдаёт numpy)
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = self.matrix @ query
+        if exclude_deck_id is not None:
+            scores[self.deck_ids == str(exclude_deck_id)] = -np.inf
+        if deck_id is not None:
+            scores[self.deck_ids != str(deck_id)] = -np.inf
+        if exclude_word:
+            scores[self.words == exclude_word.strip().lower()] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (self.card_ids[i], *self.rows[i], float(1.0 - scores[i]))
+            for i in top
+            if np.isfinite(scores[i])
+        ]
+
+
+# Значение None — у пользователя больше VECTOR_INDEX_MAX_CARDS карточек: отметка живёт TTL, как и индекс,
+# чтобы не пересчитывать карточки на каждый запрос
+_indexes: OrderedDict[UUID, tuple[float, UserVectorIndex | None]] = OrderedDict()
+# Идущие загрузки: user_id -> [число загрузок, счётчик инвалидаций]. Индекс, загрузка которого
+# пересеклась с invalidate(), не сохраняется. Запись удаляется с последней загрузкой
+_loads: dict[UUID, list[int]] = {}
+
+
+def invalidate(user_id: UUID) -> None:
+    _indexes.pop(user_id, None)
+    state = _loads.get(user_id)
+    if state is not None:
+        state[1] += 1
+
+
+def _remember(user_id: UUID, index: UserVectorIndex | None) -> None:
+    _indexes[user_id] = (time.monotonic(), index)
+    _indexes.move_to_end(user_id)
+    while len(_indexes) > settings.vector_index_max_users:
+        _indexes.popitem(last=False)
+
+
+async def _load(db: AsyncSession, user_id: UUID) -> UserVectorIndex | None:
+    if await card_repo.count_user_card_embeddings(db, user_id) > settings.vector_index_max_cards:
+        # Большие словари — в Postgres по HNSW, матрица не должна съедать память процесса
+        return None
+    rows = await card_repo.get_user_card_embeddings(db, user_id, limit=settings.vector_index_max_cards + 1)
+    if len(rows) > settings.vector_index_max_cards:
+        return None
+    logger.debug("Загружен векторный индекс пользователя %s: %s карточек", user_id, len(rows))
+    return UserVectorIndex(rows)
+
+
+async def get_index(db: AsyncSession, user_id: UUID) -> UserVectorIndex | None:
+    """Индекс пользователя (загрузка при промахе). None — индекс выключен или карточек слишком много."""
+    if not settings.vector_index_enabled:
+        return None
+    cached = _indexes.get(user_id)
+    if cached is not None and time.monotonic() - cached[0] < settings.vector_index_ttl_seconds:
+        _indexes.move_to_end(user_id)
+        return cached[1]
+    state = _loads.setdefault(user_id, [0, 0])
+    state[0] += 1
+    generation = state[1]
+    try:
+        index = await _load(db, user_id)
+    finally:
+        state[0] -= 1
+        if not state[0]:
+            del _loads[user_id]
+    if state[1] == generation:
+        _remember(user_id, index)
+    return index
@@ -1,55 +1,123 @@
 import os
+import shutil
+import subprocess
 import tempfile
 import yt_dlp
 import logging
 import random
 
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.youtube_video import TranscriptSource
+from app.services import captions_service, transcription_service
+
 logger = logging.getLogger(__name__)
 
-async def download_youtube_audio(url: str) -> str:
-    """
-    Downloads audio from a YouTube video and returns the path to the temporary file.
-    """
-    logger.info(f"Downloading audio from YouTube URL: {url}")
-    
-    # Create a temporary file path
-    temp_dir = tempfile.gettempdir()
-    output_template = os.path.join(temp_dir, "%(id)s.%(ext)s")
+# Whisper-воркер сам декодирует аудио в 16 кГц моно, поэтому качество сверх речевого не нужно:
+# самая лёгкая аудиодорожка не ниже ~40 кбит/с (обычно opus/m4a ~50 кбит/с) вместо bestaudio (~130-160 кбит/с)
+SPEECH_FORMAT = "worstaudio[abr>=?40]/worstaudio/bestaudio/best"
+AUDIO_MODES = ("passthrough", "opus", "flac", "mp3")
+
 
+def _ydl_audio_opts(mode: str) -> dict:
+    if mode == "mp3":
+        # Прежний путь: лучшая дорожка и перекодирование в MP3 192 кбит/с
+        return {
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }],
+        }
+    return {'format': SPEECH_FORMAT}
+
+
+def _speech_transcode_args(mode: str, opus_kbps: int) -> tuple[str, list[str]]:
+    """Расширение и аргументы ffmpeg для одного перекодирования в 16 кГц моно."""
+    if mode == "opus":
+        return ".opus", ["-c:a", "libopus", "-b:a", f"{opus_kbps}k", "-application", "voip"]
+    return ".flac", ["-c:a", "flac"]
+
+
+def _transcode_for_speech(path: str, mode: str, opus_kbps: int) -> str:
+    ext, codec_args = _speech_transcode_args(mode, opus_kbps)
+    out_path = os.path.splitext(path)[0] + ".speech" + ext
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", path, "-vn", "-ac", "1", "-ar", "16000", *codec_args, out_path],
+            check=True, capture_output=True,
+        )
+    finally:
+        # Исходник не нужен и при ошибке ffmpeg: иначе он остаётся в каталоге загрузок
+        os.remove(path)
+    return out_path
+
+
+def download_audio_sync(url: str, mode: str, opus_kbps: int = 24, output_dir: str | None = None) -> str:
+    """Скачать аудио в режиме mode (см. AUDIO_MODES); путь к итоговому файлу. Синхронно — для потока/скриптов."""
+    if mode not in AUDIO_MODES:
+        raise ValueError(f"Unknown audio mode {mode!r}, expected one of {', '.join(AUDIO_MODES)}")
+    output_dir = output_dir or tempfile.gettempdir()
     ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': output_template,
+        **_ydl_audio_opts(mode),
+        'outtmpl': os.path.join(output_dir, "%(id)s.%(ext)s"),
         'quiet': True,
         'no_warnings': True,
     }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(url, download=True)
+        downloads = info_dict.get('requested_downloads') or []
+        # filepath — итоговый файл после постпроцессоров (у mp3 — уже .mp3)
+        filename = downloads[0].get('filepath') if downloads else None
+        filename = filename or ydl.prepare_filename(info_dict)
+    if mode in ("opus", "flac"):
+        filename = _transcode_for_speech(filename, mode, opus_kbps)
+    return filename
 
-    try:
-        # We run this synchronously since yt_dlp does not have proper async API
-        # To avoid blocking the event loop entirely, this could be run in an executor
-        # but for simplicity, we will just use it directly.
-        import asyncio
-        loop = asyncio.get_event_loop()
-        
-        def _download():
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info_dict = ydl.extract_info(url, download=True)
-                video_id = info_dict.get('id', None)
-                expected_filename = os.path.join(temp_dir, f"{video_id}.mp3")
-                return expected_filename
 
-        filename = await loop.run_in_executor(None, _download)
-        
-        logger.info(f"Successfully downloaded audio to: {filename}")
+async def download_youtube_audio(url: str) -> str:
+    """
+    Downloads audio from a YouTube video and returns the path to the temporary file.
+    Format — YOUTUBE_AUDIO_MODE: by default the smallest audio-only stream as is, without re-encoding.
+    Each call downloads into its own temporary directory: two jobs for the same video do not share
+    (and delete) one "<id>.<ext>" file. Remove the result with remove_audio.
+    """
+    logger.info(f"Downloading audio from YouTube URL: {url}")
+    output_dir = tempfile.mkdtemp(prefix="youtube_audio_")
+    try:
+        filename = await run_in_threadpool(
+            download_audio_sync, url, settings.youtube_audio_mode, settings.youtube_audio_opus_kbps, output_dir
+        )
+        logger.info(f"Successfully downloaded audio to: {filename} ({os.path.getsize(filename)} bytes)")
         return filename
     except Exception as e:
+        shutil.rmtree(output_dir, ignore_errors=True)
         logger.error(f"Error downloading YouTube audio: {e}")
         raise ValueError(f"Could not download audio from the provided URL: {str(e)}")
 
+
+def remove_audio(path: str) -> None:
+    """Remove a file returned by download_youtube_audio together with its temporary directory."""
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+async def get_transcript(url: str) -> tuple[str, str]:
+    """
+    Транскрипция видео и её источник (TranscriptSource): английские субтитры, если подходят
+    (captions_service), иначе скачивание аудио и Whisper-воркер.
+    """
+    captions = await captions_service.fetch_captions(url)
+    if captions:
+        logger.info(f"Using YouTube {captions['source']} for {url}, skipping download and Whisper")
+        return transcription_service.segments_to_text(captions), captions["source"]
+    audio_path = await download_youtube_audio(url)
+    try:
+        return await transcription_service.transcribe_to_text(audio_path), TranscriptSource.WHISPER
+    finally:
+        remove_audio(audio_path)
+
+
 async def search_ielts_video() -> dict:
     """
     Searches for IELTS listening practice videos and returns a random selection.
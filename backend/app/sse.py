@@ -0,0 +1,42 @@
+"""Server-Sent Events: форматирование событий и мост от блокирующих генераторов LLM к StreamingResponse."""
+import json
+from typing import Any, AsyncIterator, Iterator, TypeVar
+
+from fastapi.responses import StreamingResponse
+
+from app.services import llm_gateway
+
+T = TypeVar("T")
+
+_SENTINEL = object()
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Одно SSE-событие: event + data (JSON в одну строку)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    # X-Accel-Buffering: no — чтобы nginx перед API не копил поток целиком
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def iterate_in_threadpool(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """
+    Читать блокирующий генератор модели в пуле потоков LLM (llm_gateway.run_in_thread), не занимая event loop.
+    При обрыве соединения генератор закрывается, чтобы освободить слот LLM-шлюза.
+    """
+    try:
+        while True:
+            item = await llm_gateway.run_in_thread(next, iterator, _SENTINEL)
+            if item is _SENTINEL:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for synonym_service.build_synonym_groups on synthetic decks (no DB, no LLM).
+
+Builds --cards cards (default 100k) with unique words and a synonym_map shaped like the one
+/ai/synonym-groups/suggest collects from the model:
+  - small groups of --group-size words that list each other as synonyms;
+  - --chain cards linked into one long chain (a -> b -> c ...), the worst case for recursive DFS;
+  - synonyms that are not in the deck (ignored by grouping).
+Runs the current implementation and the previous recursive DFS version (kept here for comparison),
+compares the groups and prints the best of --repeat runs. The legacy DFS followed synonym links one way
+only, so with --chain > 0 it may split the chain into several groups.
+
+Run from backend dir: python scripts/bench_synonym_groups.py --cards 100000 --chain 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.synonym_service import build_synonym_groups
+
+
+def legacy_build_synonym_groups(cards: list, synonym_map: dict[str, set[str]]) -> list[tuple[list[str], list[str]]]:
+    """Previous implementation: recursive DFS, rescans all cards for every component."""
+    word_to_card_id = {}
+    for c in cards:
+        w = (c.word or "").strip().lower()
+        if w:
+            word_to_card_id[w] = str(c.id)
+    graph: dict[str, set[str]] = {}
+    for c in cards:
+        cid = str(c.id)
+        graph.setdefault(cid, set())
+        syns = synonym_map.get(cid, set())
+        for w in syns:
+            if w in word_to_card_id and word_to_card_id[w] != cid:
+                graph[cid].add(word_to_card_id[w])
+    visited = set()
+
+    def dfs(nid: str, comp: set[str]) -> None:
+        visited.add(nid)
+        comp.add(nid)
+        for nb in graph.get(nid, set()):
+            if nb not in visited:
+                dfs(nb, comp)
+
+    groups = []
+    for c in cards:
+        cid = str(c.id)
+        if cid in visited:
+            continue
+        comp = set()
+        dfs(cid, comp)
+        if len(comp) >= 2:
+            card_ids = list(comp)
+            words = [c.word for c in cards if str(c.id) in comp]
+            groups.append((card_ids, words))
+    return groups
+
+
+def synthetic_deck(n: int, group_size: int, chain: int, seed: int) -> tuple[list, dict[str, set[str]]]:
+    rng = random.Random(seed)
+    cards = [SimpleNamespace(id=uuid.UUID(int=rng.getrandbits(128)), word=f"word{i}") for i in range(n)]
+    order = list(range(n))
+    rng.shuffle(order)
+    synonym_map: dict[str, set[str]] = {str(c.id): {f"unknown{rng.randrange(n)}"} for c in cards}
+    chained, rest = order[:chain], order[chain:]
+    for a, b in zip(chained, chained[1:]):
+        synonym_map[str(cards[a].id)].add(cards[b].word)
+    for start in range(0, len(rest), group_size):
+        group = rest[start : start + group_size]
+        if rng.random() < 0.3:
+            continue  # карточки без синонимов в колоде
+        for i in group:
+            synonym_map[str(cards[i].id)].update(cards[j].word for j in group if j != i)
+    return cards, synonym_map
+
+
+def timed(fn, cards, synonym_map, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            result = fn(cards, synonym_map)
+        except RecursionError:
+            return None, "RecursionError"
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def canonical(groups) -> set[frozenset[str]]:
+    return {frozenset(card_ids) for card_ids, _ in groups}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=100_000)
+    parser.add_argument("--group-size", type=int, default=4)
+    parser.add_argument("--chain", type=int, default=5000, help="длина одной цепочки синонимов (глубина DFS)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="не запускать старую реализацию (квадратичная)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    cards, synonym_map = synthetic_deck(args.cards, args.group_size, args.chain, args.seed)
+    print(f"{args.cards} cards, groups of {args.group_size}, one chain of {args.chain}\n")
+
+    current, current_time = timed(build_synonym_groups, cards, synonym_map, args.repeat)
+    print(f"{'union-find (current)':<24} {current_time * 1000:10.1f} ms   {len(current)} groups")
+
+    if args.skip_legacy:
+        return
+    legacy, legacy_time = timed(legacy_build_synonym_groups, cards, synonym_map, 1)
+    if legacy is None:
+        print(f"{'recursive DFS (legacy)':<24} {legacy_time} (recursion limit {sys.getrecursionlimit()})")
+        return
+    print(f"{'recursive DFS (legacy)':<24} {legacy_time * 1000:10.1f} ms   {len(legacy)} groups")
+    print(f"\nspeedup x{legacy_time / current_time:.1f}, same groups: {canonical(current) == canonical(legacy)}")
+    # Старый DFS шёл только по направлению «карточка -> её синоним», поэтому цепочку, обход которой
+    # начался с середины, он разбивал на части; union-find объединяет связь в обе стороны
+    if args.chain:
+        print("(legacy splits one-way chains depending on card order, so a mismatch there is expected)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark of YouTube audio preparation for Whisper (YOUTUBE_AUDIO_MODE) on real videos.
+
+For every URL and every --modes value downloads the audio exactly as youtube_service.download_youtube_audio
+does and prints file size, effective bitrate, download + conversion time and the size relative to the
+legacy mp3 mode (bestaudio re-encoded to MP3 192 kbps):
+  - passthrough — the smallest audio-only stream (>= ~40 kbps), no re-encoding;
+  - opus / flac — the same stream converted once to 16 kHz mono (Opus at --opus-kbps, or FLAC);
+  - mp3 — previous behaviour, for reference.
+With --transcribe each file is also uploaded to WHISPER_WORKER_URL; upload + transcription time and
+the transcript length show whether the compact modes change recognition.
+
+Needs network access to YouTube and ffmpeg on PATH (mp3/opus/flac modes). Without URLs the first
+--search result is used.
+
+Run from backend dir: python scripts/bench_youtube_audio.py https://www.youtube.com/watch?v=...
+                      python scripts/bench_youtube_audio.py --search "ielts listening part 1" --transcribe
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"))
+
+import httpx
+import yt_dlp
+
+from app.services.youtube_service import AUDIO_MODES, download_audio_sync
+
+
+def video_info(url: str) -> dict:
+    with yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True}) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def search_url(query: str) -> str:
+    with yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True, "extract_flat": True}) as ydl:
+        entries = ydl.extract_info(f"ytsearch1:{query}", download=False).get("entries") or []
+    if not entries:
+        sys.exit(f"Nothing found for {query!r}")
+    return f"https://www.youtube.com/watch?v={entries[0]['id']}"
+
+
+def transcribe(worker_url: str, path: str) -> tuple[float, int]:
+    """(секунды на загрузку и распознавание, длина текста)."""
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        response = httpx.post(
+            f"{worker_url.rstrip('/')}/transcribe",
+            files={"file": (os.path.basename(path), f)},
+            params={"language": "en"},
+            timeout=600.0,
+        )
+    response.raise_for_status()
+    text = " ".join(s.get("text", "") for s in response.json().get("segments", []))
+    return time.perf_counter() - started, len(text)
+
+
+def bench_url(url: str, args: argparse.Namespace, out_dir: str) -> None:
+    info = video_info(url)
+    duration = info.get("duration") or 0
+    print(f"\n{info.get('id')}  {info.get('title', '')[:60]}  ({duration} s)")
+    header = f"{'mode':<12} {'bytes':>12} {'kbps':>7} {'x mp3':>7} {'download s':>11}"
+    if args.transcribe:
+        header += f" {'whisper s':>10} {'chars':>7}"
+    print(header)
+    sizes: dict[str, int] = {}
+    for mode in args.modes:
+        mode_dir = os.path.join(out_dir, mode)
+        os.makedirs(mode_dir, exist_ok=True)
+        started = time.perf_counter()
+        try:
+            path = download_audio_sync(url, mode, opus_kbps=args.opus_kbps, output_dir=mode_dir)
+        except Exception as e:
+            print(f"{mode:<12} failed: {e}")
+            continue
+        elapsed = time.perf_counter() - started
+        size = sizes[mode] = os.path.getsize(path)
+        kbps = size * 8 / 1000 / duration if duration else 0
+        ratio = f"{sizes['mp3'] / size:.1f}" if "mp3" in sizes and size else "-"
+        line = f"{mode:<12} {size:>12,} {kbps:>7.0f} {ratio:>7} {elapsed:>11.1f}"
+        if args.transcribe:
+            try:
+                seconds, chars = transcribe(args.worker_url, path)
+                line += f" {seconds:>10.1f} {chars:>7}"
+            except Exception as e:
+                line += f"  transcribe failed: {e}"
+        print(line)
+        os.remove(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--search", default="ielts listening practice test part 1 short")
+    parser.add_argument("--modes", type=lambda s: [m.strip() for m in s.split(",") if m.strip()],
+                        default=["mp3", "passthrough", "opus", "flac"],
+                        help="comma-separated; put mp3 first to get the size ratio column")
+    parser.add_argument("--opus-kbps", type=int, default=24)
+    parser.add_argument("--transcribe", action="store_true", help="also upload each file to the Whisper worker")
+    parser.add_argument("--worker-url", default=os.getenv("WHISPER_WORKER_URL", "http://localhost:8004"))
+    args = parser.parse_args()
+
+    unknown = [m for m in args.modes if m not in AUDIO_MODES]
+    if unknown:
+        sys.exit(f"Unknown modes: {', '.join(unknown)} (available: {', '.join(AUDIO_MODES)})")
+    if shutil.which("ffmpeg") is None and set(args.modes) - {"passthrough"}:
+        sys.exit("ffmpeg not found on PATH: only --modes passthrough can run")
+
+    urls = args.urls or [search_url(args.search)]
+    out_dir = tempfile.mkdtemp(prefix="bench_youtube_audio_")
+    try:
+        for url in urls:
+            bench_url(url, args, out_dir)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -93,11 +93,28 @@ export const useApi = () => {
         fetchWithAuth(`/ai/writing-history/${id}`) as Promise<WritingSubmission>
 
     // ── YouTube / IELTS ───────────────────────────────────────────────────────
-    const processVideo = (url: string) =>
-        fetchWithAuth('/youtube/process', {
+    // Обработка видео идёт фоновой задачей: POST отвечает 202 с job_id, результат — опросом.
+    // Не взятая из очереди за 5 минут (воркер не запущен или занят) или не завершённая за 30 — ошибка
+    const processVideo = async (url: string): Promise<VideoResult> => {
+        const queuedTimeoutMs = 5 * 60 * 1000
+        const totalTimeoutMs = 30 * 60 * 1000
+        const started = Date.now()
+        let job = await fetchWithAuth('/youtube/process', {
             method: 'POST',
             body: JSON.stringify({ url }),
-        }) as Promise<VideoResult>
+        }) as VideoProcessJob
+        while (job.status !== 'succeeded') {
+            if (job.status === 'failed') throw new Error(job.error ?? 'Processing failed')
+            const elapsed = Date.now() - started
+            if (job.status === 'queued' && elapsed > queuedTimeoutMs) {
+                throw new Error('Video processing is still queued, try again later')
+            }
+            if (elapsed > totalTimeoutMs) throw new Error('Video processing is taking too long, try again later')
+            await new Promise(resolve => setTimeout(resolve, 3000))
+            job = await fetchWithAuth(`/youtube/process/${job.job_id}`) as VideoProcessJob
+        }
+        return job.result as VideoResult
+    }
 
     const getYoutubeHistory = () =>
         fetchWithAuth('/youtube/history') as Promise<VideoHistoryItem[]>
@@ -144,6 +161,11 @@ export interface VideoResult {
     transcription: string; translation: string; summary?: string
     questions?: VideoQuestion[]
 }
+export interface VideoProcessJob {
+    job_id: string | null; status: 'queued' | 'running' | 'succeeded' | 'failed'
+    stage: string | null; attached: boolean; error: string | null
+    result: VideoResult | null
+}
 export interface VideoQuestion {
     type: string; question: string; options: string[]
     answer: string; explanation: string
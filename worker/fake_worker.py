@@ -0,0 +1,124 @@
+"""Fake Whisper Worker: тот же HTTP-контракт, что у main.py, но без GPU и faster-whisper.
+
+Для нагрузочных тестов backend офлайн (вместе с LLM_BACKEND=fake): укажите
+WHISPER_WORKER_URL=http://localhost:8014 и запустите `python fake_worker.py`.
+
+Длительность аудио оценивается по размеру файла (FAKE_WHISPER_BYTES_PER_SECOND),
+время обработки — длительность × FAKE_WHISPER_REALTIME_FACTOR с логнормальным разбросом.
+Как и настоящий worker, обрабатывает по одному файлу за раз (FAKE_WHISPER_CONCURRENCY).
+Сегменты и задержки детерминированы FAKE_WHISPER_SEED и содержимым файла.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import random
+from typing import Optional
+
+from fastapi import FastAPI, File, UploadFile
+from pydantic import BaseModel
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Fake Whisper Worker", version="1.0.0")
+
+SEED = os.getenv("FAKE_WHISPER_SEED", "0")
+BYTES_PER_SECOND = float(os.getenv("FAKE_WHISPER_BYTES_PER_SECOND", "6250"))  # ~50 kbps: поток passthrough (YOUTUBE_AUDIO_MODE по умолчанию)
+REALTIME_FACTOR = float(os.getenv("FAKE_WHISPER_REALTIME_FACTOR", "0.1"))  # 10 мин аудио ≈ 1 мин обработки
+LATENCY_SIGMA = float(os.getenv("FAKE_WHISPER_LATENCY_SIGMA", "0.3"))
+ERROR_RATE = float(os.getenv("FAKE_WHISPER_ERROR_RATE", "0"))
+SEGMENT_SECONDS = float(os.getenv("FAKE_WHISPER_SEGMENT_SECONDS", "5"))
+
+_semaphore = asyncio.Semaphore(int(os.getenv("FAKE_WHISPER_CONCURRENCY", "1")))
+
+
+class TranscriptionResponse(BaseModel):
+    """Как main.TranscriptionResponse; своя копия, чтобы заглушке не нужны были зависимости настоящего worker."""
+    status: str
+    segments: list[dict]
+    language: str
+    duration: float
+    language_probability: float
+    error: Optional[str] = None
+
+_SENTENCES = [
+    "Good morning and welcome to today's programme.",
+    "We are going to talk about how cities change over time.",
+    "Many people move to the capital to look for work.",
+    "The museum opens at nine o'clock on weekdays.",
+    "Tickets cost twelve pounds for adults and six for children.",
+    "Researchers found that sleep improves memory.",
+    "The new library will be built next to the station.",
+    "Please remember to bring your student card.",
+    "Most of the volunteers work at the weekend.",
+    "The weather forecast says it will rain tomorrow afternoon.",
+]
+
+
+@app.get("/")
+async def root():
+    return {"status": "ok", "service": "whisper-worker", "model": "fake", "device": "cpu"}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy", "model": "fake", "device": "cpu", "model_loaded": True}
+
+
+@app.post("/transcribe", response_model=TranscriptionResponse)
+async def transcribe_audio(
+    file: UploadFile = File(...),
+    language: Optional[str] = None,
+):
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(1024 * 1024):
+        digest.update(chunk)
+        size += len(chunk)
+    rng = random.Random(f"{SEED}:{digest.hexdigest()}")
+    duration = max(1.0, size / BYTES_PER_SECOND)
+
+    async with _semaphore:
+        delay = duration * REALTIME_FACTOR * math.exp(rng.gauss(0.0, LATENCY_SIGMA))
+        logger.info("Fake transcription: %s bytes, audio %.1fs, delay %.1fs", size, duration, delay)
+        await asyncio.sleep(delay)
+
+    if rng.random() < ERROR_RATE:
+        return TranscriptionResponse(
+            status="error",
+            segments=[],
+            language="",
+            duration=0.0,
+            language_probability=0.0,
+            error="fake worker: injected failure",
+        )
+
+    segments = []
+    start = 0.0
+    while start < duration:
+        end = min(duration, start + SEGMENT_SECONDS)
+        segments.append({
+            "start": round(start, 2),
+            "end": round(end, 2),
+            "text": _SENTENCES[rng.randrange(len(_SENTENCES))],
+        })
+        start = end
+    return TranscriptionResponse(
+        status="success",
+        segments=segments,
+        language=language or "en",
+        duration=round(duration, 2),
+        language_probability=0.99,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.getenv("WORKER_PORT", "8014"))
+    host = os.getenv("WORKER_HOST", "0.0.0.0")
+    uvicorn.run(app, host=host, port=port)